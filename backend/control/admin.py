@@ -1,10 +1,77 @@
 from django.contrib import admin
+from django.contrib.admin.views.main import PAGE_VAR
 
-from .models import EventLog, TankConfig, TankState
+from .models import AlarmRule, EventLog, TankConfig, TankLease, TankState, TankStateChunk
+from .pagination import EstimatedCountPaginator
+from .routers import pick_read_db, read_from
+from .search import search_events
+
+
+class HistoryAdmin(admin.ModelAdmin):
+    """Admin para tablas históricas de millones de filas.
+
+    Usa conteos estimados, evita el conteo total y permite paginar por clave
+    (``?before=<id>``) para que las páginas profundas no dependan de ``OFFSET``.
+    """
+
+    CURSOR_VAR = 'before'
+
+    change_list_template = 'admin/control/history_change_list.html'
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    list_per_page = 100
+    date_hierarchy = 'ts'
+    ordering = ('-id',)
+
+    def changelist_view(self, request, extra_context=None):
+        cursor = request.GET.get(self.CURSOR_VAR)
+        request.history_before = None
+        if cursor is not None:
+            request.GET = request.GET.copy()
+            del request.GET[self.CURSOR_VAR]
+            try:
+                request.history_before = int(cursor)
+            except ValueError:
+                pass
+        if request.method != 'GET':
+            return self._changelist(request, extra_context)
+        # El listado (incluido el render de la plantilla) se lee de una réplica.
+        with read_from(pick_read_db(request)):
+            response = self._changelist(request, extra_context)
+            if hasattr(response, 'render'):
+                response.render()
+            return response
+
+    def _changelist(self, request, extra_context):
+        response = super().changelist_view(request, extra_context)
+        context = getattr(response, 'context_data', None)
+        if context and 'cl' in context:
+            context['next_cursor_url'] = self._next_cursor_url(context['cl'])
+        return response
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        before = getattr(request, 'history_before', None)
+        if before is not None:
+            queryset = queryset.filter(pk__lt=before)
+        return queryset
+
+    def _next_cursor_url(self, cl):
+        results = list(cl.result_list)
+        if len(results) < cl.list_per_page:
+            return None
+        return cl.get_query_string({self.CURSOR_VAR: results[-1].pk}, [PAGE_VAR])
+
+
+class AlarmRuleInline(admin.TabularInline):
+    model = AlarmRule
+    extra = 0
+    fields = ('name', 'metric', 'operator', 'threshold', 'window_s', 'for_s', 'severity', 'enabled')
 
 
 @admin.register(TankConfig)
 class TankConfigAdmin(admin.ModelAdmin):
+    inlines = (AlarmRuleInline,)
     list_display = (
         'id',
         'capacity_l',
@@ -35,7 +102,7 @@ class TankConfigAdmin(admin.ModelAdmin):
 
 
 @admin.register(TankState)
-class TankStateAdmin(admin.ModelAdmin):
+class TankStateAdmin(HistoryAdmin):
     list_display = (
         'id',
         'config',
@@ -47,14 +114,39 @@ class TankStateAdmin(admin.ModelAdmin):
         'safe_mode',
         'ts',
     )
-    list_filter = ('safe_mode', 'valve_open', 'drain_valve_open', 'heater_on')
-    search_fields = ('config__id',)
-    ordering = ('-ts',)
+    list_filter = ('config',)
+    list_select_related = ('config',)
+    search_fields = ('=config__id',)
+
+
+@admin.register(TankStateChunk)
+class TankStateChunkAdmin(admin.ModelAdmin):
+    list_display = ('id', 'config', 'minute', 'count', 'first_seq', 'last_seq')
+    list_filter = ('config',)
+    list_select_related = ('config',)
+    date_hierarchy = 'minute'
+    exclude = ('payload',)
+    readonly_fields = ('config', 'minute', 'count', 'first_seq', 'last_seq')
+    show_full_result_count = False
+
+
+@admin.register(TankLease)
+class TankLeaseAdmin(admin.ModelAdmin):
+    list_display = ('config', 'owner', 'epoch', 'renewed_at', 'expires_at')
+    readonly_fields = ('config', 'owner', 'epoch', 'acquired_at', 'renewed_at', 'expires_at')
 
 
 @admin.register(EventLog)
-class EventLogAdmin(admin.ModelAdmin):
-    list_display = ('id', 'code', 'severity', 'ts', 'message')
-    list_filter = ('code', 'severity')
-    search_fields = ('message',)
-    ordering = ('-ts',)
+class EventLogAdmin(HistoryAdmin):
+    list_display = ('id', 'config', 'code', 'severity', 'ts', 'level_l', 'temp_c', 'event_message')
+    list_filter = ('config', 'code')
+    search_fields = ('message', 'code')
+    raw_id_fields = ('state', 'alarm')
+
+    @admin.display(description='Mensaje')
+    def event_message(self, obj):
+        return obj.text
+
+    def get_search_results(self, request, queryset, search_term):
+        # Índice de texto completo (``control/search.py``) en lugar de LIKE '%término%'.
+        return search_events(queryset, search_term), False
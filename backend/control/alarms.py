@@ -0,0 +1,264 @@
+"""Evaluación incremental de las reglas de alarma (``AlarmRule``) en cada paso.
+
+Las reglas habilitadas de un tanque se compilan una vez en un ``AlarmSet``:
+cada métrica distinta (``metric``, ``window_s``) se calcula una sola vez por
+muestra aunque la usen varias reglas, y cada regla solo compara el valor y
+lleva su temporizador ``for_s``. Las ventanas son colas de ``(t, valor)`` que
+se recortan por el frente, así que cada muestra cuesta O(1) amortizado sin
+importar el tamaño de la ventana.
+
+El tiempo es ``TankState.ts`` de la muestra. Las muestras en modo seguro no
+alimentan las métricas de lecturas (sus valores no son confiables) y no
+cambian el estado de las alarmas. Como el acondicionamiento de señal, el
+estado vive en memoria del proceso que ejecuta el bucle; las reglas se
+recompilan cuando cambia ``TankConfig.updated_at`` (guardar o borrar una regla
+lo actualiza) conservando el estado de las que no cambiaron.
+"""
+
+from __future__ import annotations
+
+import threading
+from collections import deque
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+from .models import AlarmMetric, AlarmOperator, AlarmRule, TankConfig, TankState
+
+
+class ValueMetric:
+    __slots__ = ('field',)
+
+    def __init__(self, field: str):
+        self.field = field
+
+    def update(self, state: TankState, t: float) -> Optional[float]:
+        if state.safe_mode:
+            return None
+        return getattr(state, self.field)
+
+
+class _Span:
+    """Muestras de los últimos ``window_s`` segundos más una ancla de al menos esa edad."""
+
+    __slots__ = ('window_s', '_samples')
+
+    def __init__(self, window_s: float):
+        self.window_s = window_s
+        self._samples: deque[tuple[float, float]] = deque()
+
+    def clear(self) -> None:
+        self._samples.clear()
+
+    def push(self, t: float, value: float) -> Optional[tuple[float, float]]:
+        """Agrega la muestra y devuelve ``(Δt, Δvalor)`` si ya cubre la ventana."""
+        samples = self._samples
+        samples.append((t, value))
+        while len(samples) > 1 and t - samples[1][0] >= self.window_s:
+            samples.popleft()
+        anchor_t, anchor_value = samples[0]
+        if t - anchor_t < self.window_s:
+            return None
+        return t - anchor_t, value - anchor_value
+
+
+class RateMetric:
+    """Variación por minuto de ``field`` en al menos ``window_s`` segundos."""
+
+    __slots__ = ('field', '_span')
+
+    def __init__(self, field: str, window_s: float):
+        self.field = field
+        self._span = _Span(window_s)
+
+    def update(self, state: TankState, t: float) -> Optional[float]:
+        if state.safe_mode:
+            return None
+        delta = self._span.push(t, getattr(state, self.field))
+        if delta is None:
+            return None
+        return delta[1] / delta[0] * 60
+
+
+class HeaterCyclesMetric:
+    """Encendidos de la resistencia (apagada → encendida) en los últimos ``window_s`` segundos."""
+
+    __slots__ = ('window_s', '_starts', '_heater_on')
+
+    def __init__(self, window_s: float):
+        self.window_s = window_s
+        self._starts: deque[float] = deque()
+        self._heater_on: Optional[bool] = None
+
+    def update(self, state: TankState, t: float) -> Optional[float]:
+        starts = self._starts
+        if state.heater_on and self._heater_on is False:
+            starts.append(t)
+        self._heater_on = state.heater_on
+        while starts and t - starts[0] > self.window_s:
+            starts.popleft()
+        return float(len(starts))
+
+
+class FillRiseMetric:
+    """Subida de nivel mientras la válvula lleva al menos ``window_s`` segundos abierta."""
+
+    __slots__ = ('_span',)
+
+    def __init__(self, window_s: float):
+        self._span = _Span(window_s)
+
+    def update(self, state: TankState, t: float) -> Optional[float]:
+        if state.safe_mode or not state.valve_open:
+            self._span.clear()
+            return None
+        delta = self._span.push(t, state.level_l)
+        return None if delta is None else delta[1]
+
+
+def build_metric(metric: str, window_s: float):
+    if metric == AlarmMetric.TEMP:
+        return ValueMetric('temp_c')
+    if metric == AlarmMetric.LEVEL:
+        return ValueMetric('level_l')
+    if metric == AlarmMetric.TEMP_RATE:
+        return RateMetric('temp_c', window_s)
+    if metric == AlarmMetric.LEVEL_RATE:
+        return RateMetric('level_l', window_s)
+    if metric == AlarmMetric.HEATER_CYCLES:
+        return HeaterCyclesMetric(window_s)
+    if metric == AlarmMetric.FILL_RISE:
+        return FillRiseMetric(window_s)
+    raise ValueError(f'Métrica de alarma desconocida: {metric}')
+
+
+class CompiledRule:
+    __slots__ = ('rule', 'metric_index', 'above', 'threshold', 'for_s', 'active', '_since')
+
+    def __init__(self, rule: AlarmRule, metric_index: int):
+        self.rule = rule
+        self.metric_index = metric_index
+        self.above = rule.operator == AlarmOperator.ABOVE
+        self.threshold = rule.threshold
+        self.for_s = rule.for_s
+        self.active = False
+        self._since: Optional[float] = None
+
+    def next_state(self, value: Optional[float], t: float) -> tuple[bool, Optional[float]]:
+        """``(active, _since)`` tras la muestra, sin modificar la regla."""
+        if value is None:
+            return self.active, self._since
+        if not (value > self.threshold if self.above else value < self.threshold):
+            return False, None
+        since = t if self._since is None else self._since
+        return self.active or t - since >= self.for_s, since
+
+
+@dataclass
+class AlarmChange:
+    rule: AlarmRule
+    active: bool
+    value: float
+
+    @property
+    def message(self) -> str:
+        rule = self.rule
+        name = rule.name.replace('{', '{{').replace('}', '}}')
+        verb = 'activada' if self.active else 'despejada'
+        return (
+            f'Alarma "{name}" {verb}: {rule.get_metric_display()} '
+            f'{rule.get_operator_display().lower()} {rule.threshold:g} (valor {self.value:.2f}).'
+        )
+
+
+class AlarmSet:
+    """Reglas compiladas de un tanque con sus métricas compartidas.
+
+    Al recompilar, ``previous`` aporta el estado de las métricas con la misma
+    clave y de las reglas que no cambiaron, para que un cambio en otra regla o
+    en la configuración no reinicie ventanas ni alarmas activas.
+    """
+
+    def __init__(self, rules: list[AlarmRule], previous: Optional['AlarmSet'] = None):
+        self._lock = threading.Lock()
+        self.metrics = []
+        self.rules = []
+        reused_metrics = previous._metrics_by_key() if previous is not None else {}
+        reused_rules = previous._rules_by_version() if previous is not None else {}
+        positions: dict[tuple, int] = {}
+        for rule in rules:
+            window_s = self._window(rule)
+            key = (rule.metric, window_s)
+            if key not in positions:
+                positions[key] = len(self.metrics)
+                self.metrics.append(reused_metrics.get(key) or build_metric(rule.metric, window_s))
+            compiled = CompiledRule(rule, positions[key])
+            earlier = reused_rules.get((rule.pk, rule.updated_at))
+            if earlier is not None:
+                compiled.active, compiled._since = earlier.active, earlier._since
+            self.rules.append(compiled)
+
+    def _metrics_by_key(self) -> dict[tuple, object]:
+        return {
+            (compiled.rule.metric, self._window(compiled.rule)): self.metrics[compiled.metric_index]
+            for compiled in self.rules
+        }
+
+    def _rules_by_version(self) -> dict[tuple, CompiledRule]:
+        return {(compiled.rule.pk, compiled.rule.updated_at): compiled for compiled in self.rules}
+
+    @staticmethod
+    def _window(rule: AlarmRule) -> int:
+        return rule.window_s if rule.metric in AlarmRule.WINDOWED_METRICS else 0
+
+    def evaluate(self, state: TankState) -> list[AlarmChange]:
+        """Alimenta la muestra y devuelve las alarmas que se activaron o despejaron."""
+        changes, apply = self.prepare(state)
+        apply()
+        return changes
+
+    def prepare(self, state: TankState) -> tuple[list[AlarmChange], Callable[[], None]]:
+        """Como ``evaluate``, pero el estado de las reglas cambia solo al llamar la función devuelta.
+
+        El paso de control la registra con ``transaction.on_commit``: si el paso
+        se revierte, las reglas no quedan activas sin su evento y la alarma se
+        vuelve a emitir con la siguiente muestra. Las métricas sí absorben la
+        lectura, que ocurrió aunque no se haya guardado.
+        """
+        t = state.ts.timestamp()
+        changes = []
+        pending = []
+        with self._lock:
+            values = [metric.update(state, t) for metric in self.metrics]
+            for compiled in self.rules:
+                value = values[compiled.metric_index]
+                active, since = compiled.next_state(value, t)
+                if active != compiled.active:
+                    changes.append(AlarmChange(compiled.rule, active, value))
+                if (active, since) != (compiled.active, compiled._since):
+                    pending.append((compiled, active, since))
+
+        def apply() -> None:
+            with self._lock:
+                for compiled, active, since in pending:
+                    compiled.active, compiled._since = active, since
+
+        return changes, apply
+
+_lock = threading.Lock()
+_alarm_sets: dict[int, tuple[object, Optional[AlarmSet]]] = {}
+
+
+def alarms_for(config: TankConfig) -> Optional[AlarmSet]:
+    """Reglas compiladas del tanque, o ``None`` si no tiene reglas habilitadas.
+
+    Solo consulta la base cuando cambia ``config.updated_at``.
+    """
+    with _lock:
+        cached = _alarm_sets.get(config.pk)
+    if cached is not None and cached[0] == config.updated_at:
+        return cached[1]
+    rules = list(AlarmRule.objects.filter(config=config, enabled=True).order_by('id'))
+    alarm_set = AlarmSet(rules, previous=cached[1] if cached is not None else None) if rules else None
+    with _lock:
+        _alarm_sets[config.pk] = (config.updated_at, alarm_set)
+    return alarm_set
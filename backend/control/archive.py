@@ -0,0 +1,351 @@
+"""Archivo frío del historial en archivos columnares comprimidos por día.
+
+Cada día cerrado de ``TankState`` o ``EventLog`` se mueve a
+``ARCHIVE_DIR/<tabla>/<AAAA-MM-DD>.tca``: un encabezado JSON seguido de una
+columna comprimida con zlib por campo (arreglos binarios para números, fechas y
+booleanos; JSON para texto y columnas con nulos). ``index.json`` guarda por día
+el rango de tiempo, la cantidad de filas y mínimo/máximo de cada columna
+numérica, para descartar archivos sin abrirlos.
+
+Los días de ``TankState`` incluyen los minutos ya compactados en
+``TankStateChunk`` (``control/timeseries.py``): se expanden al archivar y los
+bloques del día se borran junto con las filas.
+
+``ArchiveReader`` combina el archivo y la tabla viva por rango de tiempo, de
+modo que las lecturas de historial no necesitan saber dónde está cada fila.
+"""
+
+from __future__ import annotations
+
+import heapq
+import json
+import os
+import struct
+import zlib
+from array import array
+from dataclasses import dataclass
+from datetime import date, datetime, time as dt_time, timedelta, timezone as dt_timezone
+from pathlib import Path
+from typing import Any, Iterable, Iterator, Optional, Sequence
+
+from django.conf import settings
+from django.db import models, transaction
+
+from .models import EventLog, TankState, TankStateChunk, TankStateHead
+
+MAGIC = b'TCA1'
+FILE_SUFFIX = '.tca'
+INDEX_NAME = 'index.json'
+DELETE_BATCH_SIZE = 2000
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+ARCHIVED_MODELS: dict[str, type[models.Model]] = {
+    'tankstate': TankState,
+    'eventlog': EventLog,
+}
+
+_TYPECODES = {'int': 'q', 'float': 'd', 'bool': 'b', 'datetime': 'q'}
+
+
+def to_micros(value: datetime) -> int:
+    delta = value - EPOCH
+    return (delta.days * 86_400 + delta.seconds) * 1_000_000 + delta.microseconds
+
+
+def from_micros(value: int) -> datetime:
+    return EPOCH + timedelta(microseconds=value)
+
+
+def _column_kind(field: models.Field) -> str:
+    if isinstance(field, models.DateTimeField):
+        return 'datetime'
+    if isinstance(field, models.BooleanField):
+        return 'bool'
+    if isinstance(field, models.FloatField):
+        return 'float'
+    if isinstance(field, (models.IntegerField, models.AutoField, models.ForeignKey)):
+        return 'int'
+    return 'json'
+
+
+def archive_columns(model: type[models.Model]) -> list[tuple[str, str]]:
+    """Columnas (attname, tipo) que se guardan para ``model``."""
+    return [(field.attname, _column_kind(field)) for field in model._meta.concrete_fields]
+
+
+def write_day_file(path: Path, columns: Sequence[tuple[str, str]], rows: Sequence[Sequence[Any]]) -> dict:
+    """Escribe ``rows`` en formato columnar y devuelve las estadísticas del índice."""
+    header_columns = []
+    blobs = []
+    stats: dict[str, Any] = {'rows': len(rows), 'columns': {}}
+    offset = 0
+    for position, (name, kind) in enumerate(columns):
+        values = [row[position] for row in rows]
+        if kind == 'datetime':
+            values = [to_micros(value) if value is not None else None for value in values]
+        stored_kind = kind
+        if kind in _TYPECODES and None not in values:
+            raw = array(_TYPECODES[kind], values).tobytes()
+        else:
+            stored_kind = 'json' if kind not in _TYPECODES else f'{kind}?'
+            raw = json.dumps(values, ensure_ascii=False).encode('utf-8')
+        blob = zlib.compress(raw, 6)
+        header_columns.append({'name': name, 'kind': stored_kind, 'offset': offset, 'length': len(blob)})
+        blobs.append(blob)
+        offset += len(blob)
+        numeric = [value for value in values if isinstance(value, (int, float))]
+        if kind in ('int', 'float', 'datetime') and numeric:
+            stats['columns'][name] = {'min': min(numeric), 'max': max(numeric)}
+
+    header = json.dumps({'rows': len(rows), 'columns': header_columns}).encode('utf-8')
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(path.suffix + '.tmp')
+    with open(tmp_path, 'wb') as handle:
+        handle.write(MAGIC)
+        handle.write(struct.pack('<I', len(header)))
+        handle.write(header)
+        for blob in blobs:
+            handle.write(blob)
+        handle.flush()
+        os.fsync(handle.fileno())
+    os.replace(tmp_path, path)
+    return stats
+
+
+def read_day_file(path: Path, names: Optional[Sequence[str]] = None) -> dict[str, list]:
+    """Lee las columnas pedidas (todas por defecto); las ausentes vuelven como ``None``."""
+    with open(path, 'rb') as handle:
+        if handle.read(4) != MAGIC:
+            raise ValueError(f'{path} no es un archivo de archivo válido.')
+        (header_len,) = struct.unpack('<I', handle.read(4))
+        header = json.loads(handle.read(header_len))
+        data_start = handle.tell()
+        available = {column['name']: column for column in header['columns']}
+        wanted = list(names) if names is not None else list(available)
+        result: dict[str, list] = {}
+        for name in wanted:
+            column = available.get(name)
+            if column is None:
+                result[name] = [None] * header['rows']
+                continue
+            handle.seek(data_start + column['offset'])
+            raw = zlib.decompress(handle.read(column['length']))
+            kind = column['kind']
+            if kind in _TYPECODES:
+                values = array(_TYPECODES[kind])
+                values.frombytes(raw)
+                values = values.tolist()
+            else:
+                values = json.loads(raw)
+            base_kind = kind.rstrip('?')
+            if base_kind == 'datetime':
+                values = [from_micros(value) if value is not None else None for value in values]
+            elif base_kind == 'bool':
+                values = [bool(value) if value is not None else None for value in values]
+            result[name] = values
+        return result
+
+
+class ArchiveIndex:
+    def __init__(self, directory: Path):
+        self.directory = directory
+        self.path = directory / INDEX_NAME
+        self.entries: dict[str, dict] = {}
+        if self.path.exists():
+            self.entries = json.loads(self.path.read_text(encoding='utf-8'))
+
+    def save(self) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix('.tmp')
+        tmp_path.write_text(json.dumps(self.entries, indent=1, sort_keys=True), encoding='utf-8')
+        os.replace(tmp_path, self.path)
+
+    def days_between(self, start: Optional[datetime], end: Optional[datetime]) -> list[str]:
+        start_us = to_micros(start) if start else None
+        end_us = to_micros(end) if end else None
+        days = []
+        for day, entry in sorted(self.entries.items()):
+            ts_range = entry['columns'].get('ts')
+            if ts_range is None:
+                continue
+            if start_us is not None and ts_range['max'] < start_us:
+                continue
+            if end_us is not None and ts_range['min'] >= end_us:
+                continue
+            days.append(day)
+        return days
+
+
+def archive_root() -> Path:
+    return Path(settings.ARCHIVE_DIR)
+
+
+def _day_bounds(day: date) -> tuple[datetime, datetime]:
+    start = datetime.combine(day, dt_time.min, tzinfo=dt_timezone.utc)
+    return start, start + timedelta(days=1)
+
+
+def _row_key(ts_pos: int, id_pos: int):
+    # Bloques anteriores a que se guardara el id devuelven ``id=None``.
+    return lambda row: (row[ts_pos], row[id_pos] if row[id_pos] is not None else -1)
+
+
+def _chunk_rows(columns: Sequence[str], start: Optional[datetime], end: Optional[datetime]) -> Iterator[tuple]:
+    from .timeseries import ChunkReader
+
+    return ChunkReader().iter_rows(columns, start=start, end=end)
+
+
+@dataclass
+class ArchiveResult:
+    table: str
+    day: date
+    rows: int
+
+
+class Archiver:
+    """Mueve días cerrados de las tablas históricas al archivo frío."""
+
+    def __init__(self, root: Optional[Path] = None):
+        self.root = root or archive_root()
+
+    def pending_days(self, model: type[models.Model], cutoff: date) -> list[date]:
+        first = model._default_manager.order_by('ts').values_list('ts', flat=True).first()
+        if model is TankState:
+            first_minute = TankStateChunk.objects.order_by('minute').values_list('minute', flat=True).first()
+            first = min(filter(None, (first, first_minute)), default=None)
+        if first is None:
+            return []
+        day = first.astimezone(dt_timezone.utc).date()
+        days = []
+        while day < cutoff:
+            days.append(day)
+            day += timedelta(days=1)
+        return days
+
+    def _archivable(self, model: type[models.Model], day: date) -> models.QuerySet:
+        start, end = _day_bounds(day)
+        queryset = model._default_manager.filter(ts__gte=start, ts__lt=end)
+        if model is TankState:
+            # El último estado de cada tanque se queda en la tabla viva.
+            queryset = queryset.exclude(pk__in=TankStateHead.objects.values('state_id'))
+        elif model is EventLog:
+            queryset = queryset.exclude(episode_open=True)
+        return queryset
+
+    def archive_day(self, name: str, day: date, *, dry_run: bool = False) -> ArchiveResult:
+        model = ARCHIVED_MODELS[name]
+        directory = self.root / name
+        columns = archive_columns(model)
+        names = [column for column, _ in columns]
+        row_key = _row_key(names.index('ts'), names.index('id'))
+        queryset = self._archivable(model, day).order_by('ts', 'id')
+        rows = list(queryset.values_list(*names))
+        live_ids = [row[0] for row in rows]
+        start, end = _day_bounds(day)
+        if model is TankState:
+            rows = sorted(rows + list(_chunk_rows(names, start, end)), key=row_key)
+        if not rows or dry_run:
+            return ArchiveResult(table=name, day=day, rows=len(rows))
+
+        index = ArchiveIndex(directory)
+        path = directory / f'{day.isoformat()}{FILE_SUFFIX}'
+        if path.exists():
+            # Reanudación: se agregan filas que hayan quedado de una corrida previa.
+            existing = read_day_file(path, names)
+            known_ids = set(existing['id'])
+            previous = list(zip(*(existing[column] for column in names)))
+            rows = sorted(previous + [row for row in rows if row[0] not in known_ids], key=row_key)
+        stats = write_day_file(path, columns, rows)
+        stats['file'] = path.name
+        index.entries[day.isoformat()] = stats
+        index.save()
+
+        for offset in range(0, len(live_ids), DELETE_BATCH_SIZE):
+            with transaction.atomic():
+                model._default_manager.filter(pk__in=live_ids[offset: offset + DELETE_BATCH_SIZE]).delete()
+        if model is TankState:
+            with transaction.atomic():
+                TankStateChunk.objects.filter(minute__gte=start, minute__lt=end).delete()
+        return ArchiveResult(table=name, day=day, rows=len(rows))
+
+    def run(self, cutoff: date, *, dry_run: bool = False) -> list[ArchiveResult]:
+        results = []
+        for name, model in ARCHIVED_MODELS.items():
+            for day in self.pending_days(model, cutoff):
+                result = self.archive_day(name, day, dry_run=dry_run)
+                if result.rows:
+                    results.append(result)
+        return results
+
+
+class ArchiveReader:
+    """Lee filas por rango de tiempo combinando el archivo frío y la tabla viva.
+
+    Para ``TankState`` también incluye los minutos compactados en
+    ``TankStateChunk``, expandidos bajo demanda.
+    """
+
+    def __init__(self, root: Optional[Path] = None):
+        self.root = root or archive_root()
+
+    def iter_rows(
+        self,
+        model: type[models.Model],
+        columns: Sequence[str],
+        *,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+    ) -> Iterator[tuple]:
+        """Devuelve tuplas con ``columns`` en orden ``(ts, id)`` dentro de ``[start, end)``.
+
+        Las filas de un día archivado que sigan en la tabla viva (último estado
+        del tanque, episodios abiertos o una corrida interrumpida) se combinan
+        sin duplicarse.
+        """
+        name = model._meta.model_name
+        index = ArchiveIndex(self.root / name)
+        wanted = list(dict.fromkeys([*columns, 'id', 'ts']))
+        n_out = len(columns)
+        for row in self._iter_wanted(index, name, model, wanted, start, end):
+            yield row[:n_out]
+
+    def _iter_wanted(self, index, name, model, wanted, start, end) -> Iterator[tuple]:
+        id_pos = wanted.index('id')
+        ts_pos = wanted.index('ts')
+        cursor_start = start
+        for day_text in index.days_between(start, end):
+            day_start, day_end = _day_bounds(date.fromisoformat(day_text))
+            # Días sin archivar previos al día archivado: solo tabla viva.
+            yield from self._live_rows(model, wanted, cursor_start, day_start)
+            data = read_day_file(self.root / name / index.entries[day_text]['file'], wanted)
+            archived = [
+                row for row in zip(*(data[column] for column in wanted))
+                if (start is None or row[ts_pos] >= start) and (end is None or row[ts_pos] < end)
+            ]
+            archived_ids = {row[id_pos] for row in archived}
+            leftovers = [
+                row for row in self._live_rows(
+                    model,
+                    wanted,
+                    day_start if start is None else max(start, day_start),
+                    day_end if end is None else min(end, day_end),
+                )
+                if row[id_pos] not in archived_ids
+            ]
+            yield from sorted(archived + leftovers, key=_row_key(ts_pos, id_pos))
+            cursor_start = day_end if start is None else max(start, day_end)
+        yield from self._live_rows(model, wanted, cursor_start, end)
+
+    def _live_rows(self, model, wanted, start, end) -> Iterable[tuple]:
+        """Filas de la tabla viva en ``[start, end)``; para ``TankState``, también las de los bloques."""
+        queryset = model._default_manager.all()
+        if start is not None:
+            queryset = queryset.filter(ts__gte=start)
+        if end is not None:
+            queryset = queryset.filter(ts__lt=end)
+        rows = queryset.order_by('ts', 'id').values_list(*wanted).iterator(chunk_size=2000)
+        if model is not TankState:
+            return rows
+        ts_pos = wanted.index('ts')
+        return heapq.merge(rows, _chunk_rows(wanted, start, end), key=lambda row: row[ts_pos])
@@ -0,0 +1,57 @@
+"""Agrupación de pasos concurrentes del mismo tanque (*single-flight*).
+
+Cuando varios hilos del proceso piden a la vez un paso sin lecturas del mismo
+tanque (p. ej. dashboards consultando ``/api/state``), solo el primero lo
+ejecuta y los demás esperan y reciben su resultado, en lugar de encolarse y
+escribir filas casi idénticas con tiempos transcurridos mínimos. La
+agrupación es por proceso; entre procesos el intervalo mínimo de
+``ControlService.poll_step`` evita los pasos duplicados.
+"""
+
+from __future__ import annotations
+
+import threading
+from typing import Any, Callable, Hashable, Optional
+
+
+class _Flight:
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """Ejecuta ``fn`` una sola vez por clave entre las llamadas concurrentes."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights: dict[Hashable, _Flight] = {}
+
+    def run(self, key: Hashable, fn: Callable[[], Any]) -> tuple[Any, bool]:
+        """Devuelve ``(resultado, compartido)``; ``compartido`` es verdadero para quienes esperaron."""
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result, True
+        try:
+            flight.result = fn()
+        except BaseException as exc:
+            flight.error = exc
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+        return flight.result, False
+
+
+steps = SingleFlight()
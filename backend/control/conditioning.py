@@ -0,0 +1,192 @@
+"""Acondicionamiento de señal previo a la decisión de control.
+
+Cada tanque tiene una cadena de filtros por variable (nivel y temperatura):
+mediana móvil o EWMA, seguida opcionalmente de un limitador de tasa de cambio.
+El estado de cada filtro es de tamaño fijo (buffers circulares sobre
+``array('d')``), así que el costo por muestra no crece con la frecuencia. La
+mediana mantiene además la ventana ordenada: cada muestra hace una inserción y
+un borrado con ``bisect`` (``log w`` comparaciones y un corrimiento de memoria
+de la lista) en lugar de reordenar toda la ventana.
+
+El estado vive en memoria del proceso que ejecuta el bucle (simulador,
+worker o ingesta); un cambio en la configuración del tanque lo reinicia.
+"""
+
+from __future__ import annotations
+
+import math
+import threading
+import time
+from array import array
+from bisect import bisect_left, insort
+from typing import Optional
+
+from .models import SignalFilter, TankConfig
+
+
+class RingBuffer:
+    """Buffer circular de flotantes con capacidad fija."""
+
+    __slots__ = ('_data', '_index', '_size')
+
+    def __init__(self, capacity: int):
+        if capacity < 1:
+            raise ValueError('La capacidad debe ser al menos 1.')
+        self._data = array('d', bytes(8 * capacity))
+        self._index = 0
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def push(self, value: float) -> Optional[float]:
+        """Agrega ``value`` y devuelve el valor desplazado si el buffer estaba lleno."""
+        evicted = self._data[self._index] if self._size == len(self._data) else None
+        self._data[self._index] = value
+        self._index = (self._index + 1) % len(self._data)
+        if self._size < len(self._data):
+            self._size += 1
+        return evicted
+
+    def values(self) -> list[float]:
+        if self._size < len(self._data):
+            return self._data[: self._size].tolist()
+        return self._data.tolist()
+
+
+class MedianFilter:
+    __slots__ = ('_buffer', '_ordered')
+
+    def __init__(self, window: int):
+        self._buffer = RingBuffer(window)
+        self._ordered: list[float] = []
+
+    def update(self, value: float) -> float:
+        ordered = self._ordered
+        evicted = self._buffer.push(value)
+        if evicted is not None:
+            del ordered[bisect_left(ordered, evicted)]
+        # Como en el buffer: el valor guardado en ``array('d')`` es un float.
+        insort(ordered, float(value))
+        mid = len(ordered) // 2
+        if len(ordered) % 2:
+            return ordered[mid]
+        return (ordered[mid - 1] + ordered[mid]) / 2
+
+
+class EwmaFilter:
+    __slots__ = ('alpha', '_value')
+
+    def __init__(self, alpha: float):
+        self.alpha = alpha
+        self._value: Optional[float] = None
+
+    def update(self, value: float) -> float:
+        if self._value is None:
+            self._value = value
+        else:
+            self._value += self.alpha * (value - self._value)
+        return self._value
+
+
+class RateClamp:
+    """Limita la variación por segundo respecto de la última salida."""
+
+    __slots__ = ('max_rate', '_value', '_ts')
+
+    def __init__(self, max_rate_per_s: float):
+        self.max_rate = max_rate_per_s
+        self._value: Optional[float] = None
+        self._ts: Optional[float] = None
+
+    def update(self, value: float, now: float) -> float:
+        if self._value is not None and self.max_rate > 0:
+            limit = self.max_rate * max(now - self._ts, 0.0)
+            value = min(self._value + limit, max(self._value - limit, value))
+        self._value = value
+        self._ts = now
+        return value
+
+
+class ChannelFilter:
+    """Cadena de filtros para una variable. Los valores no finitos pasan sin filtrar."""
+
+    __slots__ = ('_smoother', '_clamp')
+
+    def __init__(self, mode: str, window: int, alpha: float, max_rate_per_s: float):
+        if mode == SignalFilter.MEDIAN:
+            self._smoother = MedianFilter(window)
+        elif mode == SignalFilter.EWMA:
+            self._smoother = EwmaFilter(alpha)
+        else:
+            self._smoother = None
+        self._clamp = RateClamp(max_rate_per_s) if max_rate_per_s > 0 else None
+
+    def update(self, value: Optional[float], now: float) -> Optional[float]:
+        if value is None or math.isnan(value) or math.isinf(value):
+            # Las lecturas no finitas deben llegar al control para activar el modo seguro.
+            return value
+        if self._smoother is not None:
+            value = self._smoother.update(value)
+        if self._clamp is not None:
+            value = self._clamp.update(value, now)
+        return value
+
+
+class SignalConditioner:
+    def __init__(self, config: TankConfig):
+        self._lock = threading.Lock()
+        self.level = ChannelFilter(
+            config.signal_filter,
+            config.signal_filter_window,
+            config.signal_filter_alpha,
+            config.max_level_rate_lps,
+        )
+        self.temp = ChannelFilter(
+            config.signal_filter,
+            config.signal_filter_window,
+            config.signal_filter_alpha,
+            config.max_temp_rate_cps,
+        )
+
+    def update(
+        self,
+        level_l: Optional[float],
+        temp_c: Optional[float],
+        now: Optional[float] = None,
+    ) -> tuple[Optional[float], Optional[float]]:
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            return self.level.update(level_l, now), self.temp.update(temp_c, now)
+
+
+_lock = threading.Lock()
+_conditioners: dict[int, tuple[tuple, SignalConditioner]] = {}
+
+
+def _signature(config: TankConfig) -> tuple:
+    return (
+        config.updated_at,
+        config.signal_filter,
+        config.signal_filter_window,
+        config.signal_filter_alpha,
+        config.max_level_rate_lps,
+        config.max_temp_rate_cps,
+    )
+
+
+def conditioner_for(config: TankConfig) -> Optional[SignalConditioner]:
+    """Devuelve el acondicionador del tanque o ``None`` si no hay filtros activos."""
+    if (
+        config.signal_filter == SignalFilter.NONE
+        and config.max_level_rate_lps <= 0
+        and config.max_temp_rate_cps <= 0
+    ):
+        return None
+    signature = _signature(config)
+    with _lock:
+        cached = _conditioners.get(config.pk)
+        if cached is None or cached[0] != signature:
+            cached = (signature, SignalConditioner(config))
+            _conditioners[config.pk] = cached
+        return cached[1]
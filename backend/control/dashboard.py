@@ -0,0 +1,105 @@
+"""Instantánea del dashboard en una sola petición con tokens incrementales.
+
+El token es opaco para el cliente y codifica el último ``EventLog.id`` visto,
+la versión de la configuración (``pk`` + ``updated_at``) y el instante de
+emisión. Con él, ``/api/dashboard?since=<token>`` devuelve solo los eventos
+nuevos (o episodios actualizados desde entonces) y la configuración solo si
+cambió. Estado, eventos y configuración se leen en la misma transacción.
+
+Si hay más de ``EVENTS_LIMIT`` eventos nuevos se devuelven los más antiguos y
+el token avanza solo hasta el último devuelto; el resto llega en las
+siguientes consultas.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Optional, Sequence
+
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .archive import from_micros, to_micros
+from .models import EventLog, TankConfig, TankState
+from .services import ControlService
+
+EVENTS_LIMIT = 50
+
+
+@dataclass(frozen=True)
+class DashboardToken:
+    last_event_id: int
+    config_version: str
+    issued_at: datetime
+
+    def encode(self) -> str:
+        return f'{self.last_event_id}.{self.config_version}.{to_micros(self.issued_at)}'
+
+    @classmethod
+    def decode(cls, raw: Optional[str]) -> Optional['DashboardToken']:
+        """Interpreta el token; uno ausente o inválido equivale a pedir la instantánea completa."""
+        if not raw:
+            return None
+        try:
+            event_id, config_version, issued = raw.split('.')
+            return cls(int(event_id), config_version, from_micros(int(issued)))
+        except (ValueError, OverflowError):
+            return None
+
+
+def config_version(config: TankConfig) -> str:
+    return f'{config.pk}-{to_micros(config.updated_at)}'
+
+
+@dataclass
+class DashboardSnapshot:
+    token: DashboardToken
+    state: Optional[TankState]
+    events: list[Any]
+    config: Optional[TankConfig]
+
+
+def build_snapshot(
+    service: ControlService,
+    since: Optional[DashboardToken],
+    *,
+    events_limit: int = EVENTS_LIMIT,
+    event_columns: Sequence[str] = (),
+) -> DashboardSnapshot:
+    """Lee estado, eventos y configuración en una transacción y arma el siguiente token.
+
+    ``event_columns`` se pasa a ``values_list`` para usar el camino rápido de
+    serialización. ``config`` es ``None`` si no cambió desde ``since``.
+    """
+    with transaction.atomic():
+        issued_at = timezone.now()
+        config = TankConfig.objects.get(pk=service.config.pk)
+        # Se fija el último id antes de leer para no saltar inserciones concurrentes.
+        last_event_id = EventLog.objects.aggregate(last=Max('id'))['last'] or 0
+        events = EventLog.objects.filter(config=config)
+        if since is None:
+            latest = events.filter(id__lte=last_event_id).order_by('-id')
+            rows = list(latest.values_list(*event_columns)[:events_limit])
+        else:
+            new_events = events.filter(id__gt=since.last_event_id, id__lte=last_event_id)
+            ascending = new_events.order_by('id').values_list('id', flat=True)
+            overflow = list(ascending[events_limit - 1:events_limit + 1])
+            if len(overflow) > 1:
+                last_event_id = overflow[0]
+                new_events = new_events.filter(id__lte=last_event_id)
+            rows = list(new_events.order_by('-id').values_list(*event_columns))
+            # Episodios ya enviados que se repitieron: pocos (uno abierto por código), sin límite.
+            # La cota de id se aplica aquí para que la consulta use (config, last_ts) y no
+            # recorra por id todos los eventos anteriores del tanque.
+            repeated = events.filter(last_ts__gte=since.issued_at).values_list('id', flat=True)
+            updated_ids = [pk for pk in repeated if pk <= since.last_event_id]
+            if updated_ids:
+                updated = EventLog.objects.filter(id__in=updated_ids).order_by('-id')
+                rows += updated.values_list(*event_columns)
+        state = service.get_latest_state()
+        version = config_version(config)
+    changed = since is None or since.config_version != version
+    token = DashboardToken(last_event_id, version, issued_at)
+    return DashboardSnapshot(token, state, rows, config if changed else None)
@@ -0,0 +1,198 @@
+"""Serialización rápida para endpoints de lectura intensiva.
+
+Los ``ModelSerializer`` de DRF introspectan campos y convierten valor por valor
+en cada respuesta. Aquí se precompila un plan de campos una sola vez a partir
+del serializer existente, se lee directamente de ``values_list()`` y se
+codifica con ``orjson`` cuando está disponible. La salida JSON es la misma que
+produce el serializer de DRF.
+"""
+
+from __future__ import annotations
+
+import json
+from typing import Any, Callable, Iterable, Optional, Sequence
+
+from django.conf import settings
+from django.db import models
+from django.utils import timezone
+from django.utils.cache import patch_vary_headers
+from django.utils.text import compress_string
+from rest_framework.renderers import BrowsableAPIRenderer, JSONRenderer
+from rest_framework.utils import encoders
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depende del entorno
+    orjson = None
+
+
+Converter = Callable[[Any], Any]
+_drf_encoder = encoders.JSONEncoder()
+
+
+def _datetime_to_json(value):
+    # Igual que rest_framework.fields.DateTimeField.to_representation.
+    if not value:
+        return None
+    if timezone.is_aware(value):
+        value = value.astimezone(timezone.get_current_timezone())
+    else:
+        value = timezone.make_aware(value, timezone.get_current_timezone())
+    text = value.isoformat()
+    if text.endswith('+00:00'):
+        text = text[:-6] + 'Z'
+    return text
+
+
+def _converter_for(field: models.Field) -> Optional[Converter]:
+    if isinstance(field, models.DateTimeField):
+        return _datetime_to_json
+    return None
+
+
+class FieldPlan:
+    """Plan precompilado de columnas y conversiones para un serializer.
+
+    ``rendered`` asocia un campo con ``(función, columnas)``: el valor de salida
+    es ``función(valor, {columna: valor})``, y esas columnas se leen aunque no
+    estén entre los campos pedidos (p. ej. el mensaje de ``EventLog``).
+    """
+
+    def __init__(
+        self,
+        model: type[models.Model],
+        names: Sequence[str],
+        rendered: Optional[dict[str, tuple[Callable[[Any, dict], Any], Sequence[str]]]] = None,
+    ):
+        self.model = model
+        self.names = tuple(names)
+        self.rendered = rendered or {}
+        self.columns = []
+        self.converters = []
+        for name in self.names:
+            field = model._meta.get_field(name)
+            self.columns.append(field.attname if field.is_relation else name)
+            self.converters.append(_converter_for(field))
+        self._renderers = []
+        for name, (render, extra) in self.rendered.items():
+            if name not in self.names:
+                continue
+            for column in extra:
+                if column not in self.columns:
+                    self.columns.append(column)
+            self._renderers.append(
+                (self.names.index(name), render, tuple((column, self.columns.index(column)) for column in extra))
+            )
+        self.columns = tuple(self.columns)
+        self.converters = tuple(self.converters)
+        self._projections: dict[tuple[str, ...], FieldPlan] = {}
+
+    @classmethod
+    def from_serializer(cls, serializer_class) -> 'FieldPlan':
+        meta = serializer_class.Meta
+        return cls(meta.model, meta.fields, getattr(meta, 'rendered_fields', None))
+
+    def project(self, fields_param: Optional[str]) -> 'FieldPlan':
+        """Devuelve el plan restringido a ``?fields=a,b`` (en el orden original).
+
+        La caché se indexa por los campos válidos en el orden del plan, no por el
+        texto del cliente: a lo sumo hay un plan por subconjunto de campos.
+        """
+        if not fields_param:
+            return self
+        requested = {name.strip() for name in fields_param.split(',')}
+        names = tuple(name for name in self.names if name in requested)
+        if not names or names == self.names:
+            return self
+        plan = self._projections.get(names)
+        if plan is None:
+            plan = self._projections[names] = FieldPlan(self.model, names, self.rendered)
+        return plan
+
+    def row_to_dict(self, row: Sequence[Any]) -> dict[str, Any]:
+        if self._renderers:
+            values = list(row)
+            for position, render, extra in self._renderers:
+                values[position] = render(row[position], {column: row[index] for column, index in extra})
+            row = values
+        return {
+            name: convert(value) if convert and value is not None else value
+            for name, convert, value in zip(self.names, self.converters, row)
+        }
+
+    def rows(self, queryset: models.QuerySet) -> list[dict[str, Any]]:
+        return [self.row_to_dict(row) for row in queryset.values_list(*self.columns)]
+
+    def instance(self, obj: models.Model) -> dict[str, Any]:
+        return self.row_to_dict([getattr(obj, column) for column in self.columns])
+
+
+def dumps(data: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(data, default=_drf_encoder.default)
+    return json.dumps(data, cls=encoders.JSONEncoder, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+class FastJSONRenderer(JSONRenderer):
+    """``JSONRenderer`` que codifica con ``orjson`` salvo que se pida indentación."""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if self.get_indent(accepted_media_type or '', renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        return dumps(data)
+
+
+def compress_response(request, response):
+    """Comprime con gzip las respuestas mayores a ``FAST_JSON_COMPRESS_MIN_BYTES``."""
+    patch_vary_headers(response, ('Accept-Encoding',))
+    if response.has_header('Content-Encoding'):
+        return response
+    if 'gzip' not in request.META.get('HTTP_ACCEPT_ENCODING', ''):
+        return response
+    threshold = getattr(settings, 'FAST_JSON_COMPRESS_MIN_BYTES', 1024)
+    if len(response.content) < threshold:
+        return response
+    compressed = compress_string(response.content)
+    if len(compressed) < len(response.content):
+        response.content = compressed
+        response['Content-Encoding'] = 'gzip'
+        response['Content-Length'] = str(len(compressed))
+    return response
+
+
+class FastReadMixin:
+    """Mixin para vistas de lectura: renderer rápido y compresión por umbral."""
+
+    renderer_classes = [FastJSONRenderer, BrowsableAPIRenderer]
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if hasattr(response, 'add_post_render_callback'):
+            response.add_post_render_callback(lambda rendered: compress_response(request, rendered))
+        else:
+            compress_response(request, response)
+        return response
+
+
+def iter_chunks(
+    plan: FieldPlan,
+    rows: models.QuerySet | Iterable[Sequence[Any]],
+    chunk_size: int = 2000,
+) -> Iterable[bytes]:
+    """Genera un arreglo JSON por partes para exportaciones grandes.
+
+    ``rows`` puede ser un queryset o cualquier iterable de tuplas en el orden
+    de ``plan.columns`` (por ejemplo, la lectura combinada del archivo frío).
+    """
+    if isinstance(rows, models.QuerySet):
+        rows = rows.values_list(*plan.columns).iterator(chunk_size=chunk_size)
+    yield b'['
+    first = True
+    for row in rows:
+        if not first:
+            yield b','
+        yield dumps(plan.row_to_dict(row))
+        first = False
+    yield b']'
@@ -0,0 +1,294 @@
+"""Servicio asyncio para recibir lecturas de sensores por TCP/UDP.
+
+Los transmisores de campo pueden reportar a 10–100 Hz. En lugar de ejecutar un
+paso de control por lectura, las lecturas válidas se agregan por tick y solo el
+valor agregado se entrega a ``ControlService.step``.
+
+Protocolo de línea (una lectura por línea o datagrama)::
+
+    level=82.5 temp=34.1
+
+Se acepta también ``82.5,34.1``. Cualquiera de los dos valores puede omitirse
+en el formato ``clave=valor``.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+
+AGGREGATE_MEAN = 'mean'
+AGGREGATE_LAST = 'last'
+AGGREGATE_CHOICES = (AGGREGATE_MEAN, AGGREGATE_LAST)
+
+
+class MalformedReading(ValueError):
+    """La línea recibida no respeta el protocolo."""
+
+
+@dataclass
+class Reading:
+    level_l: Optional[float]
+    temp_c: Optional[float]
+
+
+def parse_line(line: str) -> Reading:
+    text = line.strip()
+    if not text:
+        raise MalformedReading('Línea vacía.')
+    try:
+        if '=' in text:
+            values = {}
+            for token in text.replace(',', ' ').split():
+                key, _, raw = token.partition('=')
+                values[key.strip().lower()] = float(raw)
+            unknown = set(values) - {'level', 'temp'}
+            if unknown or not values:
+                raise MalformedReading(f'Claves desconocidas: {sorted(unknown)}')
+            return Reading(level_l=values.get('level'), temp_c=values.get('temp'))
+        level_raw, temp_raw = text.split(',')
+        return Reading(level_l=float(level_raw), temp_c=float(temp_raw))
+    except ValueError as exc:
+        if isinstance(exc, MalformedReading):
+            raise
+        raise MalformedReading(f'Lectura inválida: {text!r}') from exc
+
+
+@dataclass
+class IngestStats:
+    received: int = 0
+    accepted: int = 0
+    rejected: int = 0
+    malformed: int = 0
+    ticks: int = 0
+    empty_ticks: int = 0
+    overruns: int = 0
+    step_errors: int = 0
+    started_at: float = field(default_factory=time.monotonic)
+
+    @property
+    def dropped(self) -> int:
+        return self.rejected + self.malformed
+
+    def rate_hz(self, now: Optional[float] = None) -> float:
+        elapsed = (now or time.monotonic()) - self.started_at
+        return self.received / elapsed if elapsed > 0 else 0.0
+
+
+class TickAggregator:
+    """Acumula lecturas de un tick en O(1) por muestra."""
+
+    def __init__(self, mode: str = AGGREGATE_MEAN):
+        if mode not in AGGREGATE_CHOICES:
+            raise ValueError(f'Modo de agregación desconocido: {mode}')
+        self.mode = mode
+        self.reset()
+
+    def reset(self) -> None:
+        self._level_sum = self._temp_sum = 0.0
+        self._level_count = self._temp_count = 0
+        self._level_last: Optional[float] = None
+        self._temp_last: Optional[float] = None
+
+    def add(self, reading: Reading) -> None:
+        if reading.level_l is not None:
+            self._level_sum += reading.level_l
+            self._level_count += 1
+            self._level_last = reading.level_l
+        if reading.temp_c is not None:
+            self._temp_sum += reading.temp_c
+            self._temp_count += 1
+            self._temp_last = reading.temp_c
+
+    @property
+    def samples(self) -> int:
+        return max(self._level_count, self._temp_count)
+
+    def flush(self) -> Optional[Reading]:
+        if not self.samples:
+            return None
+        if self.mode == AGGREGATE_LAST:
+            reading = Reading(level_l=self._level_last, temp_c=self._temp_last)
+        else:
+            reading = Reading(
+                level_l=self._level_sum / self._level_count if self._level_count else None,
+                temp_c=self._temp_sum / self._temp_count if self._temp_count else None,
+            )
+        self.reset()
+        return reading
+
+
+class IngestService:
+    """Recibe lecturas, las valida, las agrega y ejecuta un paso por tick.
+
+    ``validate(level, temp)`` debe devolver ``True`` si la lectura es inválida
+    (misma semántica que ``ControlService.sensors_invalid``); ``step(level, temp)``
+    es síncrono y se ejecuta en un hilo dedicado para no bloquear el event loop.
+    Si un paso falla (base bloqueada, ``StepConflict`` tras los reintentos), el
+    error se cuenta en ``stats.step_errors``, se informa a ``on_error`` y el
+    siguiente tick vuelve a intentar con las lecturas nuevas.
+    """
+
+    def __init__(
+        self,
+        *,
+        validate: Callable[[float, float], bool],
+        step: Callable[[Optional[float], Optional[float]], object],
+        interval_s: float = 1.0,
+        aggregate: str = AGGREGATE_MEAN,
+        on_tick: Optional[Callable[[Reading, object], None]] = None,
+        on_error: Optional[Callable[[Exception], None]] = None,
+    ):
+        self.validate = validate
+        self.step = step
+        self.interval_s = interval_s
+        self.aggregator = TickAggregator(aggregate)
+        self.on_tick = on_tick
+        self.on_error = on_error
+        self.stats = IngestStats()
+        self._last_level: Optional[float] = None
+        self._last_temp: Optional[float] = None
+        self._last_invalid: Optional[Reading] = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='ingest-step')
+
+    def feed(self, line: str) -> None:
+        self.stats.received += 1
+        try:
+            reading = parse_line(line)
+        except MalformedReading:
+            self.stats.malformed += 1
+            return
+        # Se valida con el último valor conocido para la variable ausente.
+        level = reading.level_l if reading.level_l is not None else self._last_level
+        temp = reading.temp_c if reading.temp_c is not None else self._last_temp
+        check_level = level if level is not None else 0.0
+        check_temp = temp if temp is not None else 0.0
+        if self.validate(check_level, check_temp):
+            self.stats.rejected += 1
+            self._last_invalid = Reading(level_l=level, temp_c=temp)
+            return
+        self._last_level, self._last_temp = level, temp
+        self.stats.accepted += 1
+        self.aggregator.add(reading)
+
+    async def tick(self) -> Optional[object]:
+        reading = self.aggregator.flush()
+        invalid, self._last_invalid = self._last_invalid, None
+        self.stats.ticks += 1
+        if reading is None:
+            if invalid is None:
+                self.stats.empty_ticks += 1
+                return None
+            # Solo hubo lecturas inválidas: el paso debe verlas para entrar en modo seguro.
+            reading = invalid
+        loop = asyncio.get_running_loop()
+        result = await loop.run_in_executor(
+            self._executor,
+            self.step,
+            reading.level_l,
+            reading.temp_c,
+        )
+        if self.on_tick:
+            self.on_tick(reading, result)
+        return result
+
+    async def run_ticks(self, stop: asyncio.Event) -> None:
+        loop = asyncio.get_running_loop()
+        next_deadline = loop.time() + self.interval_s
+        while not stop.is_set():
+            try:
+                await asyncio.wait_for(stop.wait(), timeout=max(0.0, next_deadline - loop.time()))
+            except asyncio.TimeoutError:
+                pass
+            if stop.is_set():
+                break
+            try:
+                await self.tick()
+            except Exception as exc:
+                # Un paso fallido no debe terminar la tarea: el tanque quedaría sin pasos.
+                self.stats.step_errors += 1
+                if self.on_error:
+                    self.on_error(exc)
+            next_deadline += self.interval_s
+            now = loop.time()
+            if now > next_deadline:
+                skipped = int((now - next_deadline) // self.interval_s) + 1
+                self.stats.overruns += skipped
+                next_deadline += skipped * self.interval_s
+
+    async def start_tcp(self, host: str, port: int) -> asyncio.AbstractServer:
+        async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+            try:
+                while True:
+                    line = await reader.readline()
+                    if not line:
+                        break
+                    self.feed(line.decode('utf-8', errors='replace'))
+            finally:
+                writer.close()
+
+        return await asyncio.start_server(handle, host, port)
+
+    async def start_udp(self, host: str, port: int) -> asyncio.DatagramTransport:
+        service = self
+
+        class Protocol(asyncio.DatagramProtocol):
+            def datagram_received(self, data, addr):
+                for line in data.decode('utf-8', errors='replace').splitlines():
+                    service.feed(line)
+
+        loop = asyncio.get_running_loop()
+        transport, _ = await loop.create_datagram_endpoint(Protocol, local_addr=(host, port))
+        return transport
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True)
+
+
+async def loopback_generator(
+    host: str,
+    port: int,
+    *,
+    protocol: str = 'udp',
+    rate_hz: float = 50.0,
+    count: int = 0,
+    base_level: float = 80.0,
+    base_temp: float = 32.0,
+) -> int:
+    """Envía lecturas sintéticas a ``host:port`` para probar el servicio localmente."""
+    interval = 1.0 / rate_hz
+    sent = 0
+    loop = asyncio.get_running_loop()
+    writer = transport = None
+    if protocol == 'tcp':
+        _, writer = await asyncio.open_connection(host, port)
+    else:
+        transport, _ = await loop.create_datagram_endpoint(
+            asyncio.DatagramProtocol,
+            remote_addr=(host, port),
+        )
+    try:
+        while count == 0 or sent < count:
+            phase = sent * interval
+            line = (
+                f'level={base_level + math.sin(phase):.3f} '
+                f'temp={base_temp + 0.5 * math.cos(phase):.3f}\n'
+            ).encode()
+            if writer is not None:
+                writer.write(line)
+                await writer.drain()
+            else:
+                transport.sendto(line)
+            sent += 1
+            await asyncio.sleep(interval)
+    finally:
+        if writer is not None:
+            writer.close()
+            await writer.wait_closed()
+        if transport is not None:
+            transport.close()
+    return sent
@@ -0,0 +1,432 @@
+"""Diario local para seguir controlando cuando la base de datos no responde.
+
+Si un paso falla con ``OperationalError``/``InterfaceError`` (MySQL
+reiniciando, SQLite bloqueada más allá de los reintentos), ``StoreAndForward``
+pasa a modo diario: calcula los pasos siguientes en memoria con
+``ControlService.decide`` y ``transition_events`` a partir del último estado
+conocido, y agrega estados y eventos a ``JOURNAL_DIR/tank-<pk>.journal``. El
+archivo es de solo agregado, una línea JSON por registro, y se sincroniza con
+``fsync`` por lotes (cada ``JOURNAL_FSYNC_EVERY`` registros o
+``JOURNAL_FSYNC_INTERVAL_S`` segundos). Una línea final incompleta (corte a
+mitad de escritura) se descarta al reabrir.
+
+Cada ``JOURNAL_RETRY_S`` se intenta reenviar el diario. El reenvío avanza un
+lote de ``JOURNAL_REPLAY_BATCH`` estados por paso, cada lote en una transacción
+con ``bulk_create``, y el bucle sigue agregando al final mientras se pone al
+día; recién al vaciar el diario los pasos vuelven a la base. La clave
+idempotente es ``(config, seq)``: un lote ya confirmado (p. ej. antes de un
+reinicio del proceso) se saltea con sus eventos, así que reenviar dos veces no
+duplica filas. Si otro escritor ocupó una secuencia, gana la fila existente.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Iterator, Optional
+
+from django.conf import settings
+from django.db import InterfaceError, OperationalError, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import (
+    EventCode,
+    EventLog,
+    EventSeverity,
+    TankState,
+    TankStateHead,
+    actuator_bits,
+)
+from .services import ControlResult, ControlService
+
+DB_ERRORS = (OperationalError, InterfaceError)
+
+RECORD_STATE = 'state'
+RECORD_EVENT = 'event'
+# Repetición de un episodio de ``SAFE_MODE`` abierto (suma ``occurrences``).
+RECORD_REPEAT = 'repeat'
+# El modo seguro se despejó: cierra el episodio abierto.
+RECORD_CLOSE = 'close'
+
+STATE_FIELDS = ('level_l', 'temp_c', 'valve_open', 'drain_valve_open', 'heater_on', 'safe_mode')
+EVENT_FIELDS = ('level_l', 'temp_c', 'power_w', 'prev_actuators', 'new_actuators')
+
+
+def journal_path(config_pk: int) -> Path:
+    return Path(settings.JOURNAL_DIR) / f'tank-{config_pk}.journal'
+
+
+class Journal:
+    """Archivo de registros JSON de solo agregado con ``fsync`` por lotes."""
+
+    def __init__(
+        self,
+        path: Path,
+        *,
+        fsync_every: Optional[int] = None,
+        fsync_interval_s: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.path = Path(path)
+        self.fsync_every = settings.JOURNAL_FSYNC_EVERY if fsync_every is None else fsync_every
+        self.fsync_interval_s = settings.JOURNAL_FSYNC_INTERVAL_S if fsync_interval_s is None else fsync_interval_s
+        self.clock = clock
+        self._file = None
+        self._unsynced = 0
+        self._synced_at = clock()
+
+    @property
+    def pending(self) -> bool:
+        return self.size > 0
+
+    @property
+    def size(self) -> int:
+        try:
+            return self.path.stat().st_size
+        except FileNotFoundError:
+            return 0
+
+    def append(self, record: dict) -> None:
+        handle = self._open()
+        handle.write(json.dumps(record, separators=(',', ':')).encode() + b'\n')
+        handle.flush()
+        self._unsynced += 1
+        if self._unsynced >= self.fsync_every or self.clock() - self._synced_at >= self.fsync_interval_s:
+            self.sync()
+
+    def sync(self) -> None:
+        if self._file is not None and self._unsynced:
+            os.fsync(self._file.fileno())
+        self._unsynced = 0
+        self._synced_at = self.clock()
+
+    def read(self, offset: int = 0, max_states: Optional[int] = None) -> tuple[list[dict], int]:
+        """Registros completos desde ``offset`` y la posición siguiente.
+
+        Con ``max_states`` corta antes del estado que lo excedería, de modo que
+        un estado nunca queda separado de sus eventos.
+        """
+        records = []
+        states = 0
+        if not self.path.exists():
+            return records, offset
+        with open(self.path, 'rb') as handle:
+            handle.seek(offset)
+            for line in handle:
+                if not line.endswith(b'\n'):
+                    break
+                record = json.loads(line)
+                if record['t'] == RECORD_STATE:
+                    if max_states is not None and states >= max_states:
+                        break
+                    states += 1
+                records.append(record)
+                offset += len(line)
+        return records, offset
+
+    def records(self) -> Iterator[dict]:
+        offset = 0
+        while True:
+            batch, offset = self.read(offset, max_states=1000)
+            if not batch:
+                return
+            yield from batch
+
+    def clear(self) -> None:
+        """Vacía el diario una vez reenviado."""
+        self.close()
+        self.path.unlink(missing_ok=True)
+
+    def close(self) -> None:
+        if self._file is not None:
+            self.sync()
+            self._file.close()
+            self._file = None
+
+    def _open(self):
+        if self._file is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._repair()
+            self._file = open(self.path, 'ab')
+        return self._file
+
+    def _repair(self) -> None:
+        """Recorta una última línea incompleta para no pegarle el próximo registro."""
+        if not self.path.exists():
+            return
+        with open(self.path, 'r+b') as handle:
+            data = handle.read()
+            if data and not data.endswith(b'\n'):
+                handle.truncate(data.rfind(b'\n') + 1)
+                handle.flush()
+                os.fsync(handle.fileno())
+
+
+def _state_record(state: TankState) -> dict:
+    record = {'t': RECORD_STATE, 'seq': state.seq, 'ts': state.ts.isoformat()}
+    record.update({name: getattr(state, name) for name in STATE_FIELDS})
+    return record
+
+
+def _state_from(record: dict, config) -> TankState:
+    return TankState(
+        config=config,
+        seq=record['seq'],
+        ts=datetime.fromisoformat(record['ts']),
+        **{name: record[name] for name in STATE_FIELDS},
+    )
+
+
+class StoreAndForward:
+    """Paso de control que sigue en modo diario mientras la base no responde.
+
+    ``retries`` y ``retry_sleep_s`` reintentan un paso en línea antes de pasar
+    a modo diario (bloqueos breves de SQLite); ``on_retry(intento, error)`` se
+    llama en cada reintento.
+    """
+
+    def __init__(
+        self,
+        service: ControlService,
+        journal: Optional[Journal] = None,
+        *,
+        retries: int = 0,
+        retry_sleep_s: float = 0.0,
+        retry_s: Optional[float] = None,
+        batch_size: Optional[int] = None,
+        on_retry: Optional[Callable[[int, Exception], None]] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.service = service
+        self.journal = journal or Journal(journal_path(service.config.pk))
+        self.retries = retries
+        self.retry_sleep_s = retry_sleep_s
+        self.retry_s = settings.JOURNAL_RETRY_S if retry_s is None else retry_s
+        self.batch_size = settings.JOURNAL_REPLAY_BATCH if batch_size is None else batch_size
+        self.on_retry = on_retry
+        self.clock = clock
+        self.replayed = 0
+        self._latest: Optional[TankState] = None
+        self._offset = 0
+        self._next_attempt = 0.0
+        self._episode: Optional[EventLog] = None
+        if self.journal.pending:
+            # Diario de una ejecución anterior: se sigue desde su último estado.
+            for record in self.journal.records():
+                if record['t'] == RECORD_STATE:
+                    self._latest = _state_from(record, service.config)
+
+    @property
+    def offline(self) -> bool:
+        return self.journal.pending
+
+    def latest_state(self) -> Optional[TankState]:
+        if not self.offline:
+            try:
+                self._latest = self.service.get_latest_state() or self._latest
+            except DB_ERRORS:
+                self._disconnect()
+        return self._latest
+
+    def step(self, level_l: Optional[float] = None, temp_c: Optional[float] = None) -> ControlResult:
+        level_l, temp_c = self.service.condition(level_l, temp_c)
+        if self.offline and not self._forward():
+            return self._offline_step(level_l, temp_c)
+        attempts = 0
+        while True:
+            try:
+                result = self.service.step(level_l, temp_c, conditioned=True)
+            except DB_ERRORS as exc:
+                attempts += 1
+                if attempts > self.retries:
+                    self._disconnect()
+                    return self._offline_step(level_l, temp_c, exc)
+                if self.on_retry is not None:
+                    self.on_retry(attempts, exc)
+                time.sleep(self.retry_sleep_s)
+                continue
+            self._latest = result.state
+            return result
+
+    def _forward(self) -> bool:
+        """Reenvía un lote si toca; verdadero cuando el diario quedó vacío."""
+        if self.clock() < self._next_attempt:
+            return False
+        self.journal.sync()
+        episode = self._episode
+        try:
+            records, offset = self.journal.read(self._offset, max_states=self.batch_size)
+            if records:
+                self.replayed += self._replay(records)
+            self._offset = offset
+            if offset < self.journal.size:
+                return False
+        except DB_ERRORS:
+            # El lote se revirtió: el episodio vuelve a ser el del lote anterior.
+            self._episode = episode
+            self._disconnect()
+            return False
+        self.journal.clear()
+        self._offset = 0
+        self._episode = None
+        return True
+
+    def _replay(self, records: list[dict]) -> int:
+        config = self.service.config
+        states = {record['seq']: _state_from(record, config) for record in records if record['t'] == RECORD_STATE}
+        with transaction.atomic():
+            existing = set(
+                TankState.objects.filter(config=config, seq__in=list(states)).values_list('seq', flat=True)
+            )
+            new_states = [state for seq, state in states.items() if seq not in existing]
+            if not new_states:
+                return 0
+            TankState.objects.bulk_create(new_states)
+            if any(state.pk is None for state in new_states):
+                # MySQL no devuelve las pk desde bulk_create.
+                ids = dict(
+                    TankState.objects.filter(config=config, seq__in=[state.seq for state in new_states])
+                    .values_list('seq', 'id')
+                )
+                for state in new_states:
+                    state.pk = ids[state.seq]
+            events = self._events(records, {state.seq: state for state in new_states})
+            EventLog.objects.bulk_create(events)
+            episode = self._episode
+            if episode is not None and episode.pk is None:
+                # Sin pk (MySQL), _repeat y _close del lote siguiente no llegarían a la fila.
+                episode.pk = (
+                    EventLog.objects.filter(state=episode.state, code=episode.code, episode_open=True)
+                    .values_list('id', flat=True)
+                    .get()
+                )
+            newest = new_states[-1]
+            # El latido también se renueva: el bucle sigue vivo mientras se pone al día.
+            fields = {'seq': newest.seq, 'state': newest, 'heartbeat_at': timezone.now()}
+            if not TankStateHead.objects.filter(config=config, seq__lt=newest.seq).update(**fields):
+                if not TankStateHead.objects.filter(config=config).exists():
+                    TankStateHead.objects.create(config=config, **fields)
+        return len(new_states)
+
+    def _events(self, records: list[dict], states: dict[int, TankState]) -> list[EventLog]:
+        """Eventos del lote; las repeticiones y cierres de ``SAFE_MODE`` se aplican al episodio."""
+        events = []
+        for record in records:
+            state = states.get(record.get('seq'))
+            if record['t'] == RECORD_STATE or state is None:
+                continue
+            if record['t'] == RECORD_EVENT:
+                event = EventLog(
+                    config=state.config,
+                    code=record['code'],
+                    message=record['message'],
+                    severity=record['severity'],
+                    ts=state.ts,
+                    state=state,
+                    **{name: record.get(name) for name in EVENT_FIELDS},
+                )
+                if record.get('episode'):
+                    event.episode_open = True
+                    self._episode = event
+                events.append(event)
+            elif record['t'] == RECORD_REPEAT:
+                self._repeat(state.ts)
+            elif record['t'] == RECORD_CLOSE:
+                self._close()
+        return events
+
+    def _repeat(self, ts: datetime) -> None:
+        episode = self._episode
+        if episode is not None and episode.pk is None:
+            episode.occurrences += 1
+            episode.last_ts = ts
+            return
+        if episode is None:
+            # El episodio se abrió en línea, antes de la caída.
+            episode = (
+                EventLog.objects.filter(
+                    code=EventCode.SAFE_MODE,
+                    severity=EventSeverity.WARNING,
+                    episode_open=True,
+                    config=self.service.config,
+                )
+                .order_by('-id')
+                .first()
+            )
+            if episode is None:
+                return
+            self._episode = episode
+        EventLog.objects.filter(pk=episode.pk).update(occurrences=F('occurrences') + 1, last_ts=ts)
+
+    def _close(self) -> None:
+        episode, self._episode = self._episode, None
+        if episode is not None and episode.pk is None:
+            episode.episode_open = False
+        else:
+            EventLog.close_episodes(EventCode.SAFE_MODE, self.service.config)
+
+    def _offline_step(
+        self,
+        level_l: Optional[float],
+        temp_c: Optional[float],
+        error: Optional[Exception] = None,
+    ) -> ControlResult:
+        previous = self._latest
+        if previous is None:
+            if error is not None:
+                raise error
+            raise OperationalError('No hay un estado previo para continuar sin base de datos.')
+        if not self.journal.pending:
+            self.replayed = 0
+        service = self.service
+        now = timezone.now()
+        elapsed = max(0.0, min((now - previous.ts).total_seconds(), service.MAX_ELAPSED_SECONDS)) or 1.0
+        decision = service.decide(previous, level_l, temp_c, elapsed, has_previous=True)
+        state = TankState(config=service.config, seq=previous.seq + 1, ts=now, **decision.state_fields())
+        journal = self.journal
+        journal.append(_state_record(state))
+        readings = {'level_l': decision.level_l, 'temp_c': decision.temp_c, 'power_w': decision.power_w}
+        coalesce = settings.EVENT_COALESCE_WINDOW_S > 0
+        if decision.safe_mode:
+            if previous.safe_mode and coalesce:
+                journal.append({'t': RECORD_REPEAT, 'seq': state.seq})
+            else:
+                journal.append({
+                    't': RECORD_EVENT,
+                    'seq': state.seq,
+                    'code': EventCode.SAFE_MODE,
+                    'message': service.SAFE_MODE_MESSAGE,
+                    'severity': EventSeverity.WARNING,
+                    'episode': coalesce,
+                    'prev_actuators': actuator_bits(previous),
+                    'new_actuators': actuator_bits(state),
+                    **readings,
+                })
+        if previous.safe_mode and not state.safe_mode:
+            journal.append({'t': RECORD_CLOSE, 'seq': state.seq})
+        for event in service.transition_events(
+            previous,
+            state,
+            decision.forced_heater_shutdown,
+            power_w=decision.power_w,
+        ):
+            record = {'t': RECORD_EVENT, 'seq': state.seq, 'code': event.code, 'message': event.message}
+            record['severity'] = event.severity
+            record.update({name: event.fields[name] for name in EVENT_FIELDS})
+            journal.append(record)
+        self._latest = state
+        return ControlResult(state=state, created=True)
+
+    def _disconnect(self) -> None:
+        """Cierra la conexión rota para que el próximo intento reconecte."""
+        self._next_attempt = self.clock() + self.retry_s
+        if connection.in_atomic_block:
+            return
+        try:
+            connection.close()
+        except DB_ERRORS:
+            pass
@@ -0,0 +1,190 @@
+"""Elección de líder por tanque con arrendamientos en la base de datos.
+
+Varios procesos (API, ``run_simulation``, worker, ingesta) pueden apuntar a la
+misma base; solo el dueño del ``TankLease`` de un tanque ejecuta pasos de
+control y los demás sirven lecturas. El dueño renueva el arrendamiento con un
+``UPDATE`` condicionado a seguir siéndolo; otro nodo solo puede tomarlo con un
+``UPDATE`` condicionado a que haya vencido, así que la base decide al ganador
+sin bloqueos explícitos. Cada cambio de dueño incrementa ``epoch`` y queda en
+``EventLog`` como ``LEASE_ACQUIRED``.
+
+Entre renovaciones el dueño confía en su copia local durante ``renew_s``
+(por defecto un tercio de ``ttl_s``), de modo que deja de pasar antes de que el
+arrendamiento pueda vencer en la base. Se supone que los relojes de los nodos
+difieren bastante menos que ``ttl_s - renew_s``.
+
+Un nodo que no es dueño recuerda al dueño observado y su ``expires_at`` y no
+vuelve a intentar hasta entonces, así que servir lecturas no escribe en la
+base. Una liberación explícita la notan de inmediato solo los nodos que aún no
+habían visto el arrendamiento ocupado; el resto espera el vencimiento observado.
+
+Con ``LEASES_ENABLED`` desactivado (por defecto) ``owns_tank`` siempre es
+verdadero y el comportamiento de un solo nodo no cambia.
+"""
+
+from __future__ import annotations
+
+import os
+import socket
+import threading
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Callable, Optional
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import EventCode, EventLog, TankConfig, TankLease
+
+_MANAGERS: dict[int, 'LeaseManager'] = {}
+_MANAGERS_LOCK = threading.Lock()
+
+
+def node_id() -> str:
+    """Identificador de este proceso: ``NODE_ID`` o ``<host>:<pid>``."""
+    return settings.NODE_ID or f'{socket.gethostname()}:{os.getpid()}'
+
+
+@dataclass
+class LeaseStatus:
+    owner: Optional[str]
+    epoch: int
+    expires_at: Optional[datetime]
+    held: bool
+
+
+class LeaseManager:
+    """Toma, renueva y libera el arrendamiento de un tanque para un nodo.
+
+    ``clock`` devuelve la hora actual (``timezone.now`` por defecto) y permite
+    probar vencimientos sin esperar.
+    """
+
+    def __init__(
+        self,
+        config: TankConfig,
+        *,
+        owner: Optional[str] = None,
+        ttl_s: Optional[float] = None,
+        renew_s: Optional[float] = None,
+        clock: Callable[[], datetime] = timezone.now,
+    ):
+        self.config = config
+        self.owner = owner or node_id()
+        self.ttl_s = settings.LEASE_TTL_S if ttl_s is None else ttl_s
+        self.renew_s = self.ttl_s / 3 if renew_s is None else renew_s
+        self.clock = clock
+        self.epoch = 0
+        self.holder: Optional[str] = None
+        self._renew_after: Optional[datetime] = None
+        self._retry_after: Optional[datetime] = None
+
+    @property
+    def held(self) -> bool:
+        return self._renew_after is not None
+
+    def ensure(self) -> bool:
+        """Verdadero si este nodo es el dueño; renueva o reintenta solo cuando toca."""
+        now = self.clock()
+        if self._renew_after is not None and now < self._renew_after:
+            return True
+        if self._retry_after is not None and now < self._retry_after:
+            return False
+        return self.acquire()
+
+    def acquire(self) -> bool:
+        """Renueva el arrendamiento propio o toma uno vencido; no espera."""
+        now = self.clock()
+        expires_at = now + timedelta(seconds=self.ttl_s)
+        leases = TankLease.objects.filter(config_id=self.config.pk)
+        with transaction.atomic():
+            if leases.filter(owner=self.owner).update(renewed_at=now, expires_at=expires_at):
+                if not self.held:
+                    self._refresh_epoch()
+                acquired = True
+            elif leases.filter(expires_at__lte=now).update(
+                owner=self.owner,
+                epoch=F('epoch') + 1,
+                acquired_at=now,
+                renewed_at=now,
+                expires_at=expires_at,
+            ):
+                self._refresh_epoch()
+                self._log_takeover()
+                acquired = True
+            else:
+                acquired = self._create(now, expires_at)
+        self._renew_after = now + timedelta(seconds=self.renew_s) if acquired else None
+        if acquired:
+            self.holder, self._retry_after = self.owner, None
+        else:
+            self._observe_holder()
+        return acquired
+
+    def release(self) -> None:
+        """Vence el arrendamiento propio para que otro nodo lo tome de inmediato."""
+        if self._renew_after is None:
+            return
+        self._renew_after = None
+        TankLease.objects.filter(config_id=self.config.pk, owner=self.owner).update(expires_at=self.clock())
+
+    def status(self) -> LeaseStatus:
+        lease = TankLease.objects.filter(config_id=self.config.pk).first()
+        if lease is None:
+            return LeaseStatus(owner=None, epoch=0, expires_at=None, held=False)
+        return LeaseStatus(
+            owner=lease.owner,
+            epoch=lease.epoch,
+            expires_at=lease.expires_at,
+            held=lease.owner == self.owner and lease.expires_at > self.clock(),
+        )
+
+    def _create(self, now: datetime, expires_at: datetime) -> bool:
+        if TankLease.objects.filter(config_id=self.config.pk).exists():
+            return False
+        try:
+            with transaction.atomic():
+                TankLease.objects.create(
+                    config_id=self.config.pk,
+                    owner=self.owner,
+                    acquired_at=now,
+                    renewed_at=now,
+                    expires_at=expires_at,
+                )
+        except IntegrityError:
+            # Otro nodo lo creó en paralelo.
+            return False
+        self.epoch = 1
+        self._log_takeover()
+        return True
+
+    def _observe_holder(self) -> None:
+        lease = TankLease.objects.filter(config_id=self.config.pk).values_list('owner', 'expires_at').first()
+        self.holder, self._retry_after = lease if lease is not None else (None, None)
+
+    def _refresh_epoch(self) -> None:
+        self.epoch = TankLease.objects.filter(config_id=self.config.pk).values_list('epoch', flat=True).get()
+
+    def _log_takeover(self) -> None:
+        EventLog.log(
+            EventCode.LEASE_ACQUIRED,
+            f'El nodo {self.owner} controla el tanque (época {self.epoch}).',
+            config_id=self.config.pk,
+        )
+
+
+def lease_for(config: TankConfig) -> LeaseManager:
+    """``LeaseManager`` compartido por el proceso para el tanque ``config``."""
+    with _MANAGERS_LOCK:
+        manager = _MANAGERS.get(config.pk)
+        if manager is None:
+            manager = _MANAGERS[config.pk] = LeaseManager(config)
+        return manager
+
+
+def owns_tank(config: TankConfig) -> bool:
+    """Verdadero si este nodo puede avanzar el tanque."""
+    return not settings.LEASES_ENABLED or lease_for(config).ensure()
+
@@ -0,0 +1,175 @@
+"""Arnés de carga concurrente para la API HTTP.
+
+Simula clientes del dashboard (mismo patrón que ``frontend/src/App.tsx``:
+config al cargar, luego ``dashboard?since=<token>`` en cada refresco,
+reenviando el token de la respuesta anterior) y escritores de sensores que
+envían ``state?level=&temp=``. Cada cliente usa un generador
+aleatorio con semilla propia para que las corridas sean reproducibles.
+"""
+
+from __future__ import annotations
+
+import json
+import math
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Optional
+from urllib.parse import urlencode
+
+from django.urls import reverse
+
+ENDPOINT_STATE = 'state'
+ENDPOINT_DASHBOARD = 'dashboard'
+ENDPOINT_CONFIG = 'config'
+ENDPOINT_WRITE = 'state_write'
+
+
+@dataclass
+class LoadProfile:
+    base_url: str
+    dashboards: int = 10
+    writers: int = 1
+    duration_s: float = 30.0
+    poll_interval_s: float = 1.0
+    write_hz: float = 1.0
+    lock_retries: int = 3
+    timeout_s: float = 10.0
+    seed: int = 0
+
+
+@dataclass
+class EndpointStats:
+    latencies_ms: list[float] = field(default_factory=list)
+    errors: int = 0
+    lock_errors: int = 0
+    lock_retries: int = 0
+
+    @property
+    def requests(self) -> int:
+        return len(self.latencies_ms) + self.errors
+
+    def percentile(self, pct: float) -> float:
+        if not self.latencies_ms:
+            return 0.0
+        ordered = sorted(self.latencies_ms)
+        rank = math.ceil(pct / 100 * len(ordered))
+        return ordered[min(len(ordered), max(rank, 1)) - 1]
+
+
+class LoadRecorder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.endpoints: dict[str, EndpointStats] = defaultdict(EndpointStats)
+
+    def record(
+        self,
+        endpoint: str,
+        latency_ms: Optional[float],
+        *,
+        lock_error: bool = False,
+        retried: bool = False,
+    ) -> None:
+        with self._lock:
+            stats = self.endpoints[endpoint]
+            if retried:
+                stats.lock_retries += 1
+                return
+            if latency_ms is None:
+                stats.errors += 1
+                if lock_error:
+                    stats.lock_errors += 1
+            else:
+                stats.latencies_ms.append(latency_ms)
+
+
+class LoadRunner:
+    def __init__(self, profile: LoadProfile):
+        self.profile = profile
+        self.recorder = LoadRecorder()
+        base = profile.base_url.rstrip('/')
+        self.urls = {
+            ENDPOINT_STATE: base + reverse('control:state'),
+            ENDPOINT_DASHBOARD: base + reverse('control:dashboard'),
+            ENDPOINT_CONFIG: base + reverse('control:config'),
+        }
+        self._deadline = 0.0
+
+    def run(self) -> float:
+        """Ejecuta la carga y devuelve la duración real en segundos."""
+        profile = self.profile
+        threads = []
+        for index in range(profile.dashboards):
+            rng = random.Random(f'{profile.seed}-dashboard-{index}')
+            threads.append(threading.Thread(target=self._dashboard, args=(rng,), daemon=True))
+        for index in range(profile.writers):
+            rng = random.Random(f'{profile.seed}-writer-{index}')
+            threads.append(threading.Thread(target=self._writer, args=(rng,), daemon=True))
+        started = time.perf_counter()
+        self._deadline = started + profile.duration_s
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return time.perf_counter() - started
+
+    def _dashboard(self, rng: random.Random) -> None:
+        # Desfase inicial para que los clientes no queden sincronizados.
+        self._sleep_until(time.perf_counter() + rng.uniform(0, self.profile.poll_interval_s))
+        self._request(ENDPOINT_CONFIG, self.urls[ENDPOINT_CONFIG])
+        token = None
+        while time.perf_counter() < self._deadline:
+            next_poll = time.perf_counter() + self.profile.poll_interval_s
+            url = self.urls[ENDPOINT_DASHBOARD]
+            if token:
+                url = f'{url}?{urlencode({"since": token})}'
+            body = self._request(ENDPOINT_DASHBOARD, url)
+            if body is not None:
+                # Como el frontend: tras un error se reintenta con el último token válido.
+                token = json.loads(body).get('token', token)
+            self._sleep_until(next_poll)
+
+    def _writer(self, rng: random.Random) -> None:
+        interval = 1.0 / self.profile.write_hz
+        level = rng.uniform(40, 80)
+        temp = rng.uniform(25, 40)
+        self._sleep_until(time.perf_counter() + rng.uniform(0, interval))
+        while time.perf_counter() < self._deadline:
+            next_write = time.perf_counter() + interval
+            level = min(100.0, max(0.0, level + rng.gauss(0, 1)))
+            temp = temp + rng.gauss(0, 0.2)
+            query = urlencode({'level': f'{level:.3f}', 'temp': f'{temp:.3f}'})
+            self._request(ENDPOINT_WRITE, f'{self.urls[ENDPOINT_STATE]}?{query}')
+            self._sleep_until(next_write)
+
+    def _request(self, endpoint: str, url: str) -> Optional[bytes]:
+        """Hace la petición, registra la latencia y devuelve el cuerpo (``None`` si falló)."""
+        attempts = 0
+        while True:
+            started = time.perf_counter()
+            try:
+                with urllib.request.urlopen(url, timeout=self.profile.timeout_s) as response:
+                    body = response.read()
+            except urllib.error.HTTPError as exc:
+                body = exc.read().decode('utf-8', errors='replace').lower()
+                locked = 'locked' in body or 'deadlock' in body or 'lock wait' in body
+                if locked and attempts < self.profile.lock_retries:
+                    attempts += 1
+                    self.recorder.record(endpoint, None, retried=True)
+                    continue
+                self.recorder.record(endpoint, None, lock_error=locked)
+                return None
+            except (urllib.error.URLError, OSError):
+                self.recorder.record(endpoint, None)
+                return None
+            self.recorder.record(endpoint, (time.perf_counter() - started) * 1000)
+            return body
+
+    def _sleep_until(self, target: float) -> None:
+        remaining = min(target, self._deadline) - time.perf_counter()
+        if remaining > 0:
+            time.sleep(remaining)
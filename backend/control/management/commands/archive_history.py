@@ -0,0 +1,53 @@
+from __future__ import annotations
+
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from control.archive import Archiver
+
+
+class Command(BaseCommand):
+    help = (
+        'Mueve los días cerrados de TankState y EventLog a archivos columnares '
+        'comprimidos por día. Las lecturas de historial combinan archivo y tabla viva.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--keep-days',
+            type=int,
+            default=settings.ARCHIVE_KEEP_DAYS,
+            help='Días (UTC) que permanecen en la tabla viva, incluido el actual.',
+        )
+        parser.add_argument(
+            '--archive-dir',
+            default=None,
+            help='Directorio del archivo frío (por defecto ARCHIVE_DIR).',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Informa cuántas filas se archivarían sin escribir ni borrar.',
+        )
+
+    def handle(self, *args, **options):
+        keep_days = options['keep_days']
+        if keep_days < 1:
+            raise CommandError('--keep-days debe ser al menos 1: el día actual no está cerrado.')
+        root = Path(options['archive_dir']) if options['archive_dir'] else None
+        archiver = Archiver(root)
+        cutoff = timezone.now().date() - timedelta(days=keep_days - 1)
+        results = archiver.run(cutoff, dry_run=options['dry_run'])
+        if not results:
+            self.stdout.write('No hay días cerrados pendientes de archivar.')
+            return
+        verb = 'Se archivarían' if options['dry_run'] else 'Archivadas'
+        total = 0
+        for result in results:
+            total += result.rows
+            self.stdout.write(f'{result.table} {result.day.isoformat()}: {result.rows} filas')
+        self.stdout.write(self.style.SUCCESS(f'{verb} {total} filas en {archiver.root}.'))
@@ -0,0 +1,46 @@
+from __future__ import annotations
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from control.timeseries import compact_states
+
+
+class Command(BaseCommand):
+    help = (
+        'Compacta los TankState anteriores a la ventana reciente en un bloque '
+        'comprimido por tanque y minuto (TankStateChunk), sin pérdida.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--keep-minutes',
+            type=int,
+            default=settings.STATE_CHUNK_KEEP_MINUTES,
+            help='Minutos recientes que permanecen como filas de TankState.',
+        )
+        parser.add_argument(
+            '--batch-minutes',
+            type=int,
+            default=100,
+            help='Bloques por transacción.',
+        )
+
+    def handle(self, *args, **options):
+        if options['keep_minutes'] < 1:
+            raise CommandError('--keep-minutes debe ser al menos 1.')
+        cutoff = timezone.now() - timedelta(minutes=options['keep_minutes'])
+        result = compact_states(cutoff, batch_minutes=max(1, options['batch_minutes']))
+        if not result.rows:
+            self.stdout.write('No hay estados pendientes de compactar.')
+            return
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Compactados {result.rows} estados en {result.chunks} bloques '
+                f'({result.rows / result.chunks:.1f} filas por bloque, '
+                f'{result.payload_bytes / result.rows:.1f} bytes por muestra).'
+            )
+        )
@@ -0,0 +1,106 @@
+from __future__ import annotations
+
+from datetime import datetime, time, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from control.services import ControlService
+from control.synthetic import DEFAULT_BATCH_SIZE, HistoryGenerator, create_tanks
+
+
+class Command(BaseCommand):
+    help = (
+        'Genera historial sintético (TankState y EventLog) para N tanques nuevos durante D días, '
+        'con la física del simulador, la lógica de control automática y fallas opcionales. '
+        'Usar en una base de pruebas o con el bucle detenido.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tanks', type=int, default=1, help='Tanques nuevos a generar.')
+        parser.add_argument('--days', type=float, default=1.0, help='Días de historial por tanque.')
+        parser.add_argument('--hz', type=float, default=1.0, help='Muestras por segundo por tanque.')
+        parser.add_argument('--seed', type=int, default=0, help='Semilla; la misma semilla produce los mismos datos.')
+        parser.add_argument(
+            '--end',
+            default=None,
+            help='Fin del rango (fecha u hora ISO 8601); por defecto ahora.',
+        )
+        parser.add_argument(
+            '--faults-per-day',
+            type=float,
+            default=0.0,
+            help='Fallas medias del sensor de nivel por tanque y día (disparan modo seguro).',
+        )
+        parser.add_argument(
+            '--fault-duration',
+            type=float,
+            default=30.0,
+            help='Duración de cada falla en segundos.',
+        )
+        parser.add_argument(
+            '--noise',
+            type=float,
+            default=1.0,
+            help='Escala del ruido gaussiano de las lecturas (0 lo desactiva).',
+        )
+        parser.add_argument(
+            '--heater-power',
+            type=float,
+            default=ControlService.HEATER_POWER_W,
+            help='Potencia de la resistencia en W para la simulación térmica.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help='Estados por lote y transacción.',
+        )
+
+    def handle(self, *args, **options):
+        for name in ('tanks', 'batch_size'):
+            if options[name] < 1:
+                raise CommandError(f'--{name.replace("_", "-")} debe ser al menos 1.')
+        for name in ('days', 'hz'):
+            if options[name] <= 0:
+                raise CommandError(f'--{name} debe ser positivo.')
+        for name in ('faults_per_day', 'fault_duration', 'noise', 'heater_power'):
+            if options[name] < 0:
+                raise CommandError(f'--{name.replace("_", "-")} no puede ser negativo.')
+        end = self._parse_end(options['end'])
+        start = end - timedelta(days=options['days'])
+
+        configs = create_tanks(options['tanks'])
+        generator = HistoryGenerator(
+            configs,
+            hz=options['hz'],
+            seed=options['seed'],
+            faults_per_day=options['faults_per_day'],
+            fault_duration_s=options['fault_duration'],
+            noise=options['noise'],
+            heater_power_w=options['heater_power'],
+            batch_size=options['batch_size'],
+        )
+        stats = generator.run(start, end)
+        self.stdout.write(
+            f'Tanques {configs[0].pk}-{configs[-1].pk}: estados={stats.states} eventos={stats.events} '
+            f'episodios_modo_seguro={stats.safe_mode_episodes} lotes={stats.batches} '
+            f'desde {start:%Y-%m-%d %H:%M:%S} hasta {end:%Y-%m-%d %H:%M:%S}'
+        )
+        self.stdout.write(
+            self.style.SUCCESS(f'{stats.rows_per_s:,.0f} filas/s en {stats.elapsed_s:.2f} s.')
+        )
+
+    def _parse_end(self, raw):
+        if not raw:
+            return timezone.now().replace(microsecond=0)
+        value = parse_datetime(raw)
+        if value is None:
+            day = parse_date(raw)
+            if day is None:
+                raise CommandError('--end debe ser una fecha ISO 8601.')
+            value = datetime.combine(day, time.min)
+        if timezone.is_naive(value):
+            value = timezone.make_aware(value, timezone.get_current_timezone())
+        return value
@@ -0,0 +1,75 @@
+from __future__ import annotations
+
+from django.core.management.base import BaseCommand, CommandError
+
+from control.importer import FORMAT_CHOICES, ReadingImporter, detect_format, iter_records, open_text
+from control.models import TankConfig
+from control.services import ControlService
+
+
+class Command(BaseCommand):
+    DEFAULT_BATCH_SIZE = 5000
+
+    help = (
+        'Importa lecturas históricas (CSV con encabezado o NDJSON; columnas ts, level, temp '
+        'y opcionalmente valve_open, drain_valve_open, heater_on, safe_mode) en lotes con bulk_create.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='+', help='Archivos a importar (.csv, .ndjson, .gz o "-").')
+        parser.add_argument(
+            '--format',
+            choices=FORMAT_CHOICES,
+            default=None,
+            help='Formato de entrada; por defecto se deduce de la extensión.',
+        )
+        parser.add_argument(
+            '--config',
+            type=int,
+            default=None,
+            help='ID de TankConfig destino (por defecto la configuración activa).',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=self.DEFAULT_BATCH_SIZE,
+            help='Registros por lote y transacción.',
+        )
+        parser.add_argument(
+            '--derive',
+            action='store_true',
+            help='Calcula actuadores y eventos con la lógica de control en lugar de leerlos del archivo.',
+        )
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size debe ser al menos 1.')
+        config = None
+        if options['config'] is not None:
+            try:
+                config = TankConfig.objects.get(pk=options['config'])
+            except TankConfig.DoesNotExist as exc:
+                raise CommandError(f'No existe TankConfig con id {options["config"]}.') from exc
+        importer = ReadingImporter(
+            ControlService(config),
+            batch_size=options['batch_size'],
+            derive=options['derive'],
+        )
+        for path in options['paths']:
+            fmt = options['format'] or detect_format(path)
+            try:
+                stream = open_text(path)
+            except OSError as exc:
+                raise CommandError(f'No se pudo abrir {path}: {exc}') from exc
+            with stream:
+                importer.run(iter_records(stream, fmt))
+
+        stats = importer.stats
+        self.stdout.write(
+            f'Leídos {stats.read} registros: importados={stats.imported} inválidos={stats.rejected} '
+            f'malformados={stats.malformed} eventos={stats.events} lotes={stats.batches} '
+            f'reintentos={stats.retries}'
+        )
+        self.stdout.write(
+            self.style.SUCCESS(f'{stats.rows_per_s:,.0f} filas/s en {stats.elapsed_s:.2f} s.')
+        )
@@ -0,0 +1,161 @@
+from __future__ import annotations
+
+import asyncio
+
+from django.core.management.base import BaseCommand, CommandError
+
+from control.ingest import AGGREGATE_CHOICES, AGGREGATE_MEAN, IngestService, loopback_generator
+from control.leases import lease_for, owns_tank
+from control.services import ControlService
+
+
+class Command(BaseCommand):
+    DEFAULT_HOST = '127.0.0.1'
+    DEFAULT_TCP_PORT = 9750
+    DEFAULT_UDP_PORT = 9751
+    DEFAULT_HZ = 1.0
+
+    help = (
+        'Servicio asyncio que recibe lecturas de sensores por TCP/UDP, las valida, '
+        'las agrega por tick y ejecuta un paso de control por tick.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default=self.DEFAULT_HOST, help='Dirección de escucha.')
+        parser.add_argument(
+            '--tcp-port',
+            type=int,
+            default=self.DEFAULT_TCP_PORT,
+            help='Puerto TCP (0 deshabilita TCP).',
+        )
+        parser.add_argument(
+            '--udp-port',
+            type=int,
+            default=self.DEFAULT_UDP_PORT,
+            help='Puerto UDP (0 deshabilita UDP).',
+        )
+        parser.add_argument(
+            '--hz',
+            type=float,
+            default=self.DEFAULT_HZ,
+            help='Frecuencia de los pasos de control (ticks por segundo).',
+        )
+        parser.add_argument(
+            '--aggregate',
+            choices=AGGREGATE_CHOICES,
+            default=AGGREGATE_MEAN,
+            help='Cómo se combinan las lecturas de un tick.',
+        )
+        parser.add_argument(
+            '--duration',
+            type=float,
+            default=0,
+            help='Segundos de ejecución. 0 significa ejecución continua.',
+        )
+        parser.add_argument(
+            '--loopback-hz',
+            type=float,
+            default=0,
+            help='Genera lecturas sintéticas por UDP local a esta frecuencia (pruebas).',
+        )
+
+    def handle(self, *args, **options):
+        if options['hz'] <= 0:
+            raise CommandError('El parámetro --hz debe ser mayor que 0.')
+        if not options['tcp_port'] and not options['udp_port']:
+            raise CommandError('Debe habilitarse al menos un puerto TCP o UDP.')
+        if options['loopback_hz'] and not options['udp_port']:
+            raise CommandError('--loopback-hz requiere un puerto UDP.')
+        control = ControlService()
+        if owns_tank(control.config):
+            control.ensure_initial_state()
+        try:
+            asyncio.run(self._serve(control, options))
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.WARNING('Ingesta interrumpida por el usuario.'))
+        finally:
+            lease_for(control.config).release()
+
+    async def _serve(self, control: ControlService, options) -> None:
+        # El ORM se usa solo desde el hilo del servicio, nunca desde el event loop.
+        service = IngestService(
+            validate=control.sensors_invalid,
+            step=lambda level, temp: self._step_if_leader(control, level, temp),
+            interval_s=1.0 / options['hz'],
+            aggregate=options['aggregate'],
+            on_tick=lambda reading, result: self._print_tick(service, result),
+            on_error=lambda exc: self._warn_step_error(service, exc),
+        )
+        host = options['host']
+        servers = []
+        if options['tcp_port']:
+            servers.append(await service.start_tcp(host, options['tcp_port']))
+        transport = None
+        if options['udp_port']:
+            transport = await service.start_udp(host, options['udp_port'])
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Ingesta escuchando en {host} (tcp={options["tcp_port"] or "-"}, '
+                f'udp={options["udp_port"] or "-"}) a {options["hz"]:.2f} Hz.'
+            )
+        )
+
+        stop = asyncio.Event()
+        tasks = [asyncio.create_task(service.run_ticks(stop))]
+        if options['loopback_hz']:
+            tasks.append(
+                asyncio.create_task(
+                    loopback_generator(host, options['udp_port'], rate_hz=options['loopback_hz'])
+                )
+            )
+        try:
+            if options['duration']:
+                await asyncio.sleep(options['duration'])
+            else:
+                await asyncio.Event().wait()
+        finally:
+            stop.set()
+            for task in tasks[1:]:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            for server in servers:
+                server.close()
+                await server.wait_closed()
+            if transport is not None:
+                transport.close()
+            service.close()
+            self._print_summary(service)
+
+    def _step_if_leader(self, control: ControlService, level, temp):
+        """Los nodos que no son líderes reciben lecturas pero no avanzan el tanque."""
+        if not owns_tank(control.config):
+            return None
+        return control.step(level_l=level, temp_c=temp)
+
+    def _print_tick(self, service: IngestService, result) -> None:
+        if result is None:
+            return
+        state = result.state
+        stats = service.stats
+        self.stdout.write(
+            f'[{state.ts:%H:%M:%S}] nivel={state.level_l:.1f}L temp={state.temp_c:.1f}°C '
+            f'tasa={stats.rate_hz():.1f} Hz aceptadas={stats.accepted} descartadas={stats.dropped}'
+        )
+
+    def _warn_step_error(self, service: IngestService, exc: Exception) -> None:
+        self.stderr.write(
+            self.style.WARNING(
+                f'Paso de control fallido ({type(exc).__name__}: {exc}); se reintenta en el '
+                f'próximo tick. Errores acumulados: {service.stats.step_errors}.'
+            )
+        )
+
+    def _print_summary(self, service: IngestService) -> None:
+        stats = service.stats
+        self.stdout.write(
+            f'Resumen: recibidas={stats.received} aceptadas={stats.accepted} '
+            f'inválidas={stats.rejected} malformadas={stats.malformed} ticks={stats.ticks} '
+            f'ticks_vacíos={stats.empty_ticks} atrasos={stats.overruns} '
+            f'pasos_fallidos={stats.step_errors} '
+            f'tasa={stats.rate_hz():.1f} Hz'
+        )
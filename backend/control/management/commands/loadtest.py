@@ -0,0 +1,121 @@
+from __future__ import annotations
+
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from control.loadtest import LoadProfile, LoadRunner
+from control.models import EventLog, TankState
+
+
+class Command(BaseCommand):
+    DEFAULT_BASE_URL = 'http://127.0.0.1:8000'
+
+    help = (
+        'Prueba de carga reproducible contra un servidor local: N clientes del '
+        'dashboard y M escritores de sensores durante un tiempo fijo.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base-url', default=self.DEFAULT_BASE_URL, help='URL raíz del servidor.')
+        parser.add_argument('--dashboards', type=int, default=10, help='Clientes del dashboard.')
+        parser.add_argument('--writers', type=int, default=1, help='Escritores de sensores.')
+        parser.add_argument('--duration', type=float, default=30.0, help='Duración en segundos.')
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=1.0,
+            help='Segundos entre refrescos de cada dashboard.',
+        )
+        parser.add_argument(
+            '--write-hz',
+            type=float,
+            default=1.0,
+            help='Lecturas por segundo de cada escritor.',
+        )
+        parser.add_argument(
+            '--lock-retries',
+            type=int,
+            default=3,
+            help='Reintentos del cliente ante errores de bloqueo de la base.',
+        )
+        parser.add_argument('--seed', type=int, default=0, help='Semilla de los clientes.')
+        parser.add_argument('--json', dest='json_path', default=None, help='Ruta del reporte JSON.')
+
+    def handle(self, *args, **options):
+        if options['duration'] <= 0 or options['poll_interval'] <= 0 or options['write_hz'] <= 0:
+            raise CommandError('--duration, --poll-interval y --write-hz deben ser mayores que 0.')
+        if options['dashboards'] < 0 or options['writers'] < 0:
+            raise CommandError('La cantidad de clientes no puede ser negativa.')
+        profile = LoadProfile(
+            base_url=options['base_url'],
+            dashboards=options['dashboards'],
+            writers=options['writers'],
+            duration_s=options['duration'],
+            poll_interval_s=options['poll_interval'],
+            write_hz=options['write_hz'],
+            lock_retries=options['lock_retries'],
+            seed=options['seed'],
+        )
+        engine = self._engine_description()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Carga contra {profile.base_url}: {profile.dashboards} dashboards, '
+                f'{profile.writers} escritores, {profile.duration_s:.0f} s ({engine}).'
+            )
+        )
+        rows_before = self._row_counts()
+        runner = LoadRunner(profile)
+        elapsed = runner.run()
+        rows_after = self._row_counts()
+
+        report = {
+            'engine': engine,
+            'profile': {key: value for key, value in vars(profile).items()},
+            'elapsed_s': elapsed,
+            'endpoints': {},
+            'row_growth': {name: rows_after[name] - rows_before[name] for name in rows_after},
+        }
+        self.stdout.write(
+            f'{"endpoint":<12} {"req":>7} {"req/s":>8} {"err %":>6} {"lock %":>7} '
+            f'{"reint.":>6} {"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8}'
+        )
+        for name, stats in sorted(runner.recorder.endpoints.items()):
+            total = stats.requests or 1
+            entry = {
+                'requests': stats.requests,
+                'throughput_rps': stats.requests / elapsed if elapsed else 0.0,
+                'error_rate': stats.errors / total,
+                'lock_error_rate': stats.lock_errors / total,
+                'lock_retries': stats.lock_retries,
+                'p50_ms': stats.percentile(50),
+                'p95_ms': stats.percentile(95),
+                'p99_ms': stats.percentile(99),
+            }
+            report['endpoints'][name] = entry
+            self.stdout.write(
+                f'{name:<12} {entry["requests"]:>7} {entry["throughput_rps"]:>8.1f} '
+                f'{entry["error_rate"] * 100:>6.1f} {entry["lock_error_rate"] * 100:>7.1f} '
+                f'{entry["lock_retries"]:>6} {entry["p50_ms"]:>8.1f} {entry["p95_ms"]:>8.1f} '
+                f'{entry["p99_ms"]:>8.1f}'
+            )
+        growth = ', '.join(f'{name}=+{value}' for name, value in report['row_growth'].items())
+        self.stdout.write(f'Crecimiento de filas: {growth}')
+        if options['json_path']:
+            with open(options['json_path'], 'w', encoding='utf-8') as handle:
+                json.dump(report, handle, indent=2)
+
+    def _row_counts(self) -> dict[str, int]:
+        return {
+            'TankState': TankState.objects.count(),
+            'EventLog': EventLog.objects.count(),
+        }
+
+    def _engine_description(self) -> str:
+        if connection.vendor != 'sqlite':
+            return connection.vendor
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            journal_mode = cursor.fetchone()[0]
+        return f'sqlite journal_mode={journal_mode}'
@@ -0,0 +1,141 @@
+from __future__ import annotations
+
+import contextlib
+import tempfile
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from control.profiling import (
+    CPU_PROFILE_FILE,
+    CPU_REPORT_FILE,
+    GROWTH_FILE,
+    MEMORY_REPORT_FILE,
+    PASSES,
+    STACKS_FILE,
+    SUMMARY_FILE,
+    ControlProfiler,
+    ProfileOptions,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Perfila el camino de control (run_simulation/ControlService.step) sobre una base '
+        'temporal: latencias, cProfile, pilas colapsadas y crecimiento de memoria.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=1000, help='Pasos por pasada.')
+        parser.add_argument('--warmup', type=int, default=50, help='Pasos previos sin medir.')
+        parser.add_argument(
+            '--output',
+            default='profiles',
+            help='Directorio de los reportes (uno por commit para compararlos con diff).',
+        )
+        parser.add_argument(
+            '--passes',
+            default=','.join(PASSES),
+            help=f'Pasadas a ejecutar, separadas por comas ({", ".join(PASSES)}).',
+        )
+        parser.add_argument(
+            '--snapshot-every',
+            type=int,
+            default=100,
+            help='Pasos entre muestras de memoria en growth.csv.',
+        )
+        parser.add_argument(
+            '--fault-every',
+            type=int,
+            default=200,
+            help='Cada cuántos pasos se inyectan lecturas inválidas (0 las desactiva).',
+        )
+        parser.add_argument('--top', type=int, default=40, help='Filas de los reportes de texto.')
+        parser.add_argument(
+            '--sample-interval-ms',
+            type=float,
+            default=1.0,
+            help='Intervalo del muestreador de pilas en milisegundos.',
+        )
+        parser.add_argument(
+            '--current-db',
+            action='store_true',
+            help='Usa la base configurada en lugar de una base temporal (escribe estados y eventos).',
+        )
+
+    def handle(self, *args, **options):
+        passes = tuple(name.strip() for name in options['passes'].split(',') if name.strip())
+        unknown = sorted(set(passes) - set(PASSES))
+        if unknown or not passes:
+            raise CommandError(f'Pasadas desconocidas: {", ".join(unknown) or "(ninguna)"}.')
+        if options['iterations'] <= 0 or options['warmup'] < 0:
+            raise CommandError('--iterations debe ser mayor que 0 y --warmup no puede ser negativo.')
+        if options['sample_interval_ms'] <= 0:
+            raise CommandError('--sample-interval-ms debe ser mayor que 0.')
+        profile_options = ProfileOptions(
+            iterations=options['iterations'],
+            warmup=options['warmup'],
+            snapshot_every=options['snapshot_every'],
+            fault_every=max(0, options['fault_every']),
+            top=options['top'],
+            sample_interval_s=options['sample_interval_ms'] / 1000,
+            passes=passes,
+        )
+        output_dir = Path(options['output'])
+        scratch = contextlib.nullcontext() if options['current_db'] else self._scratch_database()
+        with scratch:
+            engine = self._engine_description()
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f'Perfilando {profile_options.iterations} pasos por pasada '
+                    f'({", ".join(passes)}) en {engine}.'
+                )
+            )
+            report = ControlProfiler(profile_options, output_dir, engine=engine).run()
+
+        if report.timing:
+            timing = report.timing
+            self.stdout.write(
+                f'Latencia: {timing["steps_per_s"]:.1f} pasos/s, p50 {timing["p50_ms"]:.2f} ms, '
+                f'p95 {timing["p95_ms"]:.2f} ms, p99 {timing["p99_ms"]:.2f} ms, máx {timing["max_ms"]:.2f} ms'
+            )
+        if report.cpu:
+            self.stdout.write(
+                f'CPU: {report.cpu["total_calls"]} llamadas, {report.cpu["samples"]} muestras de pila '
+                f'→ {CPU_REPORT_FILE}, {CPU_PROFILE_FILE}, {STACKS_FILE}'
+            )
+        if report.memory:
+            memory = report.memory
+            self.stdout.write(
+                f'Memoria: {memory["start_bytes"] / 1024:.0f} → {memory["end_bytes"] / 1024:.0f} KiB, '
+                f'{memory["growth_bytes_per_step"]:+.1f} B/paso, '
+                f'{memory["growth_objects_per_step"]:+.3f} objetos/paso → {MEMORY_REPORT_FILE}, {GROWTH_FILE}'
+            )
+        growth = ', '.join(f'{name}=+{value}' for name, value in report.row_growth.items())
+        self.stdout.write(f'Crecimiento de filas: {growth}')
+        self.stdout.write(self.style.SUCCESS(f'Reportes en {output_dir / SUMMARY_FILE} y archivos vecinos.'))
+
+    @contextlib.contextmanager
+    def _scratch_database(self):
+        """Base temporal creada con las migraciones; en SQLite es un archivo, no ``:memory:``."""
+        settings_dict = connection.settings_dict
+        old_name = settings_dict['NAME']
+        old_test_name = settings_dict['TEST'].get('NAME')
+        with tempfile.TemporaryDirectory(prefix='profile_control-') as tmpdir:
+            if connection.vendor == 'sqlite':
+                settings_dict['TEST']['NAME'] = str(Path(tmpdir) / 'scratch.sqlite3')
+            connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+            try:
+                yield
+            finally:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+                settings_dict['TEST']['NAME'] = old_test_name
+
+    def _engine_description(self) -> str:
+        if connection.vendor != 'sqlite':
+            return connection.vendor
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            journal_mode = cursor.fetchone()[0]
+        return f'sqlite journal_mode={journal_mode}'
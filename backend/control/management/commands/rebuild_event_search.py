@@ -0,0 +1,23 @@
+from __future__ import annotations
+
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from control.search import BACKEND_LIKE, install
+
+
+class Command(BaseCommand):
+    help = (
+        'Crea o repara el índice de texto completo de eventos (tabla FTS5 y triggers en SQLite, '
+        'FULLTEXT en MySQL) y reconstruye su contenido.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS, help='Alias de la base de datos.')
+
+    def handle(self, *args, **options):
+        backend = install(connections[options['database']])
+        if backend == BACKEND_LIKE:
+            self.stdout.write(self.style.WARNING('El motor no tiene índice de texto completo; se usará LIKE.'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'Índice de búsqueda de eventos listo ({backend}).'))
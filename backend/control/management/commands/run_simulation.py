@@ -2,22 +2,25 @@ from __future__ import annotations
 
 import time
 
+from django.conf import settings
 from django.core.management.base import BaseCommand, CommandError
-from django.db import OperationalError
 
+from control.journal import DB_ERRORS, StoreAndForward
+from control.leases import lease_for, node_id, owns_tank
 from control.models import TankConfig
 from control.services import ControlService
+from control.simulation import DEFAULT_CONSTANTS, SimulationConstants, next_level, next_temperature
 
 
 class Command(BaseCommand):
     SIM_MIN_LEVEL_L = 90.0
     SIM_MAX_LEVEL_L = 200.0
     DEFAULT_HZ = 1.0
-    FILL_RATE_LPS = 5.0
-    BASE_CONSUMPTION_LPS = 1.5
-    DRAIN_EXTRA_LPS = 3.5
-    HEATING_RATE_C_PER_SEC = 0.8
-    COOLING_RATE_C_PER_SEC = 0.4
+    FILL_RATE_LPS = DEFAULT_CONSTANTS.fill_rate_lps
+    BASE_CONSUMPTION_LPS = DEFAULT_CONSTANTS.base_consumption_lps
+    DRAIN_EXTRA_LPS = DEFAULT_CONSTANTS.drain_extra_lps
+    HEATING_RATE_C_PER_SEC = DEFAULT_CONSTANTS.heating_rate_c_per_sec
+    COOLING_RATE_C_PER_SEC = DEFAULT_CONSTANTS.cooling_rate_c_per_sec
     DB_RETRY_SLEEP_S = 0.5
     DB_MAX_RETRIES = 5
 
@@ -48,8 +51,15 @@ class Command(BaseCommand):
 
         interval_s = 1.0 / hz
         service = ControlService()
+        self._stepper = StoreAndForward(
+            service,
+            retries=self.DB_MAX_RETRIES,
+            retry_sleep_s=self.DB_RETRY_SLEEP_S,
+            on_retry=self._warn_retry,
+        )
         self._ensure_simulation_bounds(service)
-        service.ensure_initial_state()
+        if owns_tank(service.config):
+            service.ensure_initial_state()
         self.stdout.write(
             self.style.SUCCESS(
                 f'Iniciando simulación de tanque a {hz:.2f} Hz '
@@ -57,9 +67,23 @@ class Command(BaseCommand):
             )
         )
         count = 0
+        standby = False
         try:
             while iterations == 0 or count < iterations:
-                latest_state = service.get_latest_state() or service.ensure_initial_state()
+                # Con arrendamientos activos solo el nodo líder avanza el tanque.
+                if not self._owns_tank(service):
+                    if not standby:
+                        owner = lease_for(service.config).status().owner
+                        self.stdout.write(
+                            self.style.WARNING(f'Nodo {node_id()} en espera; el tanque lo controla {owner}.')
+                        )
+                        standby = True
+                    time.sleep(interval_s)
+                    continue
+                if standby:
+                    self.stdout.write(self.style.SUCCESS(f'Nodo {node_id()} toma el control del tanque.'))
+                    standby = False
+                latest_state = self._stepper.latest_state() or service.ensure_initial_state()
                 next_level = self._simulate_level_change(
                     service,
                     latest_state.level_l,
@@ -79,6 +103,12 @@ class Command(BaseCommand):
                 time.sleep(interval_s)
         except KeyboardInterrupt:
             self.stdout.write(self.style.WARNING('Simulación interrumpida por el usuario.'))
+        finally:
+            self._stepper.journal.close()
+            try:
+                lease_for(service.config).release()
+            except DB_ERRORS:
+                pass
 
     def _simulate_level_change(
         self,
@@ -88,14 +118,14 @@ class Command(BaseCommand):
         drain_valve_open: bool,
         interval_s: float,
     ) -> float:
-        if fill_valve_open:
-            level += self.FILL_RATE_LPS * interval_s
-        outflow = self.BASE_CONSUMPTION_LPS * interval_s
-        if drain_valve_open:
-            outflow += self.DRAIN_EXTRA_LPS * interval_s
-        level -= outflow
-        level = max(0.0, min(service.config.capacity_l, level))
-        return level
+        return next_level(
+            level,
+            fill_valve_open,
+            drain_valve_open,
+            interval_s,
+            service.config.capacity_l,
+            self._constants(),
+        )
 
     def _simulate_temperature_change(
         self,
@@ -104,12 +134,23 @@ class Command(BaseCommand):
         heater_on: bool,
         interval_s: float,
     ) -> float:
-        if heater_on:
-            temp += self.HEATING_RATE_C_PER_SEC * interval_s
-        else:
-            temp -= self.COOLING_RATE_C_PER_SEC * interval_s
-        temp = max(service.config.temp_min_c - 5, min(service.config.temp_max_c + 10, temp))
-        return temp
+        return next_temperature(
+            temp,
+            heater_on,
+            interval_s,
+            service.config.temp_min_c,
+            service.config.temp_max_c,
+            self._constants(),
+        )
+
+    def _constants(self) -> SimulationConstants:
+        return SimulationConstants(
+            fill_rate_lps=self.FILL_RATE_LPS,
+            base_consumption_lps=self.BASE_CONSUMPTION_LPS,
+            drain_extra_lps=self.DRAIN_EXTRA_LPS,
+            heating_rate_c_per_sec=self.HEATING_RATE_C_PER_SEC,
+            cooling_rate_c_per_sec=self.COOLING_RATE_C_PER_SEC,
+        )
 
     def _print_state(self, state):
         status_fill = 'abierta' if state.valve_open else 'cerrada'
@@ -137,19 +178,31 @@ class Command(BaseCommand):
             TankConfig.objects.filter(pk=config.pk).update(**updates)
             service.config.refresh_from_db(fields=list(updates.keys()))
 
+    def _owns_tank(self, service: ControlService) -> bool:
+        try:
+            return owns_tank(service.config)
+        except DB_ERRORS:
+            # Sin base no se puede renovar: sigue el nodo que ya tenía el arrendamiento.
+            return not settings.LEASES_ENABLED or lease_for(service.config).held
+
     def _safe_step(self, service: ControlService, *, level_l: float, temp_c: float):
-        """Invoca service.step reintentando si SQLite queda bloqueada."""
-        attempts = 0
-        while True:
-            try:
-                return service.step(level_l=level_l, temp_c=temp_c)
-            except OperationalError as exc:
-                attempts += 1
-                if attempts > self.DB_MAX_RETRIES:
-                    raise CommandError(f'Error de base de datos tras {attempts} intentos: {exc}') from exc
-                self.stderr.write(
-                    self.style.WARNING(
-                        f'Base de datos bloqueada, reintentando ({attempts}/{self.DB_MAX_RETRIES})...'
-                    )
+        """Ejecuta el paso; si la base no responde tras los reintentos sigue en el diario local."""
+        stepper = self._stepper
+        was_offline = stepper.offline
+        result = stepper.step(level_l=level_l, temp_c=temp_c)
+        if stepper.offline and not was_offline:
+            self.stderr.write(
+                self.style.WARNING(
+                    f'Base de datos no disponible; los pasos continúan en el diario {stepper.journal.path}.'
                 )
-                time.sleep(self.DB_RETRY_SLEEP_S)
+            )
+        elif was_offline and not stepper.offline:
+            self.stdout.write(
+                self.style.SUCCESS(f'Base de datos disponible; {stepper.replayed} estados reenviados del diario.')
+            )
+        return result
+
+    def _warn_retry(self, attempts: int, exc: Exception) -> None:
+        self.stderr.write(
+            self.style.WARNING(f'Base de datos bloqueada, reintentando ({attempts}/{self.DB_MAX_RETRIES})...')
+        )
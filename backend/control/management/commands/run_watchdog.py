@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from control.services import ControlService
+from control.watchdog import Watchdog, WatchdogStatus
+
+
+class Command(BaseCommand):
+    DEFAULT_INTERVAL_S = 1.0
+
+    help = (
+        'Vigila el latido del bucle de control y fuerza el modo seguro '
+        '(HEATER_SAFE_OFF/SAFE_MODE) si no hay pasos dentro del plazo. '
+        'Debe ejecutarse en un proceso distinto al que ejecuta el bucle.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=self.DEFAULT_INTERVAL_S,
+            help='Segundos entre verificaciones.',
+        )
+        parser.add_argument(
+            '--deadline',
+            type=float,
+            default=settings.WATCHDOG_DEADLINE_S,
+            help='Segundos sin pasos de control antes de forzar el modo seguro.',
+        )
+        parser.add_argument(
+            '--slo-ms',
+            type=float,
+            default=settings.WATCHDOG_STEP_SLO_MS,
+            help='Latencia objetivo de un paso en milisegundos.',
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Ejecuta una sola verificación y termina.',
+        )
+
+    def handle(self, *args, **options):
+        if options['interval'] <= 0 or options['deadline'] <= 0:
+            raise CommandError('--interval y --deadline deben ser mayores que 0.')
+        watchdog = Watchdog(
+            ControlService(),
+            deadline_s=options['deadline'],
+            slo_ms=options['slo_ms'],
+        )
+        if options['once']:
+            self._report(watchdog.check(), verbose=True)
+            return
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Watchdog activo: plazo {watchdog.deadline_s:.1f} s, SLO {watchdog.slo_ms:.0f} ms.'
+            )
+        )
+        stop = threading.Event()
+        try:
+            watchdog.run(options['interval'], stop, on_check=self._report)
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.WARNING('Watchdog detenido por el usuario.'))
+
+    def _report(self, status: WatchdogStatus, verbose: bool = False) -> None:
+        if status.error:
+            self.stderr.write(self.style.ERROR(f'No se pudo verificar el latido: {status.error}. Se reintenta.'))
+        elif status.forced_safe:
+            self.stdout.write(
+                self.style.ERROR(f'Latido vencido ({status.age_s:.1f} s): estado seguro forzado.')
+            )
+        elif status.slo_breached:
+            self.stdout.write(
+                self.style.WARNING(f'Último paso {status.step_ms:.0f} ms > SLO {status.slo_ms:.0f} ms.')
+            )
+        elif verbose:
+            age = f'{status.age_s:.1f} s' if status.age_s is not None else 'sin latido'
+            self.stdout.write(f'Latido: {age}; último paso {status.step_ms:.1f} ms.')
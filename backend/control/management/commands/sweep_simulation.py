@@ -0,0 +1,131 @@
+from __future__ import annotations
+
+import csv
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+
+from control.models import TankConfig
+from control.simulation import CONSTANT_NAMES, ScenarioResult, build_grid, run_scenario, setup_worker
+
+
+class Command(BaseCommand):
+    DEFAULT_DURATION_S = 3600.0
+    DEFAULT_HZ = 1.0
+    COLUMNS = (
+        'label',
+        'steps',
+        'time_in_band_pct',
+        'heater_cycles',
+        'energy_wh',
+        'safe_mode_s',
+        'final_level_l',
+        'final_temp_c',
+        'error',
+    )
+
+    help = (
+        'Ejecuta en memoria y en paralelo una grilla de escenarios de simulación '
+        '(parámetros de TankConfig y constantes del simulador) y resume los resultados.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--param',
+            action='append',
+            default=[],
+            metavar='NOMBRE=V1,V2',
+            help=(
+                'Valores a barrer para un campo de TankConfig o una constante '
+                f'({", ".join(CONSTANT_NAMES)}). Repetible.'
+            ),
+        )
+        parser.add_argument(
+            '--duration',
+            type=float,
+            default=self.DEFAULT_DURATION_S,
+            help='Segundos simulados por escenario.',
+        )
+        parser.add_argument(
+            '--hz',
+            type=float,
+            default=self.DEFAULT_HZ,
+            help='Frecuencia de paso simulada en Hertz.',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count() or 1,
+            help='Procesos del pool (por defecto, todos los núcleos).',
+        )
+        parser.add_argument('--output', default=None, help='Ruta del CSV de resumen.')
+
+    def handle(self, *args, **options):
+        if options['hz'] <= 0 or options['duration'] <= 0:
+            raise CommandError('--hz y --duration deben ser mayores que 0.')
+        if options['workers'] < 1:
+            raise CommandError('--workers debe ser al menos 1.')
+        grid = self._parse_grid(options['param'])
+        scenarios = build_grid(grid, duration_s=options['duration'], hz=options['hz'])
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Ejecutando {len(scenarios)} escenarios con {options["workers"]} procesos.'
+            )
+        )
+
+        started = time.perf_counter()
+        if options['workers'] == 1:
+            results = [run_scenario(scenario) for scenario in scenarios]
+        else:
+            with ProcessPoolExecutor(max_workers=options['workers'], initializer=setup_worker) as pool:
+                chunksize = max(1, len(scenarios) // (options['workers'] * 4))
+                results = list(pool.map(run_scenario, scenarios, chunksize=chunksize))
+        elapsed = time.perf_counter() - started
+
+        self._print_table(results)
+        if options['output']:
+            self._write_csv(options['output'], results)
+        self.stdout.write(f'Tiempo total: {elapsed:.2f} s')
+
+    def _parse_grid(self, raw_params: list[str]) -> dict[str, list]:
+        config_fields = {field.name: field for field in TankConfig._meta.concrete_fields}
+        grid: dict[str, list] = {}
+        for raw in raw_params:
+            name, sep, values = raw.partition('=')
+            name = name.strip()
+            if not sep or not values:
+                raise CommandError(f'Parámetro inválido: {raw!r}. Formato esperado NOMBRE=V1,V2.')
+            if name in CONSTANT_NAMES:
+                convert = float
+            elif name in config_fields and name not in ('id', 'active', 'created_at', 'updated_at'):
+                convert = config_fields[name].to_python
+            else:
+                raise CommandError(f'Parámetro desconocido: {name}.')
+            try:
+                grid[name] = [convert(value.strip()) for value in values.split(',')]
+            except Exception as exc:
+                raise CommandError(f'Valor inválido para {name}: {exc}') from exc
+        return grid
+
+    def _print_table(self, results: list[ScenarioResult]) -> None:
+        self.stdout.write(
+            f'{"escenario":<48} {"en banda %":>10} {"ciclos":>7} {"energía Wh":>11} '
+            f'{"modo seguro s":>13}'
+        )
+        for result in results:
+            if result.error:
+                self.stdout.write(self.style.WARNING(f'{result.label:<48} error: {result.error}'))
+                continue
+            self.stdout.write(
+                f'{result.label:<48} {result.time_in_band_pct:>10.1f} {result.heater_cycles:>7} '
+                f'{result.energy_wh:>11.2f} {result.safe_mode_s:>13.1f}'
+            )
+
+    def _write_csv(self, path: str, results: list[ScenarioResult]) -> None:
+        with open(path, 'w', newline='', encoding='utf-8') as handle:
+            writer = csv.DictWriter(handle, fieldnames=self.COLUMNS)
+            writer.writeheader()
+            for result in results:
+                writer.writerow(result.as_row())
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('control', '0004_tankconfig_manual_heater_150_on_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='tankstate',
+            index=models.Index(fields=['ts'], name='control_tan_ts_0deb32_idx'),
+        ),
+    ]
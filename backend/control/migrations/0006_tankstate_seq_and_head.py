@@ -0,0 +1,66 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+
+
+def backfill_sequences(apps, schema_editor):
+    TankConfig = apps.get_model('control', 'TankConfig')
+    TankState = apps.get_model('control', 'TankState')
+    TankStateHead = apps.get_model('control', 'TankStateHead')
+
+    for config_id in TankConfig.objects.values_list('id', flat=True):
+        states = (
+            TankState.objects.filter(config_id=config_id)
+            .order_by('ts', 'id')
+            .only('id')
+            .iterator(chunk_size=BATCH_SIZE)
+        )
+        batch = []
+        seq = 0
+        last = None
+        for state in states:
+            seq += 1
+            state.seq = seq
+            batch.append(state)
+            last = state
+            if len(batch) >= BATCH_SIZE:
+                TankState.objects.bulk_update(batch, ['seq'])
+                batch = []
+        if batch:
+            TankState.objects.bulk_update(batch, ['seq'])
+        if last is not None:
+            TankStateHead.objects.create(config_id=config_id, state_id=last.id, seq=seq)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('control', '0005_tankstate_ts_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tankstate',
+            name='seq',
+            field=models.PositiveBigIntegerField(default=0),
+            preserve_default=False,
+        ),
+        migrations.CreateModel(
+            name='TankStateHead',
+            fields=[
+                ('config', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='head', serialize=False, to='control.tankconfig')),
+                ('seq', models.PositiveBigIntegerField()),
+                ('state', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='control.tankstate')),
+            ],
+            options={
+                'verbose_name': 'Último estado del tanque',
+                'verbose_name_plural': 'Últimos estados del tanque',
+            },
+        ),
+        migrations.RunPython(backfill_sequences, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='tankstate',
+            constraint=models.UniqueConstraint(fields=('config', 'seq'), name='tankstate_config_seq_uniq'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('control', '0006_tankstate_seq_and_head'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tankconfig',
+            name='max_level_rate_lps',
+            field=models.FloatField(default=0.0),
+        ),
+        migrations.AddField(
+            model_name='tankconfig',
+            name='max_temp_rate_cps',
+            field=models.FloatField(default=0.0),
+        ),
+        migrations.AddField(
+            model_name='tankconfig',
+            name='signal_filter',
+            field=models.CharField(choices=[('NONE', 'Sin filtro'), ('MEDIAN', 'Mediana móvil'), ('EWMA', 'Media móvil exponencial')], default='NONE', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='tankconfig',
+            name='signal_filter_alpha',
+            field=models.FloatField(default=0.3),
+        ),
+        migrations.AddField(
+            model_name='tankconfig',
+            name='signal_filter_window',
+            field=models.PositiveSmallIntegerField(default=5),
+        ),
+    ]
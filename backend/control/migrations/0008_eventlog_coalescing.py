@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('control', '0007_tankconfig_signal_filter'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='eventlog',
+            name='episode_open',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='eventlog',
+            name='last_ts',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='eventlog',
+            name='occurrences',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AddIndex(
+            model_name='eventlog',
+            index=models.Index(condition=models.Q(('episode_open', True)), fields=['code'], name='eventlog_open_episode_idx'),
+        ),
+    ]
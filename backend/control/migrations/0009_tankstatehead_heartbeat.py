@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('control', '0008_eventlog_coalescing'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tankstatehead',
+            name='heartbeat_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='tankstatehead',
+            name='slo_breaches',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='tankstatehead',
+            name='step_ms',
+            field=models.FloatField(default=0),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:56
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('control', '0009_tankstatehead_heartbeat'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TankStateChunk',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('minute', models.DateTimeField()),
+                ('count', models.PositiveIntegerField()),
+                ('first_seq', models.PositiveBigIntegerField()),
+                ('last_seq', models.PositiveBigIntegerField()),
+                ('payload', models.BinaryField()),
+                ('config', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='state_chunks', to='control.tankconfig')),
+            ],
+            options={
+                'verbose_name': 'Bloque de estados',
+                'verbose_name_plural': 'Bloques de estados',
+                'ordering': ['-minute'],
+                'indexes': [models.Index(fields=['minute'], name='control_tan_minute_83082a_idx')],
+                'constraints': [models.UniqueConstraint(fields=('config', 'minute'), name='tankstatechunk_config_minute_uniq')],
+            },
+        ),
+    ]
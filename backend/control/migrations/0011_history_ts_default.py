@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:57
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('control', '0010_tankstatechunk'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='eventlog',
+            name='ts',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='tankstate',
+            name='ts',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:07
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('control', '0011_history_ts_default'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TankLease',
+            fields=[
+                ('config', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='lease', serialize=False, to='control.tankconfig')),
+                ('owner', models.CharField(max_length=128)),
+                ('epoch', models.PositiveBigIntegerField(default=1)),
+                ('acquired_at', models.DateTimeField()),
+                ('renewed_at', models.DateTimeField()),
+                ('expires_at', models.DateTimeField()),
+            ],
+            options={
+                'verbose_name': 'Arrendamiento del tanque',
+                'verbose_name_plural': 'Arrendamientos de tanque',
+            },
+        ),
+        migrations.AlterField(
+            model_name='eventlog',
+            name='code',
+            field=models.CharField(choices=[('VALVE_OPEN', 'Válvula abierta'), ('VALVE_CLOSE', 'Válvula cerrada'), ('HEATER_ON', 'Resistencia encendida'), ('HEATER_OFF', 'Resistencia apagada'), ('HEATER_SAFE_OFF', 'Resistencia apagada por seguridad'), ('SAFE_MODE', 'Modo seguro activado'), ('DRAIN_OPEN', 'Válvula de vaciado abierta'), ('DRAIN_CLOSE', 'Válvula de vaciado cerrada'), ('LEASE_ACQUIRED', 'Nodo líder asignado')], max_length=32),
+        ),
+    ]
@@ -0,0 +1,22 @@
+from django.db import migrations
+
+from control.search import install, uninstall
+
+
+def install_search(apps, schema_editor):
+    install(schema_editor.connection)
+
+
+def uninstall_search(apps, schema_editor):
+    uninstall(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('control', '0012_tanklease'),
+    ]
+
+    operations = [
+        migrations.RunPython(install_search, uninstall_search),
+    ]
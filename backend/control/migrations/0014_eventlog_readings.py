@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:22
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('control', '0013_eventlog_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='eventlog',
+            name='level_l',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='eventlog',
+            name='new_actuators',
+            field=models.PositiveSmallIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='eventlog',
+            name='power_w',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='eventlog',
+            name='prev_actuators',
+            field=models.PositiveSmallIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='eventlog',
+            name='state',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='events', to='control.tankstate'),
+        ),
+        migrations.AddField(
+            model_name='eventlog',
+            name='temp_c',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='eventlog',
+            index=models.Index(fields=['code', 'level_l', 'temp_c'], name='eventlog_code_readings_idx'),
+        ),
+    ]
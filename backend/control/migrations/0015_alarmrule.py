@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:32
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('control', '0014_eventlog_readings'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='eventlog',
+            name='code',
+            field=models.CharField(choices=[('VALVE_OPEN', 'Válvula abierta'), ('VALVE_CLOSE', 'Válvula cerrada'), ('HEATER_ON', 'Resistencia encendida'), ('HEATER_OFF', 'Resistencia apagada'), ('HEATER_SAFE_OFF', 'Resistencia apagada por seguridad'), ('SAFE_MODE', 'Modo seguro activado'), ('DRAIN_OPEN', 'Válvula de vaciado abierta'), ('DRAIN_CLOSE', 'Válvula de vaciado cerrada'), ('LEASE_ACQUIRED', 'Nodo líder asignado'), ('ALARM', 'Alarma activada'), ('ALARM_CLEAR', 'Alarma despejada')], max_length=32),
+        ),
+        migrations.CreateModel(
+            name='AlarmRule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=64)),
+                ('metric', models.CharField(choices=[('TEMP', 'Temperatura (°C)'), ('LEVEL', 'Nivel (L)'), ('TEMP_RATE', 'Variación de temperatura (°C/min)'), ('LEVEL_RATE', 'Variación de nivel (L/min)'), ('HEATER_CYCLES', 'Encendidos de la resistencia en la ventana'), ('FILL_RISE', 'Subida de nivel con la válvula abierta (L)')], max_length=16)),
+                ('operator', models.CharField(choices=[('GT', 'Mayor que'), ('LT', 'Menor que')], default='GT', max_length=2)),
+                ('threshold', models.FloatField()),
+                ('window_s', models.PositiveIntegerField(default=60)),
+                ('for_s', models.PositiveIntegerField(default=0)),
+                ('severity', models.CharField(choices=[('INFO', 'Informativo'), ('WARNING', 'Advertencia'), ('ERROR', 'Error')], default='WARNING', max_length=16)),
+                ('enabled', models.BooleanField(default=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('config', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='alarm_rules', to='control.tankconfig')),
+            ],
+            options={
+                'verbose_name': 'Regla de alarma',
+                'verbose_name_plural': 'Reglas de alarma',
+                'ordering': ['config', 'id'],
+            },
+        ),
+        migrations.AddField(
+            model_name='eventlog',
+            name='alarm',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='events', to='control.alarmrule'),
+        ),
+    ]
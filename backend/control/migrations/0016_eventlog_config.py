@@ -0,0 +1,17 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('control', '0015_alarmrule'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='eventlog',
+            name='config',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='events', to='control.tankconfig'),
+        ),
+    ]
@@ -0,0 +1,51 @@
+from django.db import migrations, models, transaction
+from django.db.models import Max, OuterRef, Subquery
+
+BATCH_SIZE = 5000
+
+
+def backfill_event_configs(apps, schema_editor):
+    """Asigna el tanque a los eventos existentes por rangos de id, un lote por transacción.
+
+    Se toma del ``TankState`` enlazado; si el estado ya no está (compactado o
+    archivado) o el evento no tiene estado y hay un solo tanque, se usa ese.
+    Con varios tanques esos eventos quedan sin tanque.
+    """
+    db = schema_editor.connection.alias
+    EventLog = apps.get_model('control', 'EventLog')
+    TankConfig = apps.get_model('control', 'TankConfig')
+    TankState = apps.get_model('control', 'TankState')
+
+    events = EventLog.objects.using(db)
+    last_id = events.aggregate(last=Max('id'))['last'] or 0
+    config_ids = list(TankConfig.objects.using(db).values_list('id', flat=True)[:2])
+    only_config = config_ids[0] if len(config_ids) == 1 else None
+    state_config = TankState.objects.using(db).filter(pk=OuterRef('state_id')).values('config_id')[:1]
+    for start in range(1, last_id + 1, BATCH_SIZE):
+        with transaction.atomic(using=db):
+            chunk = events.filter(id__gte=start, id__lt=start + BATCH_SIZE, config__isnull=True)
+            chunk.filter(state__isnull=False).update(config_id=Subquery(state_config))
+            if only_config is not None:
+                chunk.filter(config__isnull=True).update(config_id=only_config)
+
+
+class Migration(migrations.Migration):
+    # Cada lote del relleno confirma por separado para no bloquear la tabla; si
+    # se interrumpe, volver a migrar sigue con las filas que quedan sin tanque.
+    atomic = False
+
+    dependencies = [
+        ('control', '0016_eventlog_config'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_event_configs, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='eventlog',
+            index=models.Index(fields=['config', 'ts'], name='eventlog_config_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='eventlog',
+            index=models.Index(fields=['config', 'code', 'ts'], name='eventlog_config_code_ts_idx'),
+        ),
+    ]
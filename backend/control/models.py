@@ -1,7 +1,14 @@
 from __future__ import annotations
 
+import math
+from datetime import timedelta
+from typing import Any, Mapping, Optional
+
+from django.conf import settings
 from django.core.exceptions import ValidationError
 from django.db import models, transaction
+from django.db.models import F, Q
+from django.utils import timezone
 
 
 class EventSeverity(models.TextChoices):
@@ -19,6 +26,9 @@ class EventCode(models.TextChoices):
     SAFE_MODE = 'SAFE_MODE', 'Modo seguro activado'
     DRAIN_OPEN = 'DRAIN_OPEN', 'Válvula de vaciado abierta'
     DRAIN_CLOSE = 'DRAIN_CLOSE', 'Válvula de vaciado cerrada'
+    LEASE_ACQUIRED = 'LEASE_ACQUIRED', 'Nodo líder asignado'
+    ALARM = 'ALARM', 'Alarma activada'
+    ALARM_CLEAR = 'ALARM_CLEAR', 'Alarma despejada'
 
 
 class ControlMode(models.TextChoices):
@@ -26,6 +36,26 @@ class ControlMode(models.TextChoices):
     MANUAL = 'MANUAL', 'Manual'
 
 
+class SignalFilter(models.TextChoices):
+    NONE = 'NONE', 'Sin filtro'
+    MEDIAN = 'MEDIAN', 'Mediana móvil'
+    EWMA = 'EWMA', 'Media móvil exponencial'
+
+
+class AlarmMetric(models.TextChoices):
+    TEMP = 'TEMP', 'Temperatura (°C)'
+    LEVEL = 'LEVEL', 'Nivel (L)'
+    TEMP_RATE = 'TEMP_RATE', 'Variación de temperatura (°C/min)'
+    LEVEL_RATE = 'LEVEL_RATE', 'Variación de nivel (L/min)'
+    HEATER_CYCLES = 'HEATER_CYCLES', 'Encendidos de la resistencia en la ventana'
+    FILL_RISE = 'FILL_RISE', 'Subida de nivel con la válvula abierta (L)'
+
+
+class AlarmOperator(models.TextChoices):
+    ABOVE = 'GT', 'Mayor que'
+    BELOW = 'LT', 'Menor que'
+
+
 class TankConfig(models.Model):
     capacity_l = models.PositiveIntegerField(default=100)
     min_level_l = models.PositiveIntegerField(default=30)
@@ -45,6 +75,15 @@ class TankConfig(models.Model):
     manual_heater_on = models.BooleanField(default=False)
     manual_heater_150_on = models.BooleanField(default=False)
     manual_heater_500_on = models.BooleanField(default=False)
+    signal_filter = models.CharField(
+        max_length=10,
+        choices=SignalFilter.choices,
+        default=SignalFilter.NONE,
+    )
+    signal_filter_window = models.PositiveSmallIntegerField(default=5)
+    signal_filter_alpha = models.FloatField(default=0.3)
+    max_level_rate_lps = models.FloatField(default=0.0)
+    max_temp_rate_cps = models.FloatField(default=0.0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -67,6 +106,12 @@ class TankConfig(models.Model):
             errors['temp_set_c'] = 'El set point debe estar entre los límites permitidos.'
         if self.temp_min_c < 0:
             errors['temp_min_c'] = 'La temperatura mínima debe ser mayor o igual a 0.'
+        if not (1 <= self.signal_filter_window <= 64):
+            errors['signal_filter_window'] = 'La ventana del filtro debe estar entre 1 y 64 muestras.'
+        if not (0 < self.signal_filter_alpha <= 1):
+            errors['signal_filter_alpha'] = 'El factor alfa debe cumplir 0 < alfa ≤ 1.'
+        if self.max_level_rate_lps < 0 or self.max_temp_rate_cps < 0:
+            errors['max_level_rate_lps'] = 'Las tasas máximas de cambio no pueden ser negativas.'
         if errors:
             raise ValidationError(errors)
 
@@ -93,32 +138,259 @@ class TankConfig(models.Model):
 
 class TankState(models.Model):
     config = models.ForeignKey(TankConfig, on_delete=models.CASCADE, related_name='states')
+    seq = models.PositiveBigIntegerField()
     level_l = models.FloatField()
     temp_c = models.FloatField()
     valve_open = models.BooleanField(default=False)
     drain_valve_open = models.BooleanField(default=False)
     heater_on = models.BooleanField(default=False)
     safe_mode = models.BooleanField(default=False)
-    ts = models.DateTimeField(auto_now_add=True)
+    ts = models.DateTimeField(default=timezone.now, editable=False)
 
     class Meta:
         verbose_name = 'Estado del tanque'
         verbose_name_plural = 'Estados del tanque'
         ordering = ['-ts']
+        indexes = [
+            models.Index(fields=['ts']),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['config', 'seq'], name='tankstate_config_seq_uniq'),
+        ]
 
     def __str__(self) -> str:
         return f'TankState(ts={self.ts}, level={self.level_l}, temp={self.temp_c})'
 
 
+class TankStateHead(models.Model):
+    """Puntero al último ``TankState`` de cada tanque.
+
+    Se actualiza en la misma transacción que cada inserción; ``seq`` permite
+    detectar de forma optimista a otro proceso que haya avanzado el tanque.
+    ``heartbeat_at`` y ``step_ms`` solo los actualiza un paso normal del bucle,
+    no el estado seguro forzado por el watchdog.
+    """
+
+    config = models.OneToOneField(
+        TankConfig,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='head',
+    )
+    state = models.ForeignKey(TankState, on_delete=models.CASCADE, related_name='+')
+    seq = models.PositiveBigIntegerField()
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    step_ms = models.FloatField(default=0)
+    slo_breaches = models.PositiveBigIntegerField(default=0)
+
+    class Meta:
+        verbose_name = 'Último estado del tanque'
+        verbose_name_plural = 'Últimos estados del tanque'
+
+    def __str__(self) -> str:
+        return f'TankStateHead(config={self.config_id}, seq={self.seq})'
+
+
+class TankLease(models.Model):
+    """Arrendamiento del derecho a ejecutar pasos de control de un tanque.
+
+    Solo el nodo ``owner`` avanza el tanque mientras ``expires_at`` no venza;
+    el dueño lo renueva periódicamente y, si deja de hacerlo, otro nodo lo toma
+    e incrementa ``epoch``. La lógica está en ``control/leases.py``.
+    """
+
+    config = models.OneToOneField(
+        TankConfig,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='lease',
+    )
+    owner = models.CharField(max_length=128)
+    epoch = models.PositiveBigIntegerField(default=1)
+    acquired_at = models.DateTimeField()
+    renewed_at = models.DateTimeField()
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        verbose_name = 'Arrendamiento del tanque'
+        verbose_name_plural = 'Arrendamientos de tanque'
+
+    def __str__(self) -> str:
+        return f'TankLease(config={self.config_id}, owner={self.owner}, epoch={self.epoch})'
+
+
+class TankStateChunk(models.Model):
+    """Muestras de ``TankState`` de un tanque durante un minuto, comprimidas.
+
+    El formato de ``payload`` está en ``control/timeseries.py``.
+    """
+
+    config = models.ForeignKey(TankConfig, on_delete=models.CASCADE, related_name='state_chunks')
+    minute = models.DateTimeField()
+    count = models.PositiveIntegerField()
+    first_seq = models.PositiveBigIntegerField()
+    last_seq = models.PositiveBigIntegerField()
+    payload = models.BinaryField()
+
+    class Meta:
+        ordering = ['-minute']
+        verbose_name = 'Bloque de estados'
+        verbose_name_plural = 'Bloques de estados'
+        constraints = [
+            models.UniqueConstraint(fields=['config', 'minute'], name='tankstatechunk_config_minute_uniq'),
+        ]
+        indexes = [models.Index(fields=['minute'])]
+
+    def __str__(self) -> str:
+        return f'TankStateChunk(config={self.config_id}, minute={self.minute:%Y-%m-%d %H:%M}, n={self.count})'
+
+    def samples(self):
+        from .timeseries import decode_chunk
+
+        return decode_chunk(self.payload, self.count)
+
+
+# Bits de ``EventLog.prev_actuators``/``new_actuators``, en el orden de ``timeseries.FLAG_FIELDS``.
+ACTUATOR_BITS = (
+    ('valve_open', 1),
+    ('drain_valve_open', 2),
+    ('heater_on', 4),
+    ('safe_mode', 8),
+)
+EVENT_VALUE_FIELDS = ('level_l', 'temp_c', 'power_w')
+
+
+def actuator_bits(state: TankState) -> int:
+    return sum(bit for name, bit in ACTUATOR_BITS if getattr(state, name))
+
+
+def render_event_message(template: str, values: Mapping[str, Any]) -> str:
+    """Texto del evento: ``template`` con ``values`` (``str.format``) si trae lecturas.
+
+    Los eventos sin lecturas (watchdog, arrendamientos, filas previas a los
+    campos numéricos) guardan el texto final y se devuelven tal cual.
+    """
+    if '{' not in template or all(values.get(name) is None for name in EVENT_VALUE_FIELDS):
+        return template
+    try:
+        return template.format_map(values)
+    except (KeyError, IndexError, TypeError, ValueError):
+        return template
+
+
+class AlarmRule(models.Model):
+    """Alarma declarativa de un tanque: ``metric`` ``operator`` ``threshold``.
+
+    La condición debe sostenerse ``for_s`` segundos para activarse. Las métricas
+    de variación, encendidos y subida con válvula abierta se calculan sobre
+    ``window_s`` segundos. La evaluación está en ``control/alarms.py``. Guardar o
+    borrar una regla actualiza ``TankConfig.updated_at`` para que el bucle la
+    recompile.
+    """
+
+    WINDOWED_METRICS = (
+        AlarmMetric.TEMP_RATE,
+        AlarmMetric.LEVEL_RATE,
+        AlarmMetric.HEATER_CYCLES,
+        AlarmMetric.FILL_RISE,
+    )
+
+    config = models.ForeignKey(TankConfig, on_delete=models.CASCADE, related_name='alarm_rules')
+    name = models.CharField(max_length=64)
+    metric = models.CharField(max_length=16, choices=AlarmMetric.choices)
+    operator = models.CharField(max_length=2, choices=AlarmOperator.choices, default=AlarmOperator.ABOVE)
+    threshold = models.FloatField()
+    window_s = models.PositiveIntegerField(default=60)
+    for_s = models.PositiveIntegerField(default=0)
+    severity = models.CharField(max_length=16, choices=EventSeverity.choices, default=EventSeverity.WARNING)
+    enabled = models.BooleanField(default=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Regla de alarma'
+        verbose_name_plural = 'Reglas de alarma'
+        ordering = ['config', 'id']
+
+    def clean(self):
+        errors = {}
+        if self.threshold is not None and not math.isfinite(self.threshold):
+            errors['threshold'] = 'El umbral debe ser un número finito.'
+        if self.metric in self.WINDOWED_METRICS and not (1 <= self.window_s <= 86_400):
+            errors['window_s'] = 'La ventana debe estar entre 1 s y 24 h.'
+        if errors:
+            raise ValidationError(errors)
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            self._touch_config()
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            result = super().delete(*args, **kwargs)
+            self._touch_config()
+        return result
+
+    def _touch_config(self) -> None:
+        TankConfig.objects.filter(pk=self.config_id).update(updated_at=timezone.now())
+
+    def __str__(self) -> str:
+        return f'{self.name} ({self.get_metric_display()} {self.get_operator_display().lower()} {self.threshold:g})'
+
+
 class EventLog(models.Model):
+    """Evento del tanque.
+
+    Los eventos del bucle guardan las lecturas como columnas (``level_l``,
+    ``temp_c``, ``power_w``), los actuadores antes y después como bits
+    (``ACTUATOR_BITS``) y el ``TankState`` que los produjo; ``message`` es una
+    plantilla constante que se completa al mostrarse (``text``). ``config`` es
+    el tanque que lo produjo; las consultas por tanque usan los índices
+    ``(config, ts)`` y ``(config, code, ts)``.
+    """
+
+    # El índice propio de la FK es ``(config, id)`` en la práctica: sirve al
+    # admin y al tablero, que ordenan por id.
+    config = models.ForeignKey(
+        TankConfig,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='events',
+    )
     code = models.CharField(max_length=32, choices=EventCode.choices)
     message = models.CharField(max_length=255)
+    # Sin restricción en la base: los estados se compactan y archivan, y el id
+    # sigue identificando la muestra.
+    state = models.ForeignKey(
+        TankState,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        null=True,
+        blank=True,
+        related_name='events',
+    )
+    level_l = models.FloatField(null=True, blank=True)
+    temp_c = models.FloatField(null=True, blank=True)
+    power_w = models.FloatField(null=True, blank=True)
+    prev_actuators = models.PositiveSmallIntegerField(null=True, blank=True)
+    new_actuators = models.PositiveSmallIntegerField(null=True, blank=True)
+    alarm = models.ForeignKey(
+        AlarmRule,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='events',
+    )
     severity = models.CharField(
         max_length=16,
         choices=EventSeverity.choices,
         default=EventSeverity.INFO,
     )
-    ts = models.DateTimeField(auto_now_add=True)
+    ts = models.DateTimeField(default=timezone.now, editable=False)
+    occurrences = models.PositiveIntegerField(default=1)
+    last_ts = models.DateTimeField(null=True, blank=True)
+    episode_open = models.BooleanField(default=False)
 
     class Meta:
         verbose_name = 'Evento'
@@ -127,11 +399,79 @@ class EventLog(models.Model):
         indexes = [
             models.Index(fields=['ts']),
             models.Index(fields=['code']),
+            models.Index(
+                fields=['code'],
+                condition=Q(episode_open=True),
+                name='eventlog_open_episode_idx',
+            ),
+            models.Index(fields=['code', 'level_l', 'temp_c'], name='eventlog_code_readings_idx'),
+            models.Index(fields=['config', 'ts'], name='eventlog_config_ts_idx'),
+            models.Index(fields=['config', 'code', 'ts'], name='eventlog_config_code_ts_idx'),
+            models.Index(fields=['config', 'last_ts'], name='eventlog_config_last_ts_idx'),
         ]
 
     def __str__(self) -> str:
         return f'[{self.ts}] {self.code}'
 
+    @property
+    def text(self) -> str:
+        return render_event_message(self.message, {name: getattr(self, name) for name in EVENT_VALUE_FIELDS})
+
+    @classmethod
+    def log(
+        cls,
+        code: str,
+        message: str,
+        severity: str = EventSeverity.INFO,
+        coalesce: bool = False,
+        **fields: Any,
+    ) -> 'EventLog':
+        """Registra un evento.
+
+        ``fields`` son el tanque (``config``) y las columnas estructuradas
+        (``state``, ``level_l``, ``temp_c``, ``power_w``, ``prev_actuators``,
+        ``new_actuators``, ``alarm``). Con ``coalesce=True`` las repeticiones
+        del mismo código y severidad en el mismo tanque dentro de
+        ``EVENT_COALESCE_WINDOW_S`` actualizan el episodio abierto (conteo,
+        última fecha, último mensaje y lecturas) en lugar de insertar una fila
+        nueva.
+        """
+        window_s = getattr(settings, 'EVENT_COALESCE_WINDOW_S', 0)
+        if not coalesce or window_s <= 0:
+            return cls.objects.create(code=code, message=message, severity=severity, **fields)
+
+        now = timezone.now()
+        episode = (
+            cls.objects.filter(code=code, severity=severity, episode_open=True, config=fields.get('config'))
+            .order_by('-id')
+            .first()
+        )
+        if episode is not None:
+            last_seen = episode.last_ts or episode.ts
+            if now - last_seen <= timedelta(seconds=window_s):
+                cls.objects.filter(pk=episode.pk).update(
+                    occurrences=F('occurrences') + 1,
+                    last_ts=now,
+                    message=message,
+                    **fields,
+                )
+                episode.occurrences += 1
+                episode.last_ts = now
+                episode.message = message
+                for name, value in fields.items():
+                    setattr(episode, name, value)
+                return episode
+            cls.objects.filter(pk=episode.pk).update(episode_open=False)
+        return cls.objects.create(
+            code=code,
+            message=message,
+            severity=severity,
+            last_ts=now,
+            episode_open=True,
+            **fields,
+        )
+
     @classmethod
-    def log(cls, code: str, message: str, severity: str = EventSeverity.INFO) -> 'EventLog':
-        return cls.objects.create(code=code, message=message, severity=severity)
+    def close_episodes(cls, code: str, config: Optional[TankConfig] = None) -> int:
+        """Cierra los episodios abiertos de ``code`` del tanque cuando la condición se despeja."""
+        return cls.objects.filter(code=code, episode_open=True, config=config).update(episode_open=False)
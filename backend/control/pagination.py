@@ -0,0 +1,60 @@
+from __future__ import annotations
+
+from typing import Optional
+
+from django.core.paginator import Paginator
+from django.db import connections, models
+from django.db.models import Max, Min
+from django.utils.functional import cached_property
+
+
+def estimate_row_count(model: type[models.Model], using: str = 'default') -> Optional[int]:
+    """Estima el número de filas de la tabla sin recorrerla con ``COUNT(*)``.
+
+    MySQL y PostgreSQL exponen estadísticas del catálogo; en el resto de motores
+    se usa el rango de claves primarias, que se resuelve con el índice de la PK.
+    """
+    connection = connections[using]
+    table = model._meta.db_table
+    estimate = None
+    with connection.cursor() as cursor:
+        if connection.vendor == 'mysql':
+            cursor.execute(
+                'SELECT TABLE_ROWS FROM information_schema.TABLES '
+                'WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s',
+                [table],
+            )
+            row = cursor.fetchone()
+            estimate = row[0] if row else None
+        elif connection.vendor == 'postgresql':
+            cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE relname = %s', [table])
+            row = cursor.fetchone()
+            estimate = row[0] if row else None
+    if estimate is not None and estimate >= 0:
+        return int(estimate)
+
+    bounds = model._default_manager.using(using).aggregate(first=Min('pk'), last=Max('pk'))
+    if bounds['first'] is None:
+        return 0
+    return int(bounds['last'] - bounds['first'] + 1)
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginador que evita ``COUNT(*)`` completos sobre tablas históricas.
+
+    Sin filtros usa :func:`estimate_row_count`; con filtros cuenta como máximo
+    ``COUNT_CAP`` filas, suficiente para la navegación del admin.
+    """
+
+    COUNT_CAP = 10_000
+
+    @cached_property
+    def count(self) -> int:
+        queryset = self.object_list
+        if not isinstance(queryset, models.QuerySet):
+            return super().count
+        if not queryset.query.where:
+            estimate = estimate_row_count(queryset.model, using=queryset.db)
+            if estimate is not None:
+                return estimate
+        return queryset.order_by()[: self.COUNT_CAP].count()
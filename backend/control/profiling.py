@@ -0,0 +1,373 @@
+"""Perfilado del camino de control (``ControlService.step``) sin servidor.
+
+``ControlProfiler`` reproduce el bucle de ``run_simulation`` (leer el último
+estado, avanzar la física, ``step``) con lecturas deterministas e inyecta
+lecturas inválidas cada ``fault_every`` pasos para recorrer también el modo
+seguro. Cada corrida hace tres pasadas de ``iterations`` pasos sobre la misma
+base, cada una con un solo instrumento para que no se distorsionen entre sí:
+
+* ``timing``: sin instrumentar; latencias por paso (p50/p95/p99).
+* ``cpu``: ``cProfile`` más un muestreador de pilas en un hilo aparte que
+  produce pilas colapsadas (``stacks.folded``, formato de ``flamegraph.pl`` y
+  speedscope).
+* ``memory``: ``tracemalloc``; memoria trazada y objetos vivos cada
+  ``snapshot_every`` pasos (``growth.csv``), pendiente en bytes por paso y
+  líneas que más crecieron entre el inicio y el final de la pasada.
+
+Los reportes de texto usan rutas relativas (al proyecto, a ``site-packages`` o
+a la biblioteca estándar) y orden estable, así que dos corridas en commits
+distintos se comparan con ``diff``; las cantidades de llamadas son exactas y
+los tiempos varían con la máquina.
+"""
+
+from __future__ import annotations
+
+import cProfile
+import csv
+import gc
+import json
+import math
+import pstats
+import sys
+import sysconfig
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Optional
+
+from django.conf import settings
+from django.test.utils import override_settings
+
+from .models import EventLog, TankConfig, TankState
+from .services import ControlService
+from .simulation import DEFAULT_CONSTANTS, next_level, next_temperature
+
+PASSES = ('timing', 'cpu', 'memory')
+
+CPU_PROFILE_FILE = 'cpu.prof'
+CPU_REPORT_FILE = 'cpu.txt'
+STACKS_FILE = 'stacks.folded'
+MEMORY_REPORT_FILE = 'memory.txt'
+GROWTH_FILE = 'growth.csv'
+SUMMARY_FILE = 'summary.json'
+
+# Mismos límites que fija run_simulation para que la física no sature el tanque.
+SIM_MIN_LEVEL_L = 90
+SIM_MAX_LEVEL_L = 200
+
+_MEMORY_FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+    tracemalloc.Filter(False, '<unknown>'),
+)
+
+
+def _path_prefixes() -> list[str]:
+    paths = sysconfig.get_paths()
+    prefixes = [str(settings.BASE_DIR), paths['purelib'], paths['platlib'], paths['stdlib']]
+    return sorted({prefix.rstrip('/') + '/' for prefix in prefixes}, key=len, reverse=True)
+
+
+def short_path(filename: str, prefixes: Optional[list[str]] = None) -> str:
+    """Ruta sin el prefijo de la máquina, para que los reportes sean comparables."""
+    for prefix in prefixes if prefixes is not None else _path_prefixes():
+        if filename.startswith(prefix):
+            return filename[len(prefix):]
+    return filename
+
+
+@dataclass
+class ProfileOptions:
+    iterations: int = 1000
+    warmup: int = 50
+    snapshot_every: int = 100
+    fault_every: int = 200
+    fault_steps: int = 3
+    top: int = 40
+    sample_interval_s: float = 0.001
+    passes: tuple[str, ...] = PASSES
+
+
+@dataclass
+class ProfileReport:
+    options: dict
+    engine: str = ''
+    timing: dict = field(default_factory=dict)
+    cpu: dict = field(default_factory=dict)
+    memory: dict = field(default_factory=dict)
+    row_growth: dict = field(default_factory=dict)
+
+
+class StackSampler:
+    """Muestrea la pila de un hilo cada ``interval_s`` y cuenta pilas colapsadas.
+
+    Solo se conservan los marcos desde ``root`` (el código del paso) hacia
+    adentro; las muestras tomadas fuera del paso se descartan.
+    """
+
+    def __init__(self, root, *, interval_s: float = 0.001, thread_id: Optional[int] = None):
+        self.root = root
+        self.interval_s = interval_s
+        self.thread_id = thread_id if thread_id is not None else threading.get_ident()
+        self.samples: Counter[str] = Counter()
+        self._prefixes = _path_prefixes()
+        self._labels: dict = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval_s):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                stack = self._collapse(frame)
+                if stack:
+                    self.samples[stack] += 1
+
+    def _collapse(self, frame) -> Optional[str]:
+        labels = []
+        while frame is not None:
+            code = frame.f_code
+            label = self._labels.get(code)
+            if label is None:
+                label = self._labels[code] = f'{short_path(code.co_filename, self._prefixes)}:{code.co_name}'
+            labels.append(label)
+            if code is self.root:
+                return ';'.join(reversed(labels))
+            frame = frame.f_back
+        return None
+
+    def write(self, path: Path) -> None:
+        with open(path, 'w', encoding='utf-8') as handle:
+            for stack, count in sorted(self.samples.items()):
+                handle.write(f'{stack} {count}\n')
+
+
+class ControlProfiler:
+    """Ejecuta las pasadas de perfilado sobre la base activa y escribe los reportes."""
+
+    def __init__(
+        self,
+        options: ProfileOptions,
+        output_dir: Path,
+        *,
+        config: Optional[TankConfig] = None,
+        engine: str = '',
+    ):
+        self.options = options
+        self.output_dir = Path(output_dir)
+        self.engine = engine
+        self.service = ControlService(config)
+        self._index = 0
+
+    def run(self) -> ProfileReport:
+        options = self.options
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        report = ProfileReport(options=asdict(options), engine=self.engine)
+        # Como en producción: con DEBUG cada consulta queda en connection.queries.
+        with override_settings(DEBUG=False):
+            self._prepare()
+            rows_before = self._row_counts()
+            for _ in range(options.warmup):
+                self.step()
+            if 'timing' in options.passes:
+                report.timing = self._timing_pass()
+            if 'cpu' in options.passes:
+                report.cpu = self._cpu_pass()
+            if 'memory' in options.passes:
+                report.memory = self._memory_pass()
+            rows_after = self._row_counts()
+        report.row_growth = {name: rows_after[name] - rows_before[name] for name in rows_after}
+        with open(self.output_dir / SUMMARY_FILE, 'w', encoding='utf-8') as handle:
+            json.dump(asdict(report), handle, indent=2, sort_keys=True)
+            handle.write('\n')
+        return report
+
+    def _prepare(self) -> None:
+        config = self.service.config
+        updates = {}
+        if config.capacity_l < SIM_MAX_LEVEL_L:
+            updates['capacity_l'] = SIM_MAX_LEVEL_L
+        if config.max_level_l != SIM_MAX_LEVEL_L:
+            updates['max_level_l'] = SIM_MAX_LEVEL_L
+        if config.min_level_l != SIM_MIN_LEVEL_L:
+            updates['min_level_l'] = SIM_MIN_LEVEL_L
+        if updates:
+            TankConfig.objects.filter(pk=config.pk).update(**updates)
+            config.refresh_from_db(fields=list(updates))
+        self.service.ensure_initial_state()
+
+    def step(self) -> TankState:
+        """Un ciclo de ``run_simulation`` con un paso simulado de 1 s."""
+        service = self.service
+        config = service.config
+        latest = service.get_latest_state()
+        level_l = next_level(
+            latest.level_l, latest.valve_open, latest.drain_valve_open, 1.0, config.capacity_l, DEFAULT_CONSTANTS
+        )
+        temp_c = next_temperature(
+            latest.temp_c, latest.heater_on, 1.0, config.temp_min_c, config.temp_max_c, DEFAULT_CONSTANTS
+        )
+        fault_every = self.options.fault_every
+        if fault_every and self._index % fault_every >= fault_every - self.options.fault_steps:
+            level_l = -1.0
+        self._index += 1
+        return service.step(level_l=level_l, temp_c=temp_c).state
+
+    def _timing_pass(self) -> dict:
+        latencies_ms = []
+        started = time.perf_counter()
+        for _ in range(self.options.iterations):
+            step_started = time.perf_counter()
+            self.step()
+            latencies_ms.append((time.perf_counter() - step_started) * 1000)
+        elapsed = time.perf_counter() - started
+        latencies_ms.sort()
+        return {
+            'steps_per_s': round(len(latencies_ms) / elapsed, 1) if elapsed else 0.0,
+            'p50_ms': round(_percentile(latencies_ms, 50), 3),
+            'p95_ms': round(_percentile(latencies_ms, 95), 3),
+            'p99_ms': round(_percentile(latencies_ms, 99), 3),
+            'max_ms': round(latencies_ms[-1], 3) if latencies_ms else 0.0,
+        }
+
+    def _cpu_pass(self) -> dict:
+        sampler = StackSampler(ControlProfiler.step.__code__, interval_s=self.options.sample_interval_s)
+        profiler = cProfile.Profile()
+        sampler.start()
+        profiler.enable()
+        try:
+            for _ in range(self.options.iterations):
+                self.step()
+        finally:
+            profiler.disable()
+            sampler.stop()
+        profiler.dump_stats(self.output_dir / CPU_PROFILE_FILE)
+        sampler.write(self.output_dir / STACKS_FILE)
+        stats = pstats.Stats(profiler)
+        rows = self._write_cpu_report(stats)
+        return {
+            'total_calls': stats.total_calls,
+            'functions': rows,
+            'samples': sum(sampler.samples.values()),
+        }
+
+    def _write_cpu_report(self, stats: pstats.Stats) -> int:
+        """Funciones agrupadas por ``archivo:función`` (sin número de línea) y ordenadas por tiempo acumulado."""
+        prefixes = _path_prefixes()
+        grouped: dict[str, list] = {}
+        for (filename, _, name), (_, calls, tottime, cumtime, _) in stats.stats.items():
+            location = name if filename == '~' else f'{short_path(filename, prefixes)}:{name}'
+            entry = grouped.setdefault(location, [0, 0.0, 0.0])
+            entry[0] += calls
+            entry[1] += tottime
+            entry[2] += cumtime
+        iterations = self.options.iterations or 1
+        ordered = sorted(grouped.items(), key=lambda item: (-item[1][2], item[0]))[: self.options.top]
+        with open(self.output_dir / CPU_REPORT_FILE, 'w', encoding='utf-8') as handle:
+            handle.write(f'# {iterations} pasos; tiempos en µs por paso\n')
+            handle.write(f'{"llamadas/paso":>13} {"propio":>9} {"acumulado":>10}  función\n')
+            for location, (calls, tottime, cumtime) in ordered:
+                handle.write(
+                    f'{calls / iterations:>13.2f} {tottime / iterations * 1e6:>9.1f} '
+                    f'{cumtime / iterations * 1e6:>10.1f}  {location}\n'
+                )
+        return len(grouped)
+
+    def _memory_pass(self) -> dict:
+        options = self.options
+        every = max(1, options.snapshot_every)
+        samples: list[tuple[int, int, int]] = []
+        tracemalloc.start()
+        try:
+            gc.collect()
+            first = tracemalloc.take_snapshot().filter_traces(_MEMORY_FILTERS)
+            samples.append((0, tracemalloc.get_traced_memory()[0], len(gc.get_objects())))
+            for index in range(1, options.iterations + 1):
+                self.step()
+                if index % every == 0 or index == options.iterations:
+                    gc.collect()
+                    samples.append((index, tracemalloc.get_traced_memory()[0], len(gc.get_objects())))
+            peak = tracemalloc.get_traced_memory()[1]
+            last = tracemalloc.take_snapshot().filter_traces(_MEMORY_FILTERS)
+        finally:
+            tracemalloc.stop()
+        with open(self.output_dir / GROWTH_FILE, 'w', encoding='utf-8', newline='') as handle:
+            writer = csv.writer(handle)
+            writer.writerow(['step', 'traced_bytes', 'objects'])
+            writer.writerows(samples)
+        self._write_memory_report(first, last)
+        # La pendiente se toma sobre la segunda mitad: la primera incluye cachés que se llenan.
+        tail = samples[len(samples) // 2:]
+        return {
+            'start_bytes': samples[0][1],
+            'end_bytes': samples[-1][1],
+            'peak_bytes': peak,
+            'growth_bytes_per_step': round(_slope([(s[0], s[1]) for s in tail]), 1),
+            'objects_start': samples[0][2],
+            'objects_end': samples[-1][2],
+            'growth_objects_per_step': round(_slope([(s[0], s[2]) for s in tail]), 3),
+        }
+
+    def _write_memory_report(self, first: tracemalloc.Snapshot, last: tracemalloc.Snapshot) -> None:
+        top = self.options.top
+        prefixes = _path_prefixes()
+
+        def location(stat) -> str:
+            frame = stat.traceback[0]
+            return f'{short_path(frame.filename, prefixes)}:{frame.lineno}'
+
+        with open(self.output_dir / MEMORY_REPORT_FILE, 'w', encoding='utf-8') as handle:
+            handle.write('# Crecimiento entre el inicio y el final de la pasada de memoria\n')
+            handle.write(f'{"Δ KiB":>10} {"Δ bloques":>10}  línea\n')
+            growth = sorted(
+                (stat for stat in last.compare_to(first, 'lineno') if stat.size_diff),
+                key=lambda stat: (-stat.size_diff, location(stat)),
+            )
+            for stat in growth[:top]:
+                handle.write(f'{stat.size_diff / 1024:>+10.1f} {stat.count_diff:>+10}  {location(stat)}\n')
+            handle.write('\n# Memoria viva al final de la pasada\n')
+            handle.write(f'{"KiB":>10} {"bloques":>10}  línea\n')
+            current = sorted(last.statistics('lineno'), key=lambda stat: (-stat.size, location(stat)))
+            for stat in current[:top]:
+                handle.write(f'{stat.size / 1024:>10.1f} {stat.count:>10}  {location(stat)}\n')
+
+    @staticmethod
+    def _row_counts() -> dict[str, int]:
+        return {
+            'TankState': TankState.objects.count(),
+            'EventLog': EventLog.objects.count(),
+        }
+
+
+def _percentile(ordered: list[float], pct: float) -> float:
+    if not ordered:
+        return 0.0
+    rank = math.ceil(pct / 100 * len(ordered))
+    return ordered[min(len(ordered), max(rank, 1)) - 1]
+
+
+def _slope(points: list[tuple[int, int]]) -> float:
+    """Pendiente de mínimos cuadrados; 0 con menos de dos puntos."""
+    if len(points) < 2:
+        return 0.0
+    mean_x = sum(x for x, _ in points) / len(points)
+    mean_y = sum(y for _, y in points) / len(points)
+    denominator = sum((x - mean_x) ** 2 for x, _ in points)
+    if not denominator:
+        return 0.0
+    return sum((x - mean_x) * (y - mean_y) for x, y in points) / denominator
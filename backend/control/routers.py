@@ -0,0 +1,157 @@
+"""Lecturas en réplicas para las vistas de consulta pesada.
+
+Las réplicas se declaran con ``DB_REPLICA_NAMES``/``DB_REPLICA_HOSTS`` y
+quedan como alias ``replica1``, ``replica2``… (``settings.DB_REPLICAS``). Por
+defecto todo va al primario: ``ControlService.step`` con sus lecturas dentro
+de la transacción y cualquier escritura. Solo los bloques
+``read_from(pick_read_db(request))`` (eventos, historial, exportación y
+listados del admin) envían sus lecturas a una réplica.
+
+``pick_read_db`` vuelve al primario si:
+
+- la petición pide consistencia (``?consistent=1`` o ``X-Read-Consistent: 1``);
+- el cliente escribió hace menos de ``DB_REPLICA_PIN_S`` (cookie que fija
+  ``ReadYourWritesMiddleware`` tras una petición exitosa que escribió, sea
+  cual sea el método: ``GET /api/state?level=&temp=`` también avanza el
+  tanque);
+- ninguna réplica está dentro de ``DB_REPLICA_MAX_LAG_S``. El retraso se
+  estima comparando el último latido del bucle (``TankStateHead.heartbeat_at``)
+  en cada base y se cachea ``DB_REPLICA_LAG_CHECK_S`` segundos.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import contextvars
+import math
+import random
+import threading
+import time
+from typing import Iterable, Iterator, Optional
+
+from django.conf import settings
+from django.db import DatabaseError
+from django.db.models import Max
+
+from .models import TankStateHead
+
+PRIMARY = 'default'
+PIN_COOKIE = 'read_primary_until'
+
+_read_db: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar('control_read_db', default=None)
+# Modelos escritos durante la petición en curso; lo instala ``ReadYourWritesMiddleware``.
+_written: contextvars.ContextVar[Optional[set[str]]] = contextvars.ContextVar('control_written', default=None)
+_lag_cache: dict[str, tuple[float, float]] = {}
+_lag_lock = threading.Lock()
+
+
+class ReplicaRouter:
+    """Lecturas al alias activo de ``read_from`` (primario fuera de él); escrituras al primario."""
+
+    def db_for_read(self, model, **hints):
+        return _read_db.get()
+
+    def db_for_write(self, model, **hints):
+        written = _written.get()
+        if written is not None:
+            written.add(model._meta.label)
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+
+@contextlib.contextmanager
+def read_from(alias: str) -> Iterator[str]:
+    token = _read_db.set(alias)
+    try:
+        yield alias
+    finally:
+        _read_db.reset(token)
+
+
+def stream_from(alias: str, rows: Iterable) -> Iterator:
+    """Itera ``rows`` leyendo de ``alias``; para respuestas que se consumen tras la vista."""
+    with read_from(alias):
+        yield from rows
+
+
+def wants_primary(request) -> bool:
+    if request.GET.get('consistent') == '1' or request.headers.get('X-Read-Consistent') == '1':
+        return True
+    try:
+        return float(request.COOKIES.get(PIN_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+def pick_read_db(request=None) -> str:
+    """Alias para las lecturas de la petición: una réplica sana o el primario."""
+    replicas = settings.DB_REPLICAS
+    if not replicas or (request is not None and wants_primary(request)):
+        return PRIMARY
+    healthy = [alias for alias in replicas if replica_lag_s(alias) <= settings.DB_REPLICA_MAX_LAG_S]
+    return random.choice(healthy) if healthy else PRIMARY
+
+
+def replica_lag_s(alias: str) -> float:
+    now = time.monotonic()
+    with _lag_lock:
+        cached = _lag_cache.get(alias)
+    if cached is not None and now - cached[0] < settings.DB_REPLICA_LAG_CHECK_S:
+        return cached[1]
+    lag = _measure_lag(alias)
+    with _lag_lock:
+        _lag_cache[alias] = (now, lag)
+    return lag
+
+
+def reset_lag_cache() -> None:
+    with _lag_lock:
+        _lag_cache.clear()
+
+
+def _last_heartbeat(alias: str):
+    return TankStateHead.objects.using(alias).aggregate(last=Max('heartbeat_at'))['last']
+
+
+def _measure_lag(alias: str) -> float:
+    try:
+        replica = _last_heartbeat(alias)
+    except DatabaseError:
+        return math.inf
+    primary = _last_heartbeat(PRIMARY)
+    if primary is None or (replica is not None and replica >= primary):
+        return 0.0
+    if replica is None:
+        return math.inf
+    return (primary - replica).total_seconds()
+
+
+class ReadYourWritesMiddleware:
+    """Tras una petición exitosa que escribió, fija las lecturas del cliente al primario por un tiempo.
+
+    Cualquier escritura del ORM pasa por ``ReplicaRouter.db_for_write``, que la
+    anota en el conjunto de la petición; así no importa el método HTTP.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        written: set[str] = set()
+        token = _written.set(written)
+        try:
+            response = self.get_response(request)
+        finally:
+            _written.reset(token)
+        if settings.DB_REPLICAS and written and response.status_code < 400:
+            pin_s = settings.DB_REPLICA_PIN_S
+            response.set_cookie(
+                PIN_COOKIE,
+                f'{time.time() + pin_s:.3f}',
+                max_age=math.ceil(pin_s),
+                httponly=True,
+                samesite='Lax',
+            )
+        return response
@@ -0,0 +1,197 @@
+"""Búsqueda de texto en ``EventLog`` (``message`` y ``code``).
+
+- SQLite: tabla virtual FTS5 ``control_eventlog_fts`` con contenido externo
+  (``content_rowid = id``), sincronizada por triggers en INSERT, UPDATE y
+  DELETE, de modo que ``bulk_create``, los episodios que actualizan su mensaje
+  y el archivado la mantienen al día sin código adicional.
+- MySQL: índice ``FULLTEXT`` sobre ``(message, code)`` consultado con
+  ``MATCH ... AGAINST`` en modo booleano.
+- Otros motores, o si el índice no existe: ``icontains`` por término.
+
+Cada término separado por espacios debe aparecer (AND); en FTS5 es una frase
+con prefijo, así que ``valvula`` encuentra ``Válvula``.
+
+Los eventos del bucle guardan una plantilla (``Temp={temp_c:.2f}°C``) y las
+lecturas en columnas, así que el índice no ve los números. Un término numérico
+con hasta dos decimales busca además en ``level_l`` y ``temp_c`` de los eventos
+cuya plantilla los muestra: ``45.1`` encuentra ``Temp=45.12°C`` (valores que se
+muestran como ``45.10`` a ``45.19``). En los textos ya formateados (eventos
+previos a las columnas numéricas, watchdog) el número se busca como texto.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import re
+from decimal import Decimal
+from functools import reduce
+from operator import and_, or_
+from typing import Iterator, Optional
+
+from django.db import DatabaseError, connections, transaction
+from django.db.models import Q, QuerySet
+from django.db.models.expressions import RawSQL
+
+FTS_TABLE = 'control_eventlog_fts'
+MYSQL_INDEX = 'eventlog_fulltext'
+BACKEND_FTS5 = 'fts5'
+BACKEND_MYSQL = 'mysql'
+BACKEND_LIKE = 'like'
+# Lecturas que las plantillas de ``ControlService`` muestran con dos decimales.
+READING_FIELDS = ('level_l', 'temp_c')
+NUMBER_RE = re.compile(r'-?\d+(?:\.(\d{1,2}))?')
+HALF_CENT = Decimal('0.005')
+
+SQLITE_INSTALL = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    "message, code, content='control_eventlog', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2')",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON control_eventlog BEGIN "
+    f"INSERT INTO {FTS_TABLE}(rowid, message, code) VALUES (new.id, new.message, new.code); END",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON control_eventlog BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, message, code) "
+    "VALUES ('delete', old.id, old.message, old.code); END",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF message, code ON control_eventlog BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, message, code) "
+    "VALUES ('delete', old.id, old.message, old.code); "
+    f"INSERT INTO {FTS_TABLE}(rowid, message, code) VALUES (new.id, new.message, new.code); END",
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')",
+)
+SQLITE_UNINSTALL = (
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_ai',
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_ad',
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_au',
+    f'DROP TABLE IF EXISTS {FTS_TABLE}',
+)
+
+_backends: dict[tuple[str, str], str] = {}
+
+
+def install(connection) -> str:
+    """Crea (o repara) el índice del motor y reconstruye su contenido; idempotente."""
+    _backends.clear()
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            try:
+                with transaction.atomic(using=connection.alias):
+                    for statement in SQLITE_INSTALL:
+                        cursor.execute(statement)
+            except DatabaseError:
+                # SQLite compilado sin FTS5: queda la búsqueda con LIKE.
+                pass
+        elif connection.vendor == 'mysql' and not _has_mysql_index(cursor):
+            cursor.execute(f'ALTER TABLE control_eventlog ADD FULLTEXT INDEX {MYSQL_INDEX} (message, code)')
+    return backend_for(connection)
+
+
+def uninstall(connection) -> None:
+    _backends.clear()
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            for statement in SQLITE_UNINSTALL:
+                cursor.execute(statement)
+        elif connection.vendor == 'mysql' and _has_mysql_index(cursor):
+            cursor.execute(f'ALTER TABLE control_eventlog DROP INDEX {MYSQL_INDEX}')
+
+
+@contextlib.contextmanager
+def bulk_load(connection) -> Iterator[None]:
+    """Suspende los triggers de FTS5 durante una carga masiva y reconstruye al final.
+
+    Una reconstrucción completa es mucho más rápida que indexar fila por fila;
+    en otros motores no hace nada.
+    """
+    if backend_for(connection) != BACKEND_FTS5:
+        yield
+        return
+    with connection.cursor() as cursor:
+        for statement in SQLITE_UNINSTALL[:3]:
+            cursor.execute(statement)
+    try:
+        yield
+    finally:
+        install(connection)
+
+
+def _has_mysql_index(cursor) -> bool:
+    cursor.execute(
+        'SELECT 1 FROM information_schema.statistics '
+        'WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s',
+        ['control_eventlog', MYSQL_INDEX],
+    )
+    return cursor.fetchone() is not None
+
+
+def backend_for(connection) -> str:
+    key = (connection.alias, str(connection.settings_dict['NAME']))
+    backend = _backends.get(key)
+    if backend is None:
+        backend = _backends[key] = _detect(connection)
+    return backend
+
+
+def _detect(connection) -> str:
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [FTS_TABLE])
+            if cursor.fetchone() is not None:
+                return BACKEND_FTS5
+        elif connection.vendor == 'mysql' and _has_mysql_index(cursor):
+            return BACKEND_MYSQL
+    return BACKEND_LIKE
+
+
+def search_terms(text: str) -> list[str]:
+    return [term for term in text.split() if any(char.isalnum() for char in term)]
+
+
+def fts5_query(terms: list[str]) -> str:
+    return ' AND '.join('"{}"*'.format(term.replace('"', '""')) for term in terms)
+
+
+def reading_filter(term: str) -> Optional[Q]:
+    """Eventos cuya plantilla muestra una lectura que empieza por ``term``; ``None`` si no es un número."""
+    match = NUMBER_RE.fullmatch(term)
+    if match is None:
+        return None
+    step = Decimal(1).scaleb(-len(match.group(1) or ''))
+    # El texto se redondea a dos decimales: ``45.1`` cubre [45.095, 45.195).
+    low = max(abs(Decimal(term)) - HALF_CENT, Decimal(0))
+    high = abs(Decimal(term)) + step - HALF_CENT
+    if term.startswith('-'):
+        bounds = {'gt': -float(high), 'lte': -float(low)}
+    else:
+        bounds = {'gte': float(low), 'lt': float(high)}
+    return reduce(or_, (
+        Q(message__contains='{' + name, **{f'{name}__{lookup}': value for lookup, value in bounds.items()})
+        for name in READING_FIELDS
+    ))
+
+
+def text_filter(terms: list[str], backend: str) -> Q:
+    """Eventos cuyo ``message`` o ``code`` contiene todos los ``terms``."""
+    if backend == BACKEND_FTS5:
+        return Q(id__in=RawSQL(f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [fts5_query(terms)]))
+    if backend == BACKEND_MYSQL:
+        expression = ' '.join('+"{}"'.format(term.replace('"', '')) for term in terms)
+        return Q(id__in=RawSQL(
+            'SELECT id FROM control_eventlog WHERE MATCH (message, code) AGAINST (%s IN BOOLEAN MODE)',
+            [expression],
+        ))
+    return reduce(and_, (Q(message__icontains=term) | Q(code__icontains=term) for term in terms))
+
+
+def search_events(queryset: QuerySet, text: str, *, backend: Optional[str] = None) -> QuerySet:
+    """Filtra ``queryset`` (de ``EventLog``) a los eventos que contienen todos los términos."""
+    terms = search_terms(text)
+    if not terms:
+        return queryset
+    backend = backend or backend_for(connections[queryset.db])
+    readings = {term: reading_filter(term) for term in terms}
+    words = [term for term in terms if readings[term] is None]
+    # Las palabras van en una sola consulta al índice; cada número puede estar en el texto o en las lecturas.
+    conditions = [text_filter(words, backend)] if words else []
+    conditions.extend(
+        text_filter([term], backend) | reading for term, reading in readings.items() if reading is not None
+    )
+    return queryset.filter(reduce(and_, conditions))
@@ -2,7 +2,7 @@ from __future__ import annotations
 
 from rest_framework import serializers
 
-from .models import EventLog, TankConfig, TankState
+from .models import EVENT_VALUE_FIELDS, EventLog, TankConfig, TankState, render_event_message
 
 
 class TankConfigSerializer(serializers.ModelSerializer):
@@ -24,6 +24,11 @@ class TankConfigSerializer(serializers.ModelSerializer):
             'manual_heater_on',
             'manual_heater_150_on',
             'manual_heater_500_on',
+            'signal_filter',
+            'signal_filter_window',
+            'signal_filter_alpha',
+            'max_level_rate_lps',
+            'max_temp_rate_cps',
             'created_at',
             'updated_at',
         )
@@ -43,6 +48,7 @@ class TankStateSerializer(serializers.ModelSerializer):
         fields = (
             'id',
             'config',
+            'seq',
             'level_l',
             'temp_c',
             'valve_open',
@@ -55,7 +61,27 @@ class TankStateSerializer(serializers.ModelSerializer):
 
 
 class EventLogSerializer(serializers.ModelSerializer):
+    message = serializers.CharField(source='text', read_only=True)
+
     class Meta:
         model = EventLog
-        fields = ('id', 'code', 'message', 'severity', 'ts')
+        fields = (
+            'id',
+            'config',
+            'code',
+            'message',
+            'severity',
+            'ts',
+            'occurrences',
+            'last_ts',
+            'state',
+            'level_l',
+            'temp_c',
+            'power_w',
+            'prev_actuators',
+            'new_actuators',
+            'alarm',
+        )
         read_only_fields = fields
+        # Para ``FieldPlan``: el mensaje se completa con las lecturas de la fila.
+        rendered_fields = {'message': (render_event_message, EVENT_VALUE_FIELDS)}
@@ -1,13 +1,18 @@
 from __future__ import annotations
 
 import math
+import time
 from dataclasses import dataclass
 from typing import Optional
 
 from django.conf import settings
-from django.db import transaction
+from django.db import IntegrityError, transaction
+from django.db.models import F
 from django.utils import timezone
 
+from .alarms import alarms_for
+from .coalescing import steps as coalesced_steps
+from .conditioning import conditioner_for
 from .models import (
     ControlMode,
     EventCode,
@@ -15,7 +20,10 @@ from .models import (
     EventSeverity,
     TankConfig,
     TankState,
+    TankStateHead,
+    actuator_bits,
 )
+from .tracing import span, trace, traced_atomic
 
 
 @dataclass
@@ -24,6 +32,53 @@ class ControlResult:
     created: bool
 
 
+@dataclass
+class StateHead:
+    """Último estado leído de un tanque y la secuencia esperada para avanzar."""
+
+    state: Optional[TankState]
+    seq: int
+    stored: bool
+
+
+@dataclass
+class Decision:
+    """Resultado puro de un paso de control, previo a persistirlo."""
+
+    level_l: float
+    temp_c: float
+    valve_open: bool
+    drain_valve_open: bool
+    heater_on: bool
+    safe_mode: bool
+    forced_heater_shutdown: bool
+    power_w: float = 0.0
+
+    def state_fields(self) -> dict:
+        return {
+            'level_l': self.level_l,
+            'temp_c': self.temp_c,
+            'valve_open': self.valve_open,
+            'drain_valve_open': self.drain_valve_open,
+            'heater_on': self.heater_on,
+            'safe_mode': self.safe_mode,
+        }
+
+
+@dataclass
+class TransitionEvent:
+    """Evento de un paso: ``message`` es una plantilla sobre las columnas de ``fields``."""
+
+    code: str
+    message: str
+    severity: str
+    fields: dict
+
+
+class StepConflict(Exception):
+    """Otro proceso avanzó el tanque entre la lectura y la escritura."""
+
+
 class ControlService:
     """Encapsula la lógica de control y registro de eventos."""
 
@@ -37,26 +92,30 @@ class ControlService:
     WATER_DENSITY_KG_PER_L = 1.0
     AMBIENT_TEMP_C = 22.0
     COOLING_RATE_PER_SEC = 0.003
+    MAX_STEP_RETRIES = 3
+    SAFE_MODE_MESSAGE = 'Modo seguro activado por lecturas inválidas. nivel={level_l:.2f}L, temp={temp_c:.2f}°C'
 
     def __init__(self, config: Optional[TankConfig] = None):
         self.config = config or TankConfig.get_active()
 
     def get_latest_state(self) -> Optional[TankState]:
-        return TankState.objects.filter(config=self.config).order_by('-ts').first()
+        return self._load_head(self.config).state
 
     def ensure_initial_state(self) -> TankState:
         latest = self.get_latest_state()
         if latest:
             return latest
-        return TankState.objects.create(
-            config=self.config,
-            level_l=settings.DEFAULT_TANK_INITIAL_LEVEL,
-            temp_c=settings.DEFAULT_TANK_INITIAL_TEMPERATURE,
-            valve_open=False,
-            drain_valve_open=False,
-            heater_on=False,
-            safe_mode=False,
-        )
+        with transaction.atomic():
+            return self._append_state(
+                self.config,
+                self._load_head(self.config),
+                level_l=settings.DEFAULT_TANK_INITIAL_LEVEL,
+                temp_c=settings.DEFAULT_TANK_INITIAL_TEMPERATURE,
+                valve_open=False,
+                drain_valve_open=False,
+                heater_on=False,
+                safe_mode=False,
+            )
 
     def sensors_invalid(self, level_l: float, temp_c: float) -> bool:
         if any(math.isnan(val) or math.isinf(val) for val in (level_l, temp_c)):
@@ -65,16 +124,158 @@ class ControlService:
             return True
         return False
 
-    def step(self, level_l: Optional[float] = None, temp_c: Optional[float] = None) -> ControlResult:
-        with transaction.atomic():
-            config = TankConfig.objects.select_for_update().get(pk=self.config.pk)
+    def step(
+        self,
+        level_l: Optional[float] = None,
+        temp_c: Optional[float] = None,
+        *,
+        conditioned: bool = False,
+    ) -> ControlResult:
+        """Ejecuta un paso de control; ``conditioned`` indica lecturas ya filtradas con ``condition``."""
+        started = time.perf_counter()
+        with trace('ControlService.step', config=self.config.pk):
+            if not conditioned:
+                with span('condition'):
+                    level_l, temp_c = self.condition(level_l, temp_c)
+            attempts = 0
+            while True:
+                try:
+                    return self._step_once(level_l, temp_c, started)
+                except StepConflict:
+                    attempts += 1
+                    if attempts > self.MAX_STEP_RETRIES:
+                        raise
+
+    def poll_step(self) -> ControlResult:
+        """Paso sin lecturas externas para clientes que consultan el estado.
+
+        Las llamadas concurrentes del mismo tanque comparten un solo paso, y
+        dentro de ``STATE_MIN_STEP_INTERVAL_S`` desde el último estado se
+        devuelve ese estado (``created=False``) sin escribir otro.
+        """
+        result, _ = coalesced_steps.run(self.config.pk, self._poll_step_once)
+        return result
+
+    def _poll_step_once(self) -> ControlResult:
+        latest = self.get_latest_state()
+        min_interval_s = settings.STATE_MIN_STEP_INTERVAL_S
+        if latest is not None and (timezone.now() - latest.ts).total_seconds() < min_interval_s:
+            return ControlResult(state=latest, created=False)
+        return self.step()
+
+    def condition(
+        self,
+        level_l: Optional[float],
+        temp_c: Optional[float],
+    ) -> tuple[Optional[float], Optional[float]]:
+        """Aplica los filtros de señal configurados a las lecturas crudas."""
+        if level_l is None and temp_c is None:
+            return level_l, temp_c
+        conditioner = conditioner_for(self.config)
+        if conditioner is None:
+            return level_l, temp_c
+        return conditioner.update(level_l, temp_c)
+
+    def append_states(self, states: list[TankState], *, batch_size: int = 1000) -> int:
+        """Inserta estados ya calculados en bloque y avanza el puntero del tanque.
+
+        Pensado para importaciones históricas: asigna ``seq`` consecutivos a
+        partir del puntero, usa ``bulk_create`` y avanza el puntero con la misma
+        actualización condicional que ``step``. El puntero solo cambia de estado
+        si el último importado es más reciente que el actual. Lanza
+        ``StepConflict`` si otro proceso avanzó el tanque; el llamador decide si
+        reintenta. Devuelve la última secuencia asignada.
+        """
+        if not states:
+            return self._load_head(self.config).seq
+        config = self.config
+        try:
+            with transaction.atomic():
+                head = self._load_head(config)
+                for offset, state in enumerate(states, start=1):
+                    state.pk = None
+                    state.config = config
+                    state.seq = head.seq + offset
+                TankState.objects.bulk_create(states, batch_size=batch_size)
+                last_seq = head.seq + len(states)
+                newest = max(states, key=lambda state: (state.ts, state.seq))
+                fields = {'seq': last_seq}
+                if head.state is None or newest.ts >= head.state.ts:
+                    # Algunos motores no devuelven la pk desde bulk_create.
+                    fields['state'] = TankState.objects.get(config=config, seq=newest.seq)
+                if not head.stored:
+                    TankStateHead.objects.create(
+                        config=config,
+                        state=fields.get('state', head.state),
+                        seq=last_seq,
+                    )
+                elif not TankStateHead.objects.filter(config=config, seq=head.seq).update(**fields):
+                    raise StepConflict(f'El tanque {config.pk} avanzó durante la importación.')
+        except IntegrityError as exc:
+            raise StepConflict(f'El tanque {config.pk} avanzó durante la importación.') from exc
+        return last_seq
+
+    def force_safe_state(self, reason: str) -> Optional[TankState]:
+        """Apaga actuadores y activa modo seguro sin ejecutar un paso normal.
+
+        Lo usa el watchdog cuando el bucle deja de avanzar: registra
+        ``SAFE_MODE`` y las transiciones (``HEATER_SAFE_OFF``, cierre de
+        válvulas) como un paso en modo seguro, pero no renueva ``heartbeat_at``
+        para que la inactividad siga siendo visible. Devuelve ``None`` si el
+        tanque ya estaba en estado seguro o si el bucle avanzó mientras tanto.
+        """
+        try:
+            with transaction.atomic():
+                config = TankConfig.objects.get(pk=self.config.pk)
+                head = self._load_head(config)
+                previous = head.state
+                if previous is None or (
+                    previous.safe_mode
+                    and not (previous.heater_on or previous.valve_open or previous.drain_valve_open)
+                ):
+                    return None
+                state = self._append_state(
+                    config,
+                    head,
+                    level_l=previous.level_l,
+                    temp_c=previous.temp_c,
+                    valve_open=False,
+                    drain_valve_open=False,
+                    heater_on=False,
+                    safe_mode=True,
+                )
+                reason = reason.replace('{', '{{').replace('}', '}}')
+                EventLog.log(
+                    EventCode.SAFE_MODE,
+                    f'Modo seguro activado por el watchdog: {reason}',
+                    severity=EventSeverity.WARNING,
+                    coalesce=True,
+                    config=config,
+                    state=state,
+                    level_l=state.level_l,
+                    temp_c=state.temp_c,
+                    power_w=0.0,
+                    prev_actuators=actuator_bits(previous),
+                    new_actuators=actuator_bits(state),
+                )
+                self._log_transitions(previous, state, forced_heater_shutdown=previous.heater_on, power_w=0.0)
+                return state
+        except StepConflict:
+            return None
+
+    def _step_once(
+        self,
+        level_l: Optional[float],
+        temp_c: Optional[float],
+        started: Optional[float] = None,
+    ) -> ControlResult:
+        with traced_atomic():
+            with span('load_config'):
+                config = TankConfig.objects.get(pk=self.config.pk)
             self.config = config
-            previous_state = (
-                TankState.objects.select_for_update()
-                .filter(config=config)
-                .order_by('-ts')
-                .first()
-            )
+            with span('load_head'):
+                head = self._load_head(config)
+            previous_state = head.state
 
             if previous_state is None:
                 previous_state = TankState(
@@ -87,39 +288,97 @@ class ControlService:
                     safe_mode=False,
                 )
 
-            current_level = level_l if level_l is not None else previous_state.level_l
-            current_temp = temp_c if temp_c is not None else previous_state.temp_c
-            elapsed_seconds = self._elapsed_seconds(previous_state)
+            with span('decide'):
+                decision = self.decide(
+                    previous_state,
+                    level_l,
+                    temp_c,
+                    self._elapsed_seconds(previous_state),
+                )
+            with span('insert_state'):
+                new_state = self._append_state(
+                    config,
+                    head,
+                    step_started=started if started is not None else time.perf_counter(),
+                    **decision.state_fields(),
+                )
 
-            invalid = self.sensors_invalid(current_level, current_temp)
-            safe_mode = invalid
-            valve_open = False
-            heater_on = False
-            forced_heater_shutdown = False
-            drain_valve_open = False
-            manual_mode = config.control_mode == ControlMode.MANUAL
+            if decision.safe_mode:
+                with span('event', code=EventCode.SAFE_MODE):
+                    EventLog.log(
+                        EventCode.SAFE_MODE,
+                        self.SAFE_MODE_MESSAGE,
+                        severity=EventSeverity.WARNING,
+                        coalesce=True,
+                        config=config,
+                        state=new_state,
+                        level_l=decision.level_l,
+                        temp_c=decision.temp_c,
+                        power_w=decision.power_w,
+                        prev_actuators=actuator_bits(previous_state) if previous_state.pk else None,
+                        new_actuators=actuator_bits(new_state),
+                    )
+
+            self._log_transitions(
+                previous_state,
+                new_state,
+                decision.forced_heater_shutdown,
+                power_w=decision.power_w,
+            )
+            self._log_alarms(config, new_state, power_w=decision.power_w)
+            return ControlResult(state=new_state, created=True)
 
-            if manual_mode and not invalid:
+    def decide(
+        self,
+        previous_state: TankState,
+        level_l: Optional[float],
+        temp_c: Optional[float],
+        elapsed_seconds: float,
+        *,
+        has_previous: Optional[bool] = None,
+    ) -> Decision:
+        """Calcula el siguiente estado sin tocar la base de datos.
+
+        ``has_previous`` indica si ``previous_state`` es una muestra real; por
+        defecto se deduce de su ``pk``, lo que permite usar estados en memoria.
+        """
+        config = self.config
+        if has_previous is None:
+            has_previous = bool(previous_state.pk)
+        current_level = level_l if level_l is not None else previous_state.level_l
+        current_temp = temp_c if temp_c is not None else previous_state.temp_c
+
+        invalid = self.sensors_invalid(current_level, current_temp)
+        safe_mode = invalid
+        valve_open = False
+        heater_on = False
+        forced_heater_shutdown = False
+        drain_valve_open = False
+        manual_mode = config.control_mode == ControlMode.MANUAL
+
+        if manual_mode and not invalid:
+            with span('manual_flow'):
                 current_level = self._apply_manual_flow(
                     config=config,
                     level_l=current_level,
                     elapsed_seconds=elapsed_seconds,
                 )
 
-            power_w = 0.0
-            if manual_mode:
-                if current_level >= config.min_level_l:
-                    if config.manual_heater_on:
-                        power_w += self.HEATER_POWER_W
-                    if config.manual_heater_150_on:
-                        power_w += self.AUX_HEATER_150_POWER_W
-                    if config.manual_heater_500_on:
-                        power_w += self.AUX_HEATER_500_POWER_W
-            else:
-                if previous_state.pk and previous_state.heater_on:
+        power_w = 0.0
+        if manual_mode:
+            if current_level >= config.min_level_l:
+                if config.manual_heater_on:
                     power_w += self.HEATER_POWER_W
-
-            if temp_c is None and not invalid:
+                if config.manual_heater_150_on:
+                    power_w += self.AUX_HEATER_150_POWER_W
+                if config.manual_heater_500_on:
+                    power_w += self.AUX_HEATER_500_POWER_W
+        else:
+            if has_previous and previous_state.heater_on:
+                power_w += self.HEATER_POWER_W
+
+        if temp_c is None and not invalid:
+            with span('thermal_simulation'):
                 current_temp = self._simulate_temperature(
                     previous_temp=previous_state.temp_c,
                     level_l=current_level,
@@ -127,110 +386,228 @@ class ControlService:
                     elapsed_seconds=elapsed_seconds,
                 )
 
-            invalid = self.sensors_invalid(current_level, current_temp)
-            safe_mode = invalid
+        invalid = self.sensors_invalid(current_level, current_temp)
+        safe_mode = invalid
 
-            if invalid:
-                message = (
-                    'Modo seguro activado por lecturas inválidas. '
-                    f'nivel={current_level:.2f}L, temp={current_temp:.2f}°C'
-                )
-                EventLog.log(EventCode.SAFE_MODE, message, severity=EventSeverity.WARNING)
-                if previous_state.pk and previous_state.heater_on:
+        if invalid:
+            if has_previous and previous_state.heater_on:
+                forced_heater_shutdown = True
+            drain_valve_open = False
+        elif manual_mode:
+            safe_mode = False
+            valve_open = config.manual_valve_open
+            drain_valve_open = config.manual_drain_valve_open
+            heater_on = config.manual_heater_on
+            if current_level < config.min_level_l:
+                if heater_on:
                     forced_heater_shutdown = True
+                heater_on = False
+        else:
+            safe_mode = False
+            if current_level < config.min_level_l:
+                valve_open = True
                 drain_valve_open = False
-            elif manual_mode:
-                safe_mode = False
-                valve_open = config.manual_valve_open
-                drain_valve_open = config.manual_drain_valve_open
-                heater_on = config.manual_heater_on
-                if current_level < config.min_level_l:
-                    if heater_on:
-                        forced_heater_shutdown = True
-                    heater_on = False
+            elif current_level >= config.max_level_l:
+                valve_open = False
+                drain_valve_open = True
             else:
-                safe_mode = False
-                if current_level < config.min_level_l:
-                    valve_open = True
-                    drain_valve_open = False
-                elif current_level >= config.max_level_l:
-                    valve_open = False
-                    drain_valve_open = True
-                else:
-                    valve_open = False
-                    drain_valve_open = False
-
-                can_heat = current_level >= config.min_level_l
-                heater_on = previous_state.heater_on if previous_state.pk else False
-
-                if can_heat and current_temp < config.temp_set_c - config.hysteresis_c:
-                    heater_on = True
-                if current_temp >= config.temp_set_c:
-                    heater_on = False
-                if not can_heat:
-                    if heater_on:
-                        forced_heater_shutdown = True
-                    heater_on = False
-
-            new_state = TankState.objects.create(
-                config=config,
-                level_l=current_level,
-                temp_c=current_temp,
-                valve_open=valve_open if not safe_mode else False,
-                heater_on=heater_on if not safe_mode else False,
-                drain_valve_open=drain_valve_open if not safe_mode else False,
-                safe_mode=safe_mode,
-            )
+                valve_open = False
+                drain_valve_open = False
 
-            self._log_transitions(
-                previous_state,
-                new_state,
-                forced_heater_shutdown,
+            can_heat = current_level >= config.min_level_l
+            heater_on = previous_state.heater_on if has_previous else False
+
+            if can_heat and current_temp < config.temp_set_c - config.hysteresis_c:
+                heater_on = True
+            if current_temp >= config.temp_set_c:
+                heater_on = False
+            if not can_heat:
+                if heater_on:
+                    forced_heater_shutdown = True
+                heater_on = False
+
+        return Decision(
+            level_l=current_level,
+            temp_c=current_temp,
+            valve_open=valve_open if not safe_mode else False,
+            heater_on=heater_on if not safe_mode else False,
+            drain_valve_open=drain_valve_open if not safe_mode else False,
+            safe_mode=safe_mode,
+            forced_heater_shutdown=forced_heater_shutdown,
+            power_w=power_w,
+        )
+
+    def _load_head(self, config: TankConfig) -> StateHead:
+        head = TankStateHead.objects.select_related('state').filter(config=config).first()
+        if head is not None:
+            return StateHead(state=head.state, seq=head.seq, stored=True)
+        # Sin puntero (tanque nuevo o puntero purgado): se reconstruye por seq.
+        latest = TankState.objects.filter(config=config).order_by('-seq').first()
+        return StateHead(state=latest, seq=latest.seq if latest else 0, stored=False)
+
+    def _append_state(
+        self,
+        config: TankConfig,
+        head: StateHead,
+        *,
+        step_started: Optional[float] = None,
+        **fields,
+    ) -> TankState:
+        """Inserta el siguiente estado y avanza el puntero, o lanza ``StepConflict``.
+
+        Debe llamarse dentro de una transacción para que el estado y el puntero
+        se confirmen juntos. ``step_started`` (``perf_counter`` al inicio del
+        paso) renueva el latido del bucle y registra su latencia frente al SLO.
+        """
+        seq = head.seq + 1
+        heartbeat = {}
+        if step_started is not None:
+            step_ms = (time.perf_counter() - step_started) * 1000
+            heartbeat = {'heartbeat_at': timezone.now(), 'step_ms': step_ms}
+            if step_ms > settings.WATCHDOG_STEP_SLO_MS:
+                heartbeat['slo_breaches'] = F('slo_breaches') + 1 if head.stored else 1
+        try:
+            with transaction.atomic():
+                state = TankState.objects.create(config=config, seq=seq, **fields)
+                if not head.stored:
+                    TankStateHead.objects.create(config=config, state=state, seq=seq, **heartbeat)
+        except IntegrityError as exc:
+            if not self._sequence_taken(config, head, seq):
+                raise
+            raise StepConflict(f'El tanque {config.pk} ya avanzó a la secuencia {seq}.') from exc
+        if head.stored:
+            updated = TankStateHead.objects.filter(config=config, seq=head.seq).update(
+                state=state,
+                seq=seq,
+                **heartbeat,
             )
-            return ControlResult(state=new_state, created=True)
+            if not updated:
+                raise StepConflict(f'El tanque {config.pk} ya avanzó a la secuencia {seq}.')
+        return state
+
+    @staticmethod
+    def _sequence_taken(config: TankConfig, head: StateHead, seq: int) -> bool:
+        """Indica si el ``IntegrityError`` vino de otro escritor que ya ocupó ``seq``.
+
+        Solo la colisión en ``(config, seq)`` o en el puntero recién creado es un
+        conflicto reintentable; cualquier otra violación (nulos, claves foráneas)
+        es un error real y se propaga.
+        """
+        if TankState.objects.filter(config=config, seq=seq).exists():
+            return True
+        return not head.stored and TankStateHead.objects.filter(config=config).exists()
 
     def _log_transitions(
         self,
         previous: TankState,
         current: TankState,
         forced_heater_shutdown: bool,
+        *,
+        power_w: Optional[float] = None,
     ) -> None:
-        if not previous.pk:
+        if previous.pk and previous.safe_mode and not current.safe_mode:
+            EventLog.close_episodes(EventCode.SAFE_MODE, self.config)
+        for event in self.transition_events(
+            previous,
+            current,
+            forced_heater_shutdown,
+            has_previous=bool(previous.pk),
+            power_w=power_w,
+        ):
+            with span('event', code=event.code):
+                EventLog.log(
+                    event.code,
+                    event.message,
+                    severity=event.severity,
+                    config=self.config,
+                    **event.fields,
+                )
+
+    def _log_alarms(self, config: TankConfig, state: TankState, *, power_w: Optional[float]) -> None:
+        with span('alarms'):
+            alarm_set = alarms_for(config)
+            if alarm_set is None:
+                return
+            changes, apply = alarm_set.prepare(state)
+        transaction.on_commit(apply)
+        for change in changes:
+            code = EventCode.ALARM if change.active else EventCode.ALARM_CLEAR
+            with span('event', code=code):
+                EventLog.log(
+                    code,
+                    change.message,
+                    severity=change.rule.severity if change.active else EventSeverity.INFO,
+                    config=config,
+                    state=state,
+                    level_l=state.level_l,
+                    temp_c=state.temp_c,
+                    power_w=power_w,
+                    alarm=change.rule,
+                )
+
+    def transition_events(
+        self,
+        previous: TankState,
+        current: TankState,
+        forced_heater_shutdown: bool,
+        *,
+        has_previous: bool = True,
+        power_w: Optional[float] = None,
+    ) -> list[TransitionEvent]:
+        """Eventos del paso de ``previous`` a ``current``.
+
+        Las lecturas y actuadores van en columnas; los mensajes son plantillas
+        sin formatear que se completan al mostrarse.
+        """
+        events = []
+        fields = {
+            'state': current,
+            'level_l': current.level_l,
+            'temp_c': current.temp_c,
+            'power_w': power_w,
+            'prev_actuators': actuator_bits(previous) if has_previous else None,
+            'new_actuators': actuator_bits(current),
+        }
+
+        def log(code: str, message: str, severity: str = EventSeverity.INFO) -> None:
+            events.append(TransitionEvent(code, message, severity, fields))
+
+        if not has_previous:
             # Se trata de la primera muestra: registrar los estados iniciales.
             if current.valve_open:
-                EventLog.log(
+                log(
                     EventCode.VALVE_OPEN,
-                    f'Válvula iniciada en abierto. Nivel={current.level_l:.2f}L',
+                    'Válvula iniciada en abierto. Nivel={level_l:.2f}L',
                 )
             else:
-                EventLog.log(
+                log(
                     EventCode.VALVE_CLOSE,
-                    f'Válvula iniciada en cerrado. Nivel={current.level_l:.2f}L',
+                    'Válvula iniciada en cerrado. Nivel={level_l:.2f}L',
                 )
             if current.heater_on:
-                EventLog.log(
+                log(
                     EventCode.HEATER_ON,
-                    f'Resistencia iniciada encendida. Temp={current.temp_c:.2f}°C',
+                    'Resistencia iniciada encendida. Temp={temp_c:.2f}°C',
                 )
             else:
-                EventLog.log(
+                log(
                     EventCode.HEATER_OFF,
-                    f'Resistencia iniciada apagada. Temp={current.temp_c:.2f}°C',
+                    'Resistencia iniciada apagada. Temp={temp_c:.2f}°C',
                 )
             if current.drain_valve_open:
-                EventLog.log(
+                log(
                     EventCode.DRAIN_OPEN,
-                    f'Válvula de vaciado iniciada en abierto. Nivel={current.level_l:.2f}L',
+                    'Válvula de vaciado iniciada en abierto. Nivel={level_l:.2f}L',
                 )
             else:
-                EventLog.log(
+                log(
                     EventCode.DRAIN_CLOSE,
-                    f'Válvula de vaciado iniciada en cerrado. Nivel={current.level_l:.2f}L',
+                    'Válvula de vaciado iniciada en cerrado. Nivel={level_l:.2f}L',
                 )
-            return
+            return events
 
         if previous.safe_mode and not current.safe_mode:
-            EventLog.log(
+            log(
                 EventCode.SAFE_MODE,
                 'Modo seguro desactivado: sensores restablecidos.',
                 severity=EventSeverity.INFO,
@@ -238,42 +615,43 @@ class ControlService:
 
         if previous.valve_open != current.valve_open:
             if current.valve_open:
-                EventLog.log(
+                log(
                     EventCode.VALVE_OPEN,
-                    f'Se abre la válvula. Nivel={current.level_l:.2f}L',
+                    'Se abre la válvula. Nivel={level_l:.2f}L',
                 )
             else:
-                EventLog.log(
+                log(
                     EventCode.VALVE_CLOSE,
-                    f'Se cierra la válvula. Nivel={current.level_l:.2f}L',
+                    'Se cierra la válvula. Nivel={level_l:.2f}L',
                 )
         if previous.drain_valve_open != current.drain_valve_open:
             if current.drain_valve_open:
-                EventLog.log(
+                log(
                     EventCode.DRAIN_OPEN,
-                    f'Se abre la válvula de vaciado. Nivel={current.level_l:.2f}L',
+                    'Se abre la válvula de vaciado. Nivel={level_l:.2f}L',
                 )
             else:
-                EventLog.log(
+                log(
                     EventCode.DRAIN_CLOSE,
-                    f'Se cierra la válvula de vaciado. Nivel={current.level_l:.2f}L',
+                    'Se cierra la válvula de vaciado. Nivel={level_l:.2f}L',
                 )
 
         if previous.heater_on != current.heater_on:
             if current.heater_on:
-                EventLog.log(
+                log(
                     EventCode.HEATER_ON,
-                    f'Se enciende la resistencia. Temp={current.temp_c:.2f}°C',
+                    'Se enciende la resistencia. Temp={temp_c:.2f}°C',
                 )
             else:
                 event_code = EventCode.HEATER_OFF
                 if current.safe_mode or forced_heater_shutdown:
                     event_code = EventCode.HEATER_SAFE_OFF
-                EventLog.log(
+                log(
                     event_code,
-                    f'Se apaga la resistencia. Temp={current.temp_c:.2f}°C',
+                    'Se apaga la resistencia. Temp={temp_c:.2f}°C',
                     severity=EventSeverity.WARNING if event_code == EventCode.HEATER_SAFE_OFF else EventSeverity.INFO,
                 )
+        return events
 
     def _elapsed_seconds(self, previous_state: TankState) -> float:
         if not previous_state.pk or previous_state.ts is None:
@@ -0,0 +1,220 @@
+"""Física del simulador y ejecución de escenarios en memoria.
+
+``run_simulation`` usa estas funciones contra la base de datos en tiempo real;
+``sweep_simulation`` ejecuta muchos escenarios en paralelo sin tocar la base,
+reutilizando ``ControlService.decide`` para la lógica de control.
+
+Este módulo no importa modelos al cargarse para que los procesos hijos del
+pool puedan inicializar Django antes de usarlos.
+"""
+
+from __future__ import annotations
+
+import itertools
+import math
+from dataclasses import asdict, dataclass, field, fields, replace
+from typing import Any, Optional
+
+
+@dataclass(frozen=True)
+class SimulationConstants:
+    """Constantes de la física simplificada.
+
+    La resistencia calienta a ``heating_rate_c_per_sec``; su potencia se deriva
+    de esa tasa y de ``heat_capacity_j_per_c`` (capacidad calorífica
+    equivalente), así que barrer cualquiera de las dos mueve juntas la
+    temperatura y la energía. Los valores por defecto dan los 50 W de
+    ``ControlService.HEATER_POWER_W``.
+    """
+
+    fill_rate_lps: float = 5.0
+    base_consumption_lps: float = 1.5
+    drain_extra_lps: float = 3.5
+    heating_rate_c_per_sec: float = 0.8
+    cooling_rate_c_per_sec: float = 0.4
+    heat_capacity_j_per_c: float = 62.5
+
+    @property
+    def heater_power_w(self) -> float:
+        return self.heating_rate_c_per_sec * self.heat_capacity_j_per_c
+
+
+DEFAULT_CONSTANTS = SimulationConstants()
+CONSTANT_NAMES = tuple(f.name for f in fields(SimulationConstants))
+
+
+def next_level(
+    level: float,
+    fill_valve_open: bool,
+    drain_valve_open: bool,
+    interval_s: float,
+    capacity_l: float,
+    constants: SimulationConstants = DEFAULT_CONSTANTS,
+) -> float:
+    if fill_valve_open:
+        level += constants.fill_rate_lps * interval_s
+    outflow = constants.base_consumption_lps * interval_s
+    if drain_valve_open:
+        outflow += constants.drain_extra_lps * interval_s
+    level -= outflow
+    return max(0.0, min(capacity_l, level))
+
+
+def next_temperature(
+    temp: float,
+    heater_on: bool,
+    interval_s: float,
+    temp_min_c: float,
+    temp_max_c: float,
+    constants: SimulationConstants = DEFAULT_CONSTANTS,
+) -> float:
+    if heater_on:
+        temp += constants.heating_rate_c_per_sec * interval_s
+    else:
+        temp -= constants.cooling_rate_c_per_sec * interval_s
+    return max(temp_min_c - 5, min(temp_max_c + 10, temp))
+
+
+@dataclass
+class Scenario:
+    """Combinación de parámetros de ``TankConfig`` y constantes de simulación."""
+
+    config: dict[str, Any] = field(default_factory=dict)
+    constants: SimulationConstants = DEFAULT_CONSTANTS
+    duration_s: float = 3600.0
+    hz: float = 1.0
+    initial_level_l: Optional[float] = None
+    initial_temp_c: Optional[float] = None
+
+    @property
+    def label(self) -> str:
+        params = {**self.config, **{
+            name: getattr(self.constants, name)
+            for name in CONSTANT_NAMES
+            if getattr(self.constants, name) != getattr(DEFAULT_CONSTANTS, name)
+        }}
+        return ' '.join(f'{key}={value}' for key, value in params.items()) or 'base'
+
+
+@dataclass
+class ScenarioResult:
+    label: str
+    steps: int = 0
+    time_in_band_pct: float = 0.0
+    heater_cycles: int = 0
+    energy_wh: float = 0.0
+    safe_mode_s: float = 0.0
+    final_level_l: float = 0.0
+    final_temp_c: float = 0.0
+    error: str = ''
+
+    def as_row(self) -> dict[str, Any]:
+        return asdict(self)
+
+
+def build_grid(
+    grid: dict[str, list[Any]],
+    *,
+    duration_s: float = 3600.0,
+    hz: float = 1.0,
+) -> list[Scenario]:
+    """Expande ``{'param': [v1, v2], ...}`` en el producto cartesiano de escenarios."""
+    names = list(grid)
+    scenarios = []
+    for values in itertools.product(*(grid[name] for name in names)):
+        config = {}
+        constants = {}
+        for name, value in zip(names, values):
+            (constants if name in CONSTANT_NAMES else config)[name] = value
+        scenarios.append(
+            Scenario(
+                config=config,
+                constants=replace(DEFAULT_CONSTANTS, **constants),
+                duration_s=duration_s,
+                hz=hz,
+            )
+        )
+    return scenarios
+
+
+def setup_worker() -> None:
+    """Inicializador del pool: configura Django en procesos creados con ``spawn``."""
+    import django
+    from django.apps import apps
+
+    if not apps.ready:
+        django.setup()
+
+
+def run_scenario(scenario: Scenario) -> ScenarioResult:
+    from django.conf import settings
+    from django.core.exceptions import ValidationError
+
+    from .models import TankConfig, TankState
+    from .services import ControlService
+
+    result = ScenarioResult(label=scenario.label)
+    config = TankConfig(**scenario.config)
+    try:
+        config.clean()
+    except ValidationError as exc:
+        result.error = '; '.join(
+            f'{key}: {" ".join(messages)}' for key, messages in exc.message_dict.items()
+        )
+        return result
+
+    service = ControlService(config=config)
+    interval_s = 1.0 / scenario.hz
+    total_steps = int(math.ceil(scenario.duration_s * scenario.hz))
+    state = TankState(
+        config=config,
+        level_l=(
+            scenario.initial_level_l
+            if scenario.initial_level_l is not None
+            else settings.DEFAULT_TANK_INITIAL_LEVEL
+        ),
+        temp_c=(
+            scenario.initial_temp_c
+            if scenario.initial_temp_c is not None
+            else settings.DEFAULT_TANK_INITIAL_TEMPERATURE
+        ),
+    )
+    in_band_steps = 0
+    heater_on_s = 0.0
+    for index in range(total_steps):
+        level = next_level(
+            state.level_l,
+            state.valve_open,
+            state.drain_valve_open,
+            interval_s,
+            config.capacity_l,
+            scenario.constants,
+        )
+        temp = next_temperature(
+            state.temp_c,
+            state.heater_on,
+            interval_s,
+            config.temp_min_c,
+            config.temp_max_c,
+            scenario.constants,
+        )
+        decision = service.decide(state, level, temp, interval_s, has_previous=index > 0)
+        if decision.heater_on and not (index > 0 and state.heater_on):
+            result.heater_cycles += 1
+        if decision.heater_on:
+            heater_on_s += interval_s
+        if decision.safe_mode:
+            result.safe_mode_s += interval_s
+        if (
+            abs(decision.temp_c - config.temp_set_c) <= config.hysteresis_c
+            and config.min_level_l <= decision.level_l <= config.max_level_l
+        ):
+            in_band_steps += 1
+        state = TankState(config=config, **decision.state_fields())
+
+    result.steps = total_steps
+    result.time_in_band_pct = 100.0 * in_band_steps / total_steps if total_steps else 0.0
+    result.energy_wh = scenario.constants.heater_power_w * heater_on_s / 3600.0
+    result.final_level_l = state.level_l
+    result.final_temp_c = state.temp_c
+    return result
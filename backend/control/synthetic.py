@@ -0,0 +1,422 @@
+"""Historial sintético para pruebas de escala.
+
+``HistoryGenerator`` escribe ``TankState`` y ``EventLog`` de varios tanques a
+frecuencia fija sobre un rango de fechas, sin pasar por el bucle en vivo:
+
+- el nivel sigue ``simulation.next_level`` con las constantes del simulador y
+  la temperatura ``ControlService._simulate_temperature``;
+- los actuadores siguen ``auto_actuators``, copia de las reglas del modo automático de
+  ``ControlService.decide`` (umbrales de nivel, histéresis de temperatura y
+  modo seguro ante lecturas inválidas);
+- los eventos usan las plantillas de ``transition_events`` y los episodios de
+  ``SAFE_MODE`` se agrupan como en ``EventLog.log``;
+- las lecturas llevan ruido gaussiano y, opcionalmente, fallas del sensor de
+  nivel que disparan episodios de modo seguro.
+
+Con la misma semilla la salida es idéntica. Cada tanque se simula con un bucle
+local (el control realimenta al siguiente paso, así que no se puede calcular
+por columnas) y las filas se insertan con ``executemany`` en una transacción
+por lote. Los ids se asignan de antemano para que cada evento apunte a su
+estado sin consultas, por eso debe usarse en una base de pruebas o con el bucle
+detenido.
+"""
+
+from __future__ import annotations
+
+import math
+import random
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from itertools import chain
+from typing import Optional, Sequence
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Max
+
+from .models import EventCode, EventLog, EventSeverity, TankConfig, TankState, TankStateHead
+from .search import bulk_load
+from .services import ControlService
+from .simulation import DEFAULT_CONSTANTS, SimulationConstants, next_level
+
+LEVEL_NOISE_L = 0.1
+TEMP_NOISE_C = 0.02
+DEFAULT_BATCH_SIZE = 100_000
+
+STATE_COLUMNS = (
+    'id',
+    'config_id',
+    'seq',
+    'level_l',
+    'temp_c',
+    'valve_open',
+    'drain_valve_open',
+    'heater_on',
+    'safe_mode',
+    'ts',
+)
+EVENT_COLUMNS = (
+    'id',
+    'code',
+    'message',
+    'severity',
+    'ts',
+    'occurrences',
+    'last_ts',
+    'episode_open',
+    'state_id',
+    'level_l',
+    'temp_c',
+    'power_w',
+    'prev_actuators',
+    'new_actuators',
+    'config_id',
+)
+EPISODE_COLUMNS = EVENT_COLUMNS[5:]
+
+
+def _insert_sql(model, columns: Sequence[str]) -> str:
+    quote = connection.ops.quote_name
+    return 'INSERT INTO {} ({}) VALUES ({})'.format(
+        quote(model._meta.db_table),
+        ', '.join(quote(column) for column in columns),
+        ', '.join(['%s'] * len(columns)),
+    )
+
+
+def _update_sql(model, columns: Sequence[str]) -> str:
+    quote = connection.ops.quote_name
+    return 'UPDATE {} SET {} WHERE {} = %s'.format(
+        quote(model._meta.db_table),
+        ', '.join(f'{quote(column)} = %s' for column in columns),
+        quote('id'),
+    )
+
+
+def auto_actuators(
+    level_l: float,
+    temp_c: float,
+    heater_on: bool,
+    has_previous: bool,
+    capacity_l: float,
+    min_level_l: float,
+    max_level_l: float,
+    set_c: float,
+    low_c: float,
+) -> tuple[bool, bool, bool, bool, bool]:
+    """Reglas del modo automático de ``ControlService.decide`` sin ``TankState``.
+
+    Devuelve ``(válvula, desagüe, resistencia, modo seguro, apagado forzado)``;
+    ``heater_on`` es la resistencia del paso anterior y ``low_c`` el umbral de
+    encendido (``set_c`` menos la histéresis).
+    """
+    if not 0 <= level_l <= capacity_l or not math.isfinite(temp_c):
+        return False, False, False, True, has_previous and heater_on
+    valve = level_l < min_level_l
+    drain = not valve and level_l >= max_level_l
+    heater = heater_on if has_previous else False
+    if not valve and temp_c < low_c:
+        heater = True
+    if temp_c >= set_c:
+        heater = False
+    if valve:
+        return valve, drain, False, False, heater
+    return valve, drain, heater, False, False
+
+
+def create_tanks(count: int) -> list[TankConfig]:
+    """Crea ``count`` configuraciones inactivas (no reemplazan a la activa)."""
+    return [TankConfig.objects.create(active=False) for _ in range(count)]
+
+
+@dataclass
+class GenerateStats:
+    tanks: int = 0
+    states: int = 0
+    events: int = 0
+    safe_mode_episodes: int = 0
+    batches: int = 0
+    started_at: float = field(default_factory=time.perf_counter)
+    elapsed_s: float = 0.0
+
+    @property
+    def rows_per_s(self) -> float:
+        return (self.states + self.events) / self.elapsed_s if self.elapsed_s > 0 else 0.0
+
+
+class _Episode:
+    """Episodio de ``SAFE_MODE`` abierto; ``row`` sigue los ``EVENT_COLUMNS``."""
+
+    __slots__ = ('row', 'last_step', 'stored', 'dirty')
+
+    def __init__(self, row: list, step: int):
+        self.row = row
+        self.last_step = step
+        self.stored = False
+        self.dirty = False
+
+
+class _Tank:
+    """Estado de la simulación de un tanque entre lotes."""
+
+    def __init__(self, generator: 'HistoryGenerator', config: TankConfig, index: int):
+        self.generator = generator
+        self.config = config
+        self.index = index
+        self.service = ControlService(config=config)
+        self.rng = random.Random(f'{generator.seed}:{index}')
+        self.level = min(
+            max(settings.DEFAULT_TANK_INITIAL_LEVEL + self.rng.uniform(-10, 10), 0.0),
+            float(config.capacity_l),
+        )
+        self.temp = settings.DEFAULT_TANK_INITIAL_TEMPERATURE + self.rng.uniform(-2, 2)
+        self.flags: Optional[tuple[bool, bool, bool, bool]] = None
+        self.next_fault = self._schedule_fault(0)
+        self.fault_until = -1
+        self.fault_reading = 0.0
+        self.episode: Optional[_Episode] = None
+
+    def _schedule_fault(self, step: int) -> float:
+        rate = self.generator.fault_rate_per_step
+        return step + self.rng.expovariate(rate) if rate > 0 else math.inf
+
+    def advance(self, first: int, last: int, ts_values: Sequence, events: list) -> list[tuple]:
+        """Filas de estado de los pasos ``[first, last)``; agrega a ``events`` los eventos."""
+        generator = self.generator
+        config = self.config
+        capacity = config.capacity_l
+        min_level = config.min_level_l
+        max_level = config.max_level_l
+        set_c = config.temp_set_c
+        low_c = set_c - config.hysteresis_c
+        interval_s = generator.interval_s
+        constants = generator.constants
+        heater_power = generator.heater_power_w
+        level_sigma = LEVEL_NOISE_L * generator.noise
+        temp_sigma = TEMP_NOISE_C * generator.noise
+        simulate = self.service._simulate_temperature
+        gauss = self.rng.gauss
+        config_id = config.pk
+        stride = generator.tank_count
+        state_id = generator.state_base + first * stride + self.index
+
+        level, temp = self.level, self.temp
+        has_previous = self.flags is not None
+        valve, drain, heater, safe = self.flags or (False, False, False, False)
+        rows = []
+        append = rows.append
+        for step in range(first, last):
+            power_w = heater_power if has_previous and heater else 0.0
+            if has_previous:
+                level = next_level(level, valve, drain, interval_s, capacity, constants)
+                temp = simulate(temp, level, power_w, interval_s)
+            reading_level = level + gauss(0.0, level_sigma) if level_sigma else level
+            reading_temp = temp + gauss(0.0, temp_sigma) if temp_sigma else temp
+            if step >= self.next_fault:
+                self.fault_until = step + generator.fault_steps
+                self.fault_reading = self.rng.choice((-1.0, capacity + 10.0))
+                self.next_fault = self._schedule_fault(self.fault_until)
+            if step < self.fault_until:
+                reading_level = self.fault_reading
+
+            new_valve, new_drain, new_heater, new_safe, forced = auto_actuators(
+                reading_level, reading_temp, heater, has_previous, capacity, min_level, max_level, set_c, low_c
+            )
+
+            ts = ts_values[step - first]
+            append((
+                state_id,
+                config_id,
+                step + 1,
+                reading_level,
+                reading_temp,
+                new_valve,
+                new_drain,
+                new_heater,
+                new_safe,
+                ts,
+            ))
+            changed = not has_previous or (new_valve, new_drain, new_heater, new_safe) != (valve, drain, heater, safe)
+            if new_safe or changed:
+                # Bits de ACTUATOR_BITS.
+                new_bits = new_valve | new_drain << 1 | new_heater << 2 | new_safe << 3
+                prev_bits = valve | drain << 1 | heater << 2 | safe << 3 if has_previous else None
+                values = [state_id, reading_level, reading_temp, power_w, prev_bits, new_bits, config_id]
+                order = step * stride + self.index
+                if new_safe:
+                    self._log_safe_mode(step, ts, values, order, events)
+                if changed:
+                    if safe and not new_safe and self.episode is not None:
+                        self._close_episode()
+                    for position, (code, message, severity) in enumerate(
+                        generator.transitions(prev_bits, new_bits, forced), start=1
+                    ):
+                        events.append(((order, position), [None, code, message, severity, ts, 1, None, False, *values], None))
+            valve, drain, heater, safe = new_valve, new_drain, new_heater, new_safe
+            has_previous = True
+            state_id += stride
+
+        self.level, self.temp = level, temp
+        self.flags = (valve, drain, heater, safe)
+        return rows
+
+    def _log_safe_mode(self, step: int, ts, values: list, order: int, events: list) -> None:
+        generator = self.generator
+        window_s = generator.coalesce_window_s
+        if window_s <= 0:
+            row = [None, EventCode.SAFE_MODE, ControlService.SAFE_MODE_MESSAGE, EventSeverity.WARNING, ts, 1, None, False, *values]
+            events.append(((order, 0), row, None))
+            return
+        episode = self.episode
+        if episode is not None and (step - episode.last_step) * generator.interval_s <= window_s:
+            row = episode.row
+            row[5] += 1
+            row[6] = ts
+            row[8:] = values
+            episode.last_step = step
+            generator.touch(episode)
+            return
+        if episode is not None:
+            self._close_episode()
+        row = [None, EventCode.SAFE_MODE, ControlService.SAFE_MODE_MESSAGE, EventSeverity.WARNING, ts, 1, ts, True, *values]
+        self.episode = _Episode(row, step)
+        generator.stats.safe_mode_episodes += 1
+        events.append(((order, 0), row, self.episode))
+
+    def _close_episode(self) -> None:
+        self.episode.row[7] = False
+        self.generator.touch(self.episode)
+        self.episode = None
+
+
+class HistoryGenerator:
+    """Genera historial para ``configs`` entre ``start`` y ``end``.
+
+    ``faults_per_day`` es la tasa media de fallas del sensor de nivel por tanque
+    y ``fault_duration_s`` su duración. ``noise`` escala el ruido de las
+    lecturas (0 lo desactiva) y ``heater_power_w`` reemplaza la potencia de la
+    resistencia de ``ControlService``.
+    """
+
+    def __init__(
+        self,
+        configs: Sequence[TankConfig],
+        *,
+        hz: float = 1.0,
+        seed: int = 0,
+        faults_per_day: float = 0.0,
+        fault_duration_s: float = 30.0,
+        noise: float = 1.0,
+        heater_power_w: Optional[float] = None,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        constants: SimulationConstants = DEFAULT_CONSTANTS,
+    ):
+        self.hz = hz
+        self.interval_s = 1.0 / hz
+        self.seed = seed
+        self.fault_rate_per_step = faults_per_day / (86_400 * hz)
+        self.fault_steps = max(1, round(fault_duration_s * hz))
+        self.noise = noise
+        self.heater_power_w = ControlService.HEATER_POWER_W if heater_power_w is None else heater_power_w
+        self.batch_size = batch_size
+        self.constants = constants
+        self.coalesce_window_s = getattr(settings, 'EVENT_COALESCE_WINDOW_S', 0)
+        self.tank_count = len(configs)
+        self.state_base = 0
+        self.stats = GenerateStats(tanks=len(configs))
+        self._tanks = [_Tank(self, config, index) for index, config in enumerate(configs)]
+        self._transitions: dict[tuple, list[tuple[str, str, str]]] = {}
+        self._dirty: list[_Episode] = []
+
+    def transitions(self, prev_bits: Optional[int], new_bits: int, forced: bool) -> list[tuple[str, str, str]]:
+        """``(código, plantilla, severidad)`` de ``transition_events`` para el cambio, memorizado."""
+        key = (prev_bits, new_bits, forced)
+        cached = self._transitions.get(key)
+        if cached is None:
+            service = self._tanks[0].service
+            previous = self._flag_state(prev_bits or 0)
+            current = self._flag_state(new_bits)
+            cached = self._transitions[key] = [
+                (event.code, event.message, event.severity)
+                for event in service.transition_events(previous, current, forced, has_previous=prev_bits is not None)
+            ]
+        return cached
+
+    @staticmethod
+    def _flag_state(bits: int) -> TankState:
+        return TankState(
+            level_l=0.0,
+            temp_c=0.0,
+            valve_open=bool(bits & 1),
+            drain_valve_open=bool(bits & 2),
+            heater_on=bool(bits & 4),
+            safe_mode=bool(bits & 8),
+        )
+
+    def touch(self, episode: _Episode) -> None:
+        """Marca un episodio ya insertado para actualizarlo en el siguiente lote."""
+        if episode.stored and not episode.dirty:
+            episode.dirty = True
+            self._dirty.append(episode)
+
+    def run(self, start: datetime, end: datetime) -> GenerateStats:
+        stats = self.stats
+        total_steps = int((end - start).total_seconds() * self.hz)
+        if not self._tanks or total_steps <= 0:
+            stats.elapsed_s = time.perf_counter() - stats.started_at
+            return stats
+        existing = TankStateHead.objects.filter(config__in=[tank.config for tank in self._tanks]).first()
+        if existing is not None:
+            raise ValueError(f'El tanque {existing.config_id} ya tiene historial; use tanques nuevos.')
+        with transaction.atomic():
+            self.state_base = (TankState.objects.aggregate(last=Max('id'))['last'] or 0) + 1
+            next_event_id = (EventLog.objects.aggregate(last=Max('id'))['last'] or 0) + 1
+        with bulk_load(connection):
+            self._generate(start, total_steps, next_event_id)
+        stats.elapsed_s = time.perf_counter() - stats.started_at
+        return stats
+
+    def _generate(self, start: datetime, total_steps: int, next_event_id: int) -> None:
+        stats = self.stats
+        insert_state = _insert_sql(TankState, STATE_COLUMNS)
+        insert_event = _insert_sql(EventLog, EVENT_COLUMNS)
+        update_episode = _update_sql(EventLog, EPISODE_COLUMNS)
+        adapt = connection.ops.adapt_datetimefield_value
+        step_us = 1_000_000 / self.hz
+        block = max(1, self.batch_size // len(self._tanks))
+        for first in range(0, total_steps, block):
+            last = min(total_steps, first + block)
+            ts_values = [adapt(start + timedelta(microseconds=round(step * step_us))) for step in range(first, last)]
+            events: list = []
+            per_tank = [tank.advance(first, last, ts_values, events) for tank in self._tanks]
+            # Orden de inserción como en vivo: por paso y, dentro del paso, por tanque.
+            states = list(chain.from_iterable(zip(*per_tank)))
+            events.sort(key=lambda event: event[0])
+            for _, row, episode in events:
+                row[0] = next_event_id
+                next_event_id += 1
+                if episode is not None:
+                    episode.stored = True
+            dirty, self._dirty = self._dirty, []
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.executemany(insert_state, states)
+                if events:
+                    cursor.executemany(insert_event, [row for _, row, _ in events])
+                if dirty:
+                    cursor.executemany(update_episode, [[*episode.row[5:], episode.row[0]] for episode in dirty])
+            for episode in dirty:
+                episode.dirty = False
+            stats.states += len(states)
+            stats.events += len(events)
+            stats.batches += 1
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            if self._dirty:
+                cursor.executemany(update_episode, [[*episode.row[5:], episode.row[0]] for episode in self._dirty])
+                self._dirty = []
+            last_base = self.state_base + (total_steps - 1) * len(self._tanks)
+            TankStateHead.objects.bulk_create([
+                TankStateHead(config=tank.config, state_id=last_base + tank.index, seq=total_steps)
+                for tank in self._tanks
+            ])
@@ -1,12 +1,79 @@
+import asyncio
+import csv
+import gzip
+import importlib
+import json
+import math
+import os
+import signal
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from dataclasses import replace
 from datetime import timedelta
+from io import StringIO
+from pathlib import Path
+from types import SimpleNamespace
+from unittest.mock import patch
 
+from django.apps import apps as django_apps
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import IntegrityError, OperationalError, connection, transaction
+from django.test import LiveServerTestCase, SimpleTestCase, override_settings
 from django.urls import reverse
 from django.utils import timezone
 from rest_framework import status
 from rest_framework.test import APITestCase
 
-from .models import TankConfig, TankState
-from .serializers import TankConfigSerializer
+from core import settings_worker
+
+from .alarms import AlarmSet, alarms_for
+from .archive import ArchiveIndex, Archiver, read_day_file
+from .coalescing import SingleFlight
+from .dashboard import build_snapshot
+from .conditioning import MedianFilter, RateClamp, RingBuffer
+from .fastjson import FieldPlan
+from .journal import Journal, StoreAndForward
+from .ingest import (
+    AGGREGATE_LAST,
+    AGGREGATE_MEAN,
+    IngestService,
+    MalformedReading,
+    Reading,
+    loopback_generator,
+    parse_line,
+)
+from .leases import LeaseManager
+from .loadtest import EndpointStats
+from .models import (
+    AlarmMetric,
+    AlarmOperator,
+    AlarmRule,
+    EventCode,
+    EventLog,
+    EventSeverity,
+    SignalFilter,
+    TankConfig,
+    TankLease,
+    TankState,
+    TankStateChunk,
+    TankStateHead,
+    actuator_bits,
+)
+from .pagination import EstimatedCountPaginator
+from .profiling import StackSampler, short_path
+from .search import BACKEND_FTS5, BACKEND_LIKE, backend_for, search_events
+from .serializers import EventLogSerializer, TankConfigSerializer, TankStateSerializer
+from .services import ControlService, StepConflict
+from .simulation import DEFAULT_CONSTANTS, Scenario, build_grid, run_scenario
+from .synthetic import HistoryGenerator, auto_actuators, create_tanks
+from .timeseries import Sample, compact_states, decode_chunk, encode_chunk, storage_report
+from .tracing import close_files, read_trace
+from .watchdog import Watchdog
 
 
 class ControlLogicTestCase(APITestCase):
@@ -212,3 +279,1497 @@ class TankConfigSerializerTestCase(APITestCase):
         )
         self.assertFalse(serializer.is_valid())
         self.assertIn('temp_set_c', serializer.errors)
+
+
+class HistoryAdminTestCase(APITestCase):
+    def setUp(self):
+        user = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'secreto')
+        self.client.force_login(user)
+        self.config = TankConfig.get_active()
+        for level in range(5):
+            TankState.objects.create(config=self.config, seq=level + 1, level_l=level, temp_c=30.0)
+
+    def test_estimated_count_uses_pk_range(self):
+        paginator = EstimatedCountPaginator(TankState.objects.all(), 2)
+        self.assertEqual(5, paginator.count)
+
+    def test_filtered_count_is_capped(self):
+        queryset = TankState.objects.filter(level_l__gte=1)
+        with patch.object(EstimatedCountPaginator, 'COUNT_CAP', 2):
+            paginator = EstimatedCountPaginator(queryset, 2)
+            self.assertEqual(2, paginator.count)
+
+    def test_changelist_keyset_cursor(self):
+        last = TankState.objects.order_by('-id').first()
+        url = reverse('admin:control_tankstate_changelist')
+        response = self.client.get(url, {'before': last.pk})
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        ids = [state.pk for state in response.context['cl'].result_list]
+        self.assertNotIn(last.pk, ids)
+        self.assertEqual(4, len(ids))
+
+    def test_event_changelist_renders(self):
+        response = self.client.get(reverse('admin:control_eventlog_changelist'))
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+
+
+class FastReadPathTestCase(APITestCase):
+    def setUp(self):
+        self.config = TankConfig.get_active()
+
+    def test_state_matches_model_serializer(self):
+        response = self.client.get(reverse('control:state'), {'level': 50, 'temp': 30})
+        state = TankState.objects.get(pk=response.data['id'])
+        self.assertEqual(TankStateSerializer(state).data, response.json())
+
+    def test_events_match_model_serializer(self):
+        self.client.get(reverse('control:state'), {'level': 50, 'temp': 30})
+        response = self.client.get(reverse('control:events'))
+        expected = EventLogSerializer(EventLog.objects.order_by('-ts')[:50], many=True).data
+        self.assertEqual(json.loads(json.dumps(expected)), response.json())
+
+    def test_fields_projection(self):
+        response = self.client.get(reverse('control:state'), {'fields': 'ts,level_l,unknown'})
+        self.assertEqual(['level_l', 'ts'], list(response.json()))
+
+    def test_projection_cache_is_keyed_by_valid_fields(self):
+        plan = FieldPlan.from_serializer(TankStateSerializer)
+        projected = plan.project('ts,level_l')
+        self.assertIs(projected, plan.project('level_l, ts,basura'))
+        for index in range(50):
+            plan.project(f'ts,level_l,desconocido{index}')
+        self.assertIs(plan, plan.project('solo,basura'))
+        self.assertEqual(1, len(plan._projections))
+
+    @override_settings(FAST_JSON_COMPRESS_MIN_BYTES=10)
+    def test_large_responses_are_gzipped(self):
+        self.client.get(reverse('control:state'), {'level': 50, 'temp': 30})
+        response = self.client.get(reverse('control:events'), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual('gzip', response['Content-Encoding'])
+        payload = json.loads(gzip.decompress(response.content))
+        self.assertTrue(payload)
+
+
+class WorkerStartupTestCase(SimpleTestCase):
+    def _first_step_profile(self, settings_module: str) -> dict:
+        backend_dir = Path(__file__).resolve().parent.parent
+        with tempfile.TemporaryDirectory() as tmp:
+            env = dict(
+                os.environ,
+                DB_ENGINE='django.db.backends.sqlite3',
+                DB_NAME=str(Path(tmp) / 'worker.sqlite3'),
+                DJANGO_SETTINGS_MODULE=settings_module,
+                JOURNAL_DIR=str(Path(tmp) / 'journal'),
+                PYTHONDONTWRITEBYTECODE='1',
+            )
+            report = Path(tmp) / 'startup.json'
+            subprocess.run(
+                [sys.executable, 'manage.py', 'migrate', '-v', '0'],
+                cwd=backend_dir, env=env, check=True,
+            )
+            subprocess.run(
+                [sys.executable, '-m', 'control.worker', '--iterations', '1', '--hz', '100',
+                 '--startup-report', str(report)],
+                cwd=backend_dir, env=env, check=True, capture_output=True,
+            )
+            return json.loads(report.read_text())
+
+    def test_worker_profile_skips_web_stack(self):
+        lean = self._first_step_profile('core.settings_worker')
+        self.assertIsNotNone(lean['first_step_ms'])
+        self.assertEqual([], lean['heavy_modules'])
+        # El mismo proceso con el perfil completo sí los carga: la comprobación distingue ambos.
+        full = self._first_step_profile('core.settings')
+        self.assertIn('rest_framework', full['heavy_modules'])
+        self.assertIn('django.contrib.admin', full['heavy_modules'])
+        self.assertIsNone(settings_worker.LOGGING_CONFIG)
+
+
+class TankLeaseTestCase(APITestCase):
+    def setUp(self):
+        self.config = TankConfig.get_active()
+        self.now = timezone.now()
+
+    def _manager(self, owner: str) -> LeaseManager:
+        return LeaseManager(self.config, owner=owner, ttl_s=6, clock=lambda: self.now)
+
+    def test_single_owner_until_expiry(self):
+        first, second = self._manager('a'), self._manager('b')
+        self.assertTrue(first.ensure())
+        self.assertFalse(second.ensure())
+        self.now += timedelta(seconds=3)
+        self.assertTrue(first.ensure())
+        self.assertEqual(self.now + timedelta(seconds=6), TankLease.objects.get().expires_at)
+        self.assertFalse(second.ensure())
+
+        # El dueño deja de renovar: otro nodo toma el tanque con una época nueva.
+        self.now += timedelta(seconds=7)
+        self.assertTrue(second.ensure())
+        self.assertEqual(2, second.epoch)
+        self.now += timedelta(seconds=3)
+        self.assertFalse(first.ensure())
+        owners = [event.message for event in EventLog.objects.filter(code=EventCode.LEASE_ACQUIRED).order_by('id')]
+        self.assertEqual(2, len(owners))
+        self.assertIn('nodo b', owners[-1])
+
+    def test_non_owner_waits_for_observed_expiry(self):
+        first, second = self._manager('a'), self._manager('b')
+        first.ensure()
+        self.assertFalse(second.ensure())
+        self.assertEqual('a', second.holder)
+        with self.assertNumQueries(0):
+            self.assertFalse(second.ensure())
+
+        # Al llegar el vencimiento observado reintenta una vez y ve la renovación.
+        self.now += timedelta(seconds=3)
+        first.ensure()
+        self.now += timedelta(seconds=3)
+        self.assertFalse(second.ensure())
+        with self.assertNumQueries(0):
+            self.assertFalse(second.ensure())
+        self.now += timedelta(seconds=3)
+        self.assertTrue(second.ensure())
+        self.assertEqual('b', second.holder)
+
+    def test_release_hands_over_immediately(self):
+        first, second = self._manager('a'), self._manager('b')
+        first.ensure()
+        first.release()
+        self.assertTrue(second.ensure())
+        self.assertFalse(first.held)
+        self.assertEqual('b', second.status().owner)
+
+    @override_settings(LEASES_ENABLED=True, NODE_ID='lector')
+    def test_non_owner_serves_reads_only(self):
+        service = ControlService(self.config)
+        state = service.step(level_l=50, temp_c=30).state
+        self.assertTrue(self._manager('lider').ensure())
+        with patch.dict('control.leases._MANAGERS', clear=True):
+            response = self.client.get(reverse('control:state'))
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(state.pk, response.data['id'])
+            response = self.client.get(reverse('control:state'), {'level': 40, 'temp': 30})
+            self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+            self.assertEqual('lider', response.data['owner'])
+        self.assertEqual(1, TankState.objects.count())
+
+
+class LeaseFailoverTestCase(SimpleTestCase):
+    def test_standby_process_takes_over_when_owner_dies(self):
+        backend_dir = Path(__file__).resolve().parent.parent
+        with tempfile.TemporaryDirectory() as tmp:
+            database = Path(tmp) / 'leases.sqlite3'
+            env = dict(
+                os.environ,
+                DB_ENGINE='django.db.backends.sqlite3',
+                DB_NAME=str(database),
+                LEASES_ENABLED='1',
+                LEASE_TTL_S='1',
+            )
+            subprocess.run(
+                [sys.executable, 'manage.py', 'migrate', '-v', '0'],
+                cwd=backend_dir, env=env, check=True,
+            )
+            command = [sys.executable, 'manage.py', 'run_simulation', '--hz', '20', '--iterations']
+            owner = subprocess.Popen(
+                [*command, '0'], cwd=backend_dir, env=dict(env, NODE_ID='nodo-a'),
+                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+            )
+            try:
+                deadline = time.monotonic() + 30
+                while not self._lease_owners(database) and time.monotonic() < deadline:
+                    time.sleep(0.1)
+                standby = subprocess.Popen(
+                    [*command, '3'], cwd=backend_dir, env=dict(env, NODE_ID='nodo-b'),
+                    stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True,
+                )
+                output = []
+                for line in standby.stdout:
+                    output.append(line)
+                    if 'en espera' in line:
+                        break
+                # El líder muere sin liberar el arrendamiento.
+                os.kill(owner.pid, signal.SIGKILL)
+                output.append(standby.communicate(timeout=60)[0])
+            finally:
+                owner.kill()
+                owner.wait()
+            self.assertEqual(0, standby.returncode)
+            self.assertEqual(['nodo-a', 'nodo-b'], self._lease_owners(database))
+            self.assertIn('toma el control', ''.join(output))
+
+    def _lease_owners(self, database: Path) -> list[str]:
+        if not database.exists():
+            return []
+        with sqlite3.connect(database) as db:
+            try:
+                rows = db.execute(
+                    "SELECT message FROM control_eventlog WHERE code = 'LEASE_ACQUIRED' ORDER BY id"
+                ).fetchall()
+            except sqlite3.OperationalError:
+                return []
+        return [message.split()[2] for message, in rows]
+
+
+class TracingTestCase(APITestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.addCleanup(close_files)
+        self.trace_dir = Path(tmp.name)
+        self.trace_file = self.trace_dir / 'trace.json'
+
+    def _settings(self, **overrides):
+        values = {
+            'TRACE_ENABLED': True,
+            'TRACE_DIR': self.trace_dir,
+            'TRACE_SAMPLE_RATE': 1.0,
+            'TRACE_SLOW_MS': 0,
+        }
+        values.update(overrides)
+        return override_settings(**values)
+
+    def test_request_spans_cover_step_phases(self):
+        with self._settings():
+            response = self.client.get(reverse('control:state'), {'level': 50, 'temp': 30})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        events = {event['name']: event for event in read_trace(self.trace_file)}
+        for name in (
+            'ControlService.step', 'load_config', 'load_head', 'decide', 'insert_state',
+            'event', 'commit', 'parse_request', 'serialize', 'render',
+        ):
+            self.assertIn(name, events)
+        request = events['GET /api/state/']
+        step = events['ControlService.step']
+        self.assertEqual('X', step['ph'])
+        self.assertLessEqual(request['ts'], step['ts'])
+        self.assertLessEqual(step['ts'] + step['dur'], request['ts'] + request['dur'] + 1)
+
+    def test_tail_sampling_keeps_slow_traces_only(self):
+        service = ControlService()
+        with self._settings(TRACE_SAMPLE_RATE=0.0, TRACE_SLOW_MS=60_000):
+            service.step(level_l=50, temp_c=30)
+        self.assertEqual([], read_trace(self.trace_file) if self.trace_file.exists() else [])
+        with self._settings(TRACE_SAMPLE_RATE=0.0, TRACE_SLOW_MS=0.001):
+            service.step(level_l=50, temp_c=30)
+        self.assertEqual(1, sum(event['name'] == 'ControlService.step' for event in read_trace(self.trace_file)))
+
+    def test_trace_file_rotates(self):
+        service = ControlService()
+        with self._settings(TRACE_MAX_BYTES=4000, TRACE_BACKUPS=2):
+            for _ in range(20):
+                service.step(level_l=50, temp_c=30)
+        self.assertTrue((self.trace_dir / 'trace.json.1').exists())
+        self.assertFalse((self.trace_dir / 'trace.json.3').exists())
+        for path in self.trace_dir.iterdir():
+            self.assertTrue(read_trace(path))
+
+
+class StepCoalescingTestCase(APITestCase):
+    def test_concurrent_calls_share_one_run(self):
+        flight = SingleFlight()
+        release = threading.Event()
+        calls = []
+        results = []
+
+        def slow_step():
+            calls.append(1)
+            release.wait(5)
+            return 'estado'
+
+        def caller():
+            results.append(flight.run(1, slow_step))
+
+        threads = [threading.Thread(target=caller) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.1)
+        release.set()
+        for thread in threads:
+            thread.join(5)
+        self.assertEqual(1, len(calls))
+        self.assertEqual(['estado'] * 5, [result for result, _ in results])
+        self.assertEqual(4, sum(shared for _, shared in results))
+
+        # Sin vuelos pendientes, la siguiente llamada vuelve a ejecutar.
+        self.assertEqual(('otro', False), flight.run(1, lambda: 'otro'))
+
+    def test_error_is_raised_and_flight_cleared(self):
+        flight = SingleFlight()
+
+        def failing_step():
+            raise StepConflict('conflicto')
+
+        with self.assertRaises(StepConflict):
+            flight.run(1, failing_step)
+        self.assertEqual(('ok', False), flight.run(1, lambda: 'ok'))
+
+    @override_settings(STATE_MIN_STEP_INTERVAL_S=60)
+    def test_polls_within_min_interval_reuse_latest_state(self):
+        first = self.client.get(reverse('control:state')).data
+        second = self.client.get(reverse('control:state')).data
+        self.assertEqual(first['id'], second['id'])
+        self.assertEqual(1, TankState.objects.count())
+        # Las lecturas de sensores siempre ejecutan un paso.
+        third = self.client.get(reverse('control:state'), {'level': 50, 'temp': 30}).data
+        self.assertEqual(first['seq'] + 1, third['seq'])
+
+    @override_settings(STATE_MIN_STEP_INTERVAL_S=0)
+    def test_zero_interval_steps_every_poll(self):
+        self.client.get(reverse('control:state'))
+        self.client.get(reverse('control:state'))
+        self.assertEqual(2, TankState.objects.count())
+
+
+class ReadReplicaTestCase(SimpleTestCase):
+    SCRIPT = """
+import json
+import shutil
+
+from django.conf import settings
+from django.test import Client
+
+from control.routers import reset_lag_cache
+from control.services import ControlService
+
+service = ControlService()
+service.step(level_l=50, temp_c=30)
+# La copia del archivo hace de réplica; lo que sigue solo llega al primario.
+shutil.copyfile(settings.DATABASES['default']['NAME'], settings.DATABASES['replica1']['NAME'])
+service.step(level_l=10, temp_c=30)
+
+def events(client, **params):
+    return len(client.get('/api/events/', params).json())
+
+client = Client(SERVER_NAME='localhost')
+result = {'replica': events(client), 'consistent': events(client, consistent='1')}
+client.patch('/api/config/', {'temp_set_c': 36}, content_type='application/json')
+result['after_write'] = events(client)
+# Un GET con lecturas ejecuta un paso: también fija al primario.
+reader = Client(SERVER_NAME='localhost')
+reader.get('/api/state/', {'level': 20, 'temp': 30})
+result['after_step'] = events(reader)
+result['consistent_after_step'] = events(reader, consistent='1')
+settings.DB_REPLICA_MAX_LAG_S = 0
+reset_lag_cache()
+result['lagging'] = events(Client(SERVER_NAME='localhost'))
+print(json.dumps(result))
+"""
+
+    def test_reads_use_replica_with_primary_fallbacks(self):
+        backend_dir = Path(__file__).resolve().parent.parent
+        with tempfile.TemporaryDirectory() as tmp:
+            env = dict(
+                os.environ,
+                DB_ENGINE='django.db.backends.sqlite3',
+                DB_NAME=str(Path(tmp) / 'primary.sqlite3'),
+                DB_REPLICA_NAMES=str(Path(tmp) / 'replica.sqlite3'),
+                DB_REPLICA_MAX_LAG_S='60',
+            )
+            subprocess.run(
+                [sys.executable, 'manage.py', 'migrate', '-v', '0'],
+                cwd=backend_dir, env=env, check=True,
+            )
+            completed = subprocess.run(
+                [sys.executable, 'manage.py', 'shell', '-c', self.SCRIPT],
+                cwd=backend_dir, env=env, check=True, capture_output=True, text=True,
+            )
+        result = json.loads(completed.stdout.strip().splitlines()[-1])
+        self.assertLess(result['replica'], result['consistent'])
+        self.assertEqual(result['consistent'], result['after_write'])
+        self.assertEqual(result['consistent_after_step'], result['after_step'])
+        self.assertEqual(result['consistent_after_step'], result['lagging'])
+
+
+class EventSearchTestCase(APITestCase):
+    def setUp(self):
+        self.hot = EventLog.log(EventCode.SAFE_MODE, 'Modo seguro: nivel=80.00L, temp=45.12°C')
+        self.valve = EventLog.log(EventCode.VALVE_OPEN, 'Válvula de llenado abierta')
+        EventLog.objects.bulk_create([
+            EventLog(code=EventCode.HEATER_ON, message=f'Resistencia encendida a {temp}.0°C')
+            for temp in range(20, 30)
+        ])
+
+    def _ids(self, text, **kwargs):
+        return set(search_events(EventLog.objects.all(), text, **kwargs).values_list('id', flat=True))
+
+    def test_index_tracks_inserts_updates_and_deletes(self):
+        self.assertEqual(BACKEND_FTS5, backend_for(connection))
+        self.assertEqual({self.hot.id}, self._ids('45.1'))
+        self.assertEqual({self.valve.id}, self._ids('valvula llenado'))
+        self.assertEqual(10, len(self._ids('resistencia encendida')))
+        self.assertEqual({self.hot.id}, self._ids('safe_mode'))
+
+        EventLog.objects.filter(pk=self.valve.pk).update(message='Válvula de vaciado abierta')
+        self.assertEqual(set(), self._ids('llenado'))
+        self.assertEqual({self.valve.id}, self._ids('vaciado'))
+        self.hot.delete()
+        self.assertEqual(set(), self._ids('45.1'))
+
+    def test_like_fallback_matches_fts(self):
+        for text in ('encendida 25', 'abierta', 'VALVE_OPEN'):
+            self.assertEqual(self._ids(text), self._ids(text, backend=BACKEND_LIKE))
+
+    def test_readings_of_control_events_are_searchable(self):
+        service = ControlService()
+        service.step(level_l=62.37, temp_c=-3.5)
+        level_events = set(EventLog.objects.filter(message__contains='{level_l').values_list('id', flat=True))
+        temp_events = set(EventLog.objects.filter(message__contains='{temp_c').values_list('id', flat=True))
+        self.assertTrue(level_events and temp_events)
+
+        for backend in (BACKEND_FTS5, BACKEND_LIKE):
+            self.assertEqual(level_events, self._ids('62.3', backend=backend))
+            self.assertEqual(level_events, self._ids('nivel 62.37', backend=backend))
+            self.assertEqual(temp_events, self._ids('-3.5', backend=backend))
+            self.assertEqual(set(), self._ids('62.38', backend=backend))
+            # Los textos ya formateados siguen encontrándose como texto.
+            self.assertEqual({self.hot.id}, self._ids('45.1', backend=backend))
+
+        response = self.client.get(reverse('control:events'), {'q': '62.37'})
+        self.assertEqual(level_events, {row['id'] for row in response.data})
+        self.assertTrue(all('62.37' in row['message'] for row in response.data))
+
+    def test_events_endpoint_and_admin_search(self):
+        response = self.client.get(reverse('control:events'), {'q': 'temp=45'})
+        self.assertEqual([self.hot.id], [row['id'] for row in response.data])
+
+        user = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'secreto')
+        self.client.force_login(user)
+        response = self.client.get(reverse('admin:control_eventlog_changelist'), {'q': 'llenado'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([self.valve.id], [event.id for event in response.context['cl'].result_list])
+
+
+class StateSequenceTestCase(APITestCase):
+    def setUp(self):
+        self.service = ControlService()
+
+    def test_sequence_and_head_advance_together(self):
+        first = self.service.step(level_l=50, temp_c=30).state
+        second = self.service.step(level_l=51, temp_c=30).state
+        self.assertEqual(first.seq + 1, second.seq)
+        head = TankStateHead.objects.get(config=self.service.config)
+        self.assertEqual(second.pk, head.state_id)
+        self.assertEqual(second.seq, head.seq)
+        self.assertEqual(second.pk, self.service.get_latest_state().pk)
+
+    def test_stale_head_raises_conflict(self):
+        self.service.step(level_l=50, temp_c=30)
+        stale = self.service._load_head(self.service.config)
+        self.service.step(level_l=51, temp_c=30)
+        with transaction.atomic(), self.assertRaises(StepConflict):
+            self.service._append_state(self.service.config, stale, level_l=52, temp_c=30)
+
+    def test_other_integrity_errors_are_not_conflicts(self):
+        self.service.step(level_l=50, temp_c=30)
+        head = self.service._load_head(self.service.config)
+        with transaction.atomic(), self.assertRaises(IntegrityError) as caught:
+            self.service._append_state(self.service.config, head, level_l=None, temp_c=30)
+        self.assertNotIsInstance(caught.exception, StepConflict)
+
+    def test_missing_head_is_rebuilt_from_sequence(self):
+        state = self.service.step(level_l=50, temp_c=30).state
+        TankStateHead.objects.all().delete()
+        following = self.service.step(level_l=51, temp_c=30).state
+        self.assertEqual(state.seq + 1, following.seq)
+        self.assertTrue(TankStateHead.objects.filter(state=following).exists())
+
+
+class SensorIngestTestCase(SimpleTestCase):
+    def _service(self, steps, aggregate=AGGREGATE_MEAN):
+        config = TankConfig(capacity_l=100)
+        return IngestService(
+            validate=ControlService(config=config).sensors_invalid,
+            step=lambda level, temp: steps.append((level, temp)),
+            interval_s=0.05,
+            aggregate=aggregate,
+        )
+
+    def test_parse_line_formats(self):
+        self.assertEqual(Reading(12.5, 30.0), parse_line('level=12.5 temp=30'))
+        self.assertEqual(Reading(None, 31.0), parse_line('temp=31'))
+        self.assertEqual(Reading(10.0, 20.0), parse_line('10,20\n'))
+        with self.assertRaises(MalformedReading):
+            parse_line('pressure=3')
+
+    def test_tick_aggregates_and_drops_invalid(self):
+        steps = []
+        service = self._service(steps)
+        for line in ('level=10 temp=30', 'level=20 temp=32', 'level=500 temp=30', 'basura'):
+            service.feed(line)
+        asyncio.run(service.tick())
+        service.close()
+        self.assertEqual([(15.0, 31.0)], steps)
+        self.assertEqual(1, service.stats.rejected)
+        self.assertEqual(1, service.stats.malformed)
+
+    def test_only_invalid_readings_reach_the_step(self):
+        steps = []
+        service = self._service(steps, aggregate=AGGREGATE_LAST)
+        service.feed('level=nan temp=30')
+        asyncio.run(service.tick())
+        service.close()
+        self.assertEqual(1, len(steps))
+        self.assertTrue(math.isnan(steps[0][0]))
+
+    def test_tcp_loopback_generator(self):
+        steps = []
+        service = self._service(steps)
+
+        async def scenario():
+            server = await service.start_tcp('127.0.0.1', 0)
+            port = server.sockets[0].getsockname()[1]
+            await loopback_generator('127.0.0.1', port, protocol='tcp', rate_hz=500, count=20)
+            await asyncio.sleep(0.05)
+            await service.tick()
+            server.close()
+            await server.wait_closed()
+
+        asyncio.run(scenario())
+        service.close()
+        self.assertEqual(20, service.stats.accepted)
+        self.assertEqual(1, len(steps))
+
+    def test_failed_step_does_not_stop_ticks(self):
+        steps, errors = [], []
+
+        def step(level, temp):
+            steps.append((level, temp))
+            if len(steps) == 1:
+                raise OperationalError('database is locked')
+
+        service = IngestService(
+            validate=lambda level, temp: False,
+            step=step,
+            interval_s=0.01,
+            on_error=errors.append,
+        )
+
+        async def scenario():
+            stop = asyncio.Event()
+            task = asyncio.create_task(service.run_ticks(stop))
+            for level in (10, 20, 30):
+                service.feed(f'level={level} temp=30')
+                while len(steps) < level // 10:
+                    await asyncio.sleep(0.005)
+            stop.set()
+            await task
+
+        asyncio.run(scenario())
+        service.close()
+        self.assertEqual([10.0, 20.0, 30.0], [level for level, _ in steps])
+        self.assertEqual(1, service.stats.step_errors)
+        self.assertIsInstance(errors[0], OperationalError)
+
+
+class SignalConditioningTestCase(APITestCase):
+    def setUp(self):
+        self.config = TankConfig.get_active()
+
+    def test_median_filter_rejects_single_spike(self):
+        self.config.signal_filter = SignalFilter.MEDIAN
+        self.config.signal_filter_window = 3
+        self.config.save()
+        service = ControlService()
+        service.step(level_l=50, temp_c=30)
+        service.step(level_l=50, temp_c=30)
+        state = service.step(level_l=self.config.capacity_l + 10, temp_c=30).state
+        self.assertFalse(state.safe_mode)
+        self.assertEqual(50, state.level_l)
+
+    def test_non_finite_readings_bypass_filter(self):
+        self.config.signal_filter = SignalFilter.EWMA
+        self.config.save()
+        service = ControlService()
+        service.step(level_l=50, temp_c=30)
+        state = service.step(level_l=float('inf'), temp_c=30).state
+        self.assertTrue(state.safe_mode)
+
+    def test_rate_clamp_limits_change_per_second(self):
+        clamp = RateClamp(max_rate_per_s=2.0)
+        self.assertEqual(10.0, clamp.update(10.0, now=0.0))
+        self.assertEqual(11.0, clamp.update(30.0, now=0.5))
+        self.assertEqual(10.0, clamp.update(0.0, now=1.0))
+
+    def test_median_filter_matches_full_sort(self):
+        window = 5
+        median = MedianFilter(window)
+        values = [3, 1, 4, 1, 5, 9, 2, 6, 5, 3, 5, 8, 9, 7, 9, 3, 2, 3, 8, 4]
+        for index, value in enumerate(values):
+            ordered = sorted(values[max(0, index - window + 1): index + 1])
+            mid = len(ordered) // 2
+            expected = ordered[mid] if len(ordered) % 2 else (ordered[mid - 1] + ordered[mid]) / 2
+            self.assertEqual(expected, median.update(value))
+
+    def test_ring_buffer_keeps_last_values(self):
+        buffer = RingBuffer(3)
+        for value in range(5):
+            buffer.push(value)
+        self.assertEqual([2.0, 3.0, 4.0], sorted(buffer.values()))
+
+    def test_rejects_invalid_filter_window(self):
+        serializer = TankConfigSerializer(
+            self.config,
+            data={'signal_filter_window': 0},
+            partial=True,
+        )
+        self.assertFalse(serializer.is_valid())
+        self.assertIn('signal_filter_window', serializer.errors)
+
+
+class SweepSimulationTestCase(SimpleTestCase):
+    def test_build_grid_splits_config_and_constants(self):
+        scenarios = build_grid({'hysteresis_c': [1.0, 2.0], 'fill_rate_lps': [4.0]}, duration_s=10)
+        self.assertEqual(2, len(scenarios))
+        self.assertEqual({'hysteresis_c': 1.0}, scenarios[0].config)
+        self.assertEqual(4.0, scenarios[0].constants.fill_rate_lps)
+
+    def test_run_scenario_reports_metrics(self):
+        scenario = Scenario(config={'capacity_l': 200, 'min_level_l': 90, 'max_level_l': 200},
+                            duration_s=120, initial_level_l=120, initial_temp_c=20)
+        result = run_scenario(scenario)
+        self.assertEqual('', result.error)
+        self.assertEqual(120, result.steps)
+        self.assertGreaterEqual(result.heater_cycles, 1)
+        self.assertGreater(result.energy_wh, 0)
+        self.assertEqual(0, result.safe_mode_s)
+
+    def test_energy_follows_the_swept_heating(self):
+        self.assertEqual(ControlService.HEATER_POWER_W, DEFAULT_CONSTANTS.heater_power_w)
+        base = Scenario(duration_s=300, initial_level_l=60, initial_temp_c=30)
+        nominal = run_scenario(base)
+        # Misma tasa de calentamiento con el doble de capacidad calorífica: misma
+        # temperatura y mismos ciclos, el doble de potencia.
+        heavier = run_scenario(replace(base, constants=replace(DEFAULT_CONSTANTS, heat_capacity_j_per_c=125)))
+        self.assertEqual(nominal.final_temp_c, heavier.final_temp_c)
+        self.assertGreater(nominal.energy_wh, 0)
+        self.assertAlmostEqual(2 * nominal.energy_wh, heavier.energy_wh)
+        self.assertAlmostEqual(100, replace(DEFAULT_CONSTANTS, heating_rate_c_per_sec=1.6).heater_power_w)
+
+    def test_invalid_combinations_are_reported(self):
+        result = run_scenario(Scenario(config={'min_level_l': 95, 'max_level_l': 90}, duration_s=1))
+        self.assertIn('min_level_l', result.error)
+
+    def test_command_writes_summary(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            output = Path(tmp) / 'sweep.csv'
+            call_command(
+                'sweep_simulation', '--param', 'hysteresis_c=1,2', '--duration', '30',
+                '--workers', '1', '--output', str(output), stdout=StringIO(),
+            )
+            rows = list(csv.DictReader(output.open()))
+        self.assertEqual(2, len(rows))
+        self.assertEqual('30', rows[0]['steps'])
+
+
+class LoadTestHarnessTestCase(LiveServerTestCase):
+    def test_percentiles_use_nearest_rank(self):
+        stats = EndpointStats(latencies_ms=[float(value) for value in range(1, 101)])
+        self.assertEqual(50.0, stats.percentile(50))
+        self.assertEqual(95.0, stats.percentile(95))
+        self.assertEqual(99.0, stats.percentile(99))
+
+    def test_command_reports_endpoints_and_growth(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            report_path = Path(tmp) / 'load.json'
+            call_command(
+                'loadtest', '--base-url', self.live_server_url, '--dashboards', '2',
+                '--writers', '1', '--duration', '1', '--poll-interval', '0.2',
+                '--write-hz', '5', '--json', str(report_path), stdout=StringIO(),
+            )
+            report = json.loads(report_path.read_text())
+        self.assertEqual({'config', 'dashboard', 'state_write'}, set(report['endpoints']))
+        self.assertGreater(report['endpoints']['state_write']['requests'], 0)
+        self.assertGreater(report['endpoints']['dashboard']['requests'], 1)
+        self.assertEqual(0, report['endpoints']['dashboard']['error_rate'])
+        self.assertGreater(report['row_growth']['TankState'], 0)
+
+
+class EventReadingsTestCase(APITestCase):
+    def setUp(self):
+        self.service = ControlService()
+
+    def test_transition_stores_readings_and_state(self):
+        self.service.step(level_l=50, temp_c=30)
+        state = self.service.step(level_l=12.345, temp_c=30).state
+        event = EventLog.objects.get(code=EventCode.VALVE_OPEN, prev_actuators__isnull=False)
+        self.assertEqual(state.pk, event.state_id)
+        self.assertEqual(12.345, event.level_l)
+        self.assertEqual(30, event.temp_c)
+        self.assertFalse(event.prev_actuators & 1)
+        self.assertEqual(actuator_bits(state), event.new_actuators)
+        self.assertEqual('Se abre la válvula. Nivel={level_l:.2f}L', event.message)
+        self.assertEqual('Se abre la válvula. Nivel=12.35L', event.text)
+
+        # Las lecturas de cada apertura son una consulta, sin interpretar mensajes.
+        levels = EventLog.objects.filter(code=EventCode.VALVE_OPEN).values_list('level_l', flat=True)
+        self.assertEqual([12.345], list(levels.filter(prev_actuators__isnull=False)))
+
+        response = self.client.get(reverse('control:events'), {'fields': 'code,message'})
+        messages = [row['message'] for row in response.json() if row['code'] == EventCode.VALVE_OPEN]
+        self.assertIn('Se abre la válvula. Nivel=12.35L', messages)
+
+    def test_text_events_render_verbatim(self):
+        legacy = EventLog.objects.create(code=EventCode.HEATER_ON, message='Resistencia {sin} lecturas')
+        self.assertEqual('Resistencia {sin} lecturas', legacy.text)
+        self.service.step(level_l=50, temp_c=30)
+        self.assertIsNotNone(self.service.force_safe_state('umbral {excedido}'))
+        watchdog = EventLog.objects.get(code=EventCode.SAFE_MODE)
+        self.assertEqual('Modo seguro activado por el watchdog: umbral {excedido}', watchdog.text)
+        self.assertEqual(TankStateHead.objects.get().state_id, watchdog.state_id)
+
+    def test_import_links_events_to_states(self):
+        low = self.service.config.min_level_l - 5
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        path = Path(tmp.name) / 'lecturas.ndjson'
+        path.write_text(''.join(
+            json.dumps({'ts': f'2024-01-01T00:00:0{index}+00:00', 'level': level, 'temp': 30}) + '\n'
+            for index, level in enumerate([50, low])
+        ))
+        call_command('import_readings', str(path), derive=True, stdout=StringIO())
+        event = EventLog.objects.get(code=EventCode.VALVE_OPEN, prev_actuators__isnull=False)
+        self.assertEqual(TankState.objects.get(seq=2).pk, event.state_id)
+        self.assertEqual(low, event.level_l)
+
+
+class EventCoalescingTestCase(APITestCase):
+    def setUp(self):
+        self.service = ControlService()
+        self.invalid_level = self.service.config.capacity_l + 10
+
+    def _safe_mode_warnings(self):
+        return EventLog.objects.filter(code=EventCode.SAFE_MODE, severity=EventSeverity.WARNING)
+
+    def test_repeated_safe_mode_updates_one_episode(self):
+        for _ in range(5):
+            self.service.step(level_l=self.invalid_level, temp_c=30)
+        episode = self._safe_mode_warnings().get()
+        self.assertEqual(5, episode.occurrences)
+        self.assertTrue(episode.episode_open)
+        self.assertGreaterEqual(episode.last_ts, episode.ts)
+
+    def test_episode_closes_when_sensors_recover(self):
+        self.service.step(level_l=self.invalid_level, temp_c=30)
+        self.service.step(level_l=50, temp_c=30)
+        self.service.step(level_l=self.invalid_level, temp_c=30)
+        episodes = list(self._safe_mode_warnings().order_by('id'))
+        self.assertEqual(2, len(episodes))
+        self.assertFalse(episodes[0].episode_open)
+        self.assertTrue(episodes[1].episode_open)
+
+    def test_expired_window_starts_new_episode(self):
+        self.service.step(level_l=self.invalid_level, temp_c=30)
+        self._safe_mode_warnings().update(last_ts=timezone.now() - timedelta(hours=1))
+        self.service.step(level_l=self.invalid_level, temp_c=30)
+        self.assertEqual(2, self._safe_mode_warnings().count())
+        self.assertEqual(1, self._safe_mode_warnings().filter(episode_open=True).count())
+
+    @override_settings(EVENT_COALESCE_WINDOW_S=0)
+    def test_zero_window_disables_coalescing(self):
+        for _ in range(3):
+            self.service.step(level_l=self.invalid_level, temp_c=30)
+        self.assertEqual(3, self._safe_mode_warnings().count())
+
+
+class ArchiveHistoryTestCase(APITestCase):
+    def setUp(self):
+        self.archive_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.archive_dir.cleanup)
+        self.settings_override = override_settings(ARCHIVE_DIR=Path(self.archive_dir.name))
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+        service = ControlService()
+        self.noon = timezone.now().replace(hour=12, minute=0, second=0, microsecond=0)
+        for index in range(6):
+            state = service.step(level_l=50 + index, temp_c=30).state
+            # Dos estados por día en los tres días anteriores; el último queda como cabeza.
+            ts = self.noon - timedelta(days=3 - index // 2) + timedelta(hours=index % 2)
+            TankState.objects.filter(pk=state.pk).update(ts=ts)
+        EventLog.objects.update(ts=self.noon - timedelta(days=3))
+
+    def _history(self, **params):
+        response = self.client.get(reverse('control:history'), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def test_archived_history_reads_like_live_table(self):
+        before_states = self._history()
+        before_events = self._history(source='events')
+        call_command('archive_history', keep_days=1, stdout=StringIO())
+
+        head = TankStateHead.objects.get()
+        self.assertEqual([head.state_id], list(TankState.objects.values_list('id', flat=True)))
+        self.assertEqual(before_states, self._history())
+        self.assertEqual(before_events, self._history(source='events'))
+
+        index = ArchiveIndex(Path(self.archive_dir.name) / 'tankstate')
+        entry = next(iter(index.entries.values()))
+        self.assertEqual(2, entry['rows'])
+        self.assertLessEqual(entry['columns']['level_l']['min'], entry['columns']['level_l']['max'])
+
+    def test_range_and_projection_span_archive_and_live(self):
+        call_command('archive_history', keep_days=1, stdout=StringIO())
+        start = (self.noon - timedelta(days=2, hours=1)).isoformat()
+        rows = self._history(start=start, fields='seq,level_l')
+        self.assertEqual([3, 4, 5, 6], [row['seq'] for row in rows])
+        self.assertEqual({'seq', 'level_l'}, set(rows[0]))
+
+        response = self.client.get(reverse('control:history-export'), {'fields': 'seq'})
+        exported = json.loads(b''.join(response.streaming_content))
+        self.assertEqual(list(range(1, 7)), [row['seq'] for row in exported])
+
+    def test_rerun_merges_leftover_rows_without_duplicates(self):
+        call_command('archive_history', keep_days=1, stdout=StringIO())
+        path = next((Path(self.archive_dir.name) / 'tankstate').glob('*.tca'))
+        archived = read_day_file(path, ['id'])['id']
+        Archiver().archive_day('tankstate', timezone.now().date() - timedelta(days=3))
+        self.assertEqual(archived, read_day_file(path, ['id'])['id'])
+
+    def test_compacted_minutes_are_archived_with_their_ids(self):
+        state_ids = sorted(TankState.objects.values_list('id', flat=True))
+        compact_states(timezone.now())
+        self.assertEqual(5, TankStateChunk.objects.count())
+        before = self._history()
+        self.assertEqual(state_ids, sorted(row['id'] for row in before))
+        call_command('archive_history', keep_days=1, stdout=StringIO())
+
+        self.assertFalse(TankStateChunk.objects.exists())
+        self.assertEqual(1, TankState.objects.count())
+        self.assertEqual(before, self._history())
+
+    def test_invalid_bounds_are_rejected(self):
+        response = self.client.get(reverse('control:history'), {'start': 'ayer'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class DashboardSnapshotTestCase(APITestCase):
+    def _get(self, since=None):
+        params = {'since': since} if since else {}
+        response = self.client.get(reverse('control:dashboard'), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def test_first_call_returns_full_snapshot(self):
+        EventLog.log(EventCode.SAFE_MODE, 'Prueba', config=TankConfig.get_active())
+        data = self._get()
+        self.assertTrue(data['full'])
+        self.assertIsNotNone(data['config'])
+        self.assertEqual(TankState.objects.latest('seq').seq, data['state']['seq'])
+        codes = [event['code'] for event in data['events']]
+        self.assertEqual('SAFE_MODE', codes[-1])
+
+    @override_settings(STATE_MIN_STEP_INTERVAL_S=0)
+    def test_token_returns_only_changes(self):
+        first = self._get()
+        second = self._get(first['token'])
+        self.assertFalse(second['full'])
+        self.assertIsNone(second['config'])
+        self.assertEqual([], second['events'])
+        self.assertGreater(second['state']['seq'], first['state']['seq'])
+
+        config = TankConfig.get_active()
+        event = EventLog.log(EventCode.SAFE_MODE, 'Nuevo evento', config=config)
+        config.temp_set_c += 1
+        config.save()
+        third = self._get(second['token'])
+        self.assertIn(event.id, [row['id'] for row in third['events']])
+        self.assertEqual(config.temp_set_c, third['config']['temp_set_c'])
+
+    def test_updated_episode_is_resent(self):
+        config = TankConfig.get_active()
+        EventLog.log(EventCode.SAFE_MODE, 'Sensores inválidos', coalesce=True, config=config)
+        first = self._get()
+        episode = EventLog.log(EventCode.SAFE_MODE, 'Sensores inválidos', coalesce=True, config=config)
+        second = self._get(first['token'])
+        self.assertEqual([(episode.id, 2)], [(row['id'], row['occurrences']) for row in second['events']])
+
+    def test_overflow_advances_token_only_past_returned_events(self):
+        service = ControlService()
+        first = build_snapshot(service, None)
+        created = [EventLog.log(EventCode.SAFE_MODE, f'Evento {n}', config=service.config).id for n in range(5)]
+        second = build_snapshot(service, first.token, events_limit=3, event_columns=('id',))
+        third = build_snapshot(service, second.token, events_limit=3, event_columns=('id',))
+        self.assertEqual(created[2::-1], [row[0] for row in second.events])
+        self.assertEqual(created[2], second.token.last_event_id)
+        self.assertEqual(created[:2:-1], [row[0] for row in third.events])
+
+    def test_state_is_read_in_the_snapshot(self):
+        service = ControlService()
+        state = service.step(level_l=50, temp_c=30).state
+        snapshot = build_snapshot(service, None)
+        self.assertEqual(state.pk, snapshot.state.pk)
+        self.assertIsNotNone(snapshot.config)
+
+    def test_invalid_token_falls_back_to_full_snapshot(self):
+        data = self._get('no-es-un-token')
+        self.assertTrue(data['full'])
+        self.assertIsNotNone(data['config'])
+
+
+class WatchdogTestCase(APITestCase):
+    def setUp(self):
+        self.service = ControlService()
+        config = self.service.config
+        # Nivel suficiente y temperatura baja: la resistencia queda encendida.
+        self.service.step(level_l=config.min_level_l + 5, temp_c=config.temp_set_c - 10)
+        self.now = timezone.now()
+
+    def _watchdog(self, offset_s: float) -> Watchdog:
+        return Watchdog(self.service, deadline_s=5, slo_ms=250, clock=lambda: self.now + timedelta(seconds=offset_s))
+
+    def test_step_records_heartbeat_and_latency(self):
+        head = TankStateHead.objects.get()
+        self.assertIsNotNone(head.heartbeat_at)
+        self.assertGreater(head.step_ms, 0)
+        status_data = self._watchdog(1).check()
+        self.assertFalse(status_data.stale)
+        self.assertFalse(status_data.forced_safe)
+        self.assertTrue(TankState.objects.latest('seq').heater_on)
+
+    def test_missed_deadline_forces_safe_state(self):
+        status_data = self._watchdog(10).check()
+        self.assertTrue(status_data.stale)
+        self.assertTrue(status_data.forced_safe)
+        state = TankState.objects.latest('seq')
+        self.assertTrue(state.safe_mode)
+        self.assertFalse(state.heater_on or state.valve_open or state.drain_valve_open)
+        self.assertTrue(EventLog.objects.filter(code=EventCode.HEATER_SAFE_OFF).exists())
+        self.assertTrue(EventLog.objects.filter(code=EventCode.SAFE_MODE, episode_open=True).exists())
+
+        # El latido no se renueva con el estado forzado y no se repite la escritura.
+        again = self._watchdog(11).check()
+        self.assertTrue(again.stale)
+        self.assertFalse(again.forced_safe)
+        self.assertEqual(state.seq, TankState.objects.latest('seq').seq)
+
+    def test_next_step_resumes_control(self):
+        self._watchdog(10).check()
+        self.service.step(level_l=self.service.config.min_level_l + 5, temp_c=30)
+        self.assertFalse(TankState.objects.latest('seq').safe_mode)
+        self.assertFalse(Watchdog(self.service, deadline_s=5).status().stale)
+
+    def test_database_errors_do_not_stop_the_loop(self):
+        watchdog = self._watchdog(10)
+        stop = threading.Event()
+        reports = []
+
+        def on_check(status_data):
+            reports.append(status_data)
+            if len(reports) == 2:
+                stop.set()
+
+        outcomes = [OperationalError('database is locked'), watchdog.status()]
+        with patch('control.watchdog.connection') as db_connection:
+            with patch.object(watchdog, 'status', side_effect=outcomes):
+                watchdog.run(0, stop, on_check=on_check)
+        self.assertTrue(reports[0].stale)
+        self.assertEqual('database is locked', reports[0].error)
+        db_connection.close.assert_called_once_with()
+        self.assertTrue(reports[1].forced_safe)
+        self.assertEqual('', reports[1].error)
+
+    @override_settings(WATCHDOG_STEP_SLO_MS=0)
+    def test_slo_breaches_are_counted(self):
+        self.service.step(level_l=50, temp_c=30)
+        self.assertEqual(1, TankStateHead.objects.get().slo_breaches)
+
+    def test_health_endpoint_reports_staleness(self):
+        response = self.client.get(reverse('control:health'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(response.data['stale'])
+        TankStateHead.objects.update(heartbeat_at=timezone.now() - timedelta(minutes=5))
+        response = self.client.get(reverse('control:health'))
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertTrue(response.data['stale'])
+
+
+class ChunkedStorageTestCase(APITestCase):
+    def test_codec_roundtrip_is_bit_exact(self):
+        base = timezone.now().replace(microsecond=0)
+        samples = [
+            Sample(
+                seq=index + 1,
+                ts=base + timedelta(seconds=index, microseconds=(index * 7919) % 1000),
+                level_l=[50.0, 50.0, 50.123456789, -0.0, float('inf'), 1e-300][index % 6],
+                temp_c=30 + math.sin(index) / 3,
+                valve_open=index % 2 == 0,
+                drain_valve_open=index % 3 == 0,
+                heater_on=index % 5 == 0,
+                safe_mode=index == 7,
+            )
+            for index in range(61)
+        ]
+        decoded = decode_chunk(encode_chunk(samples), len(samples))
+        self.assertEqual(samples, decoded)
+        self.assertEqual(math.copysign(1, samples[3].level_l), math.copysign(1, decoded[3].level_l))
+
+    def test_compaction_keeps_history_and_packs_minutes(self):
+        service = ControlService()
+        start = timezone.now().replace(second=0, microsecond=0) - timedelta(hours=2)
+        for index in range(120):
+            state = service.step(level_l=60 + math.sin(index / 10), temp_c=30 + index / 100).state
+            TankState.objects.filter(pk=state.pk).update(ts=start + timedelta(seconds=index))
+        fields = 'id,seq,level_l,temp_c,valve_open,drain_valve_open,heater_on,safe_mode,ts'
+        before = self.client.get(reverse('control:history'), {'fields': fields}).data
+
+        out = StringIO()
+        call_command('compact_states', keep_minutes=30, stdout=out)
+        self.assertIn('Compactados 119 estados en 2 bloques', out.getvalue())
+        self.assertEqual(1, TankState.objects.count())
+        self.assertEqual(2, TankStateChunk.objects.count())
+        self.assertEqual(before, self.client.get(reverse('control:history'), {'fields': fields}).data)
+
+        window = self.client.get(reverse('control:history'), {
+            'fields': 'seq',
+            'start': (start + timedelta(seconds=50)).isoformat(),
+            'end': (start + timedelta(seconds=70)).isoformat(),
+        }).data
+        self.assertEqual(list(range(51, 71)), [row['seq'] for row in window])
+
+    def test_chunks_without_ids_still_decode(self):
+        base = timezone.now()
+        samples = [
+            Sample(index + 1, base + timedelta(seconds=index), 60.0, 30.0, True, False, False, False, id=index + 1)
+            for index in range(3)
+        ]
+        payload = encode_chunk(samples)
+        self.assertEqual(samples, decode_chunk(payload, 3))
+        # Formato anterior: sin la sección final de ids (un byte por muestra aquí).
+        legacy = decode_chunk(payload[:-3], 3)
+        self.assertEqual([None] * 3, [sample.id for sample in legacy])
+        self.assertEqual([sample.seq for sample in samples], [sample.seq for sample in legacy])
+
+    def test_late_rows_merge_into_existing_chunk(self):
+        service = ControlService()
+        start = timezone.now().replace(second=0, microsecond=0) - timedelta(hours=1)
+        for index in range(3):
+            state = service.step(level_l=60, temp_c=30).state
+            TankState.objects.filter(pk=state.pk).update(ts=start + timedelta(seconds=index))
+        compact_states(timezone.now())
+        service.step(level_l=60, temp_c=30)
+        compact_states(timezone.now() + timedelta(minutes=5))
+        chunk = TankStateChunk.objects.get(minute=start)
+        self.assertEqual([1, 2, 3], [sample.seq for sample in chunk.samples()])
+
+    def test_packed_size_is_far_below_raw(self):
+        base = timezone.now()
+        samples = [
+            Sample(index, base + timedelta(seconds=index), 60.0 + (index // 10) * 0.5, 30.25, True, False, index > 30, False)
+            for index in range(60)
+        ]
+        report = storage_report(samples)
+        self.assertLess(report['packed_bytes'] * 5, report['raw_bytes'])
+
+
+class GenerateHistoryTestCase(APITestCase):
+    END = '2024-03-01T00:00:00+00:00'
+
+    def test_generated_history_follows_control_logic(self):
+        configs = create_tanks(2)
+        end = timezone.now()
+        stats = HistoryGenerator(configs, seed=7, faults_per_day=600, fault_duration_s=20).run(
+            end - timedelta(minutes=15),
+            end,
+        )
+        self.assertEqual(1800, stats.states)
+        self.assertGreater(stats.safe_mode_episodes, 0)
+        for config in configs:
+            service = ControlService(config=config)
+            states = list(TankState.objects.filter(config=config).order_by('seq'))
+            self.assertEqual(states[-1].pk, TankStateHead.objects.get(config=config).state_id)
+            events = {}
+            for event in EventLog.objects.filter(state__config=config).order_by('id'):
+                events.setdefault(event.state_id, []).append(event.code)
+            previous = None
+            for state in states:
+                has_previous = previous is not None
+                decision = service.decide(previous or state, state.level_l, state.temp_c, 1.0, has_previous=has_previous)
+                self.assertEqual(decision.state_fields(), {name: getattr(state, name) for name in decision.state_fields()})
+                expected = [
+                    event.code
+                    for event in service.transition_events(
+                        previous or state,
+                        state,
+                        decision.forced_heater_shutdown,
+                        has_previous=has_previous,
+                    )
+                ]
+                logged = [code for code in events.get(state.pk, []) if code != EventCode.SAFE_MODE or not state.safe_mode]
+                self.assertEqual(expected, logged)
+                previous = state
+        safe_states = TankState.objects.filter(config__in=configs, safe_mode=True).count()
+        warnings = EventLog.objects.filter(code=EventCode.SAFE_MODE, severity=EventSeverity.WARNING)
+        self.assertEqual(safe_states, sum(warnings.values_list('occurrences', flat=True)))
+
+    def test_auto_rules_match_decide_on_edges(self):
+        config = create_tanks(1)[0]
+        service = ControlService(config=config)
+        low_c = config.temp_set_c - config.hysteresis_c
+        eps = 1e-6
+        levels = (
+            -1.0, -eps, 0.0, config.min_level_l - eps, config.min_level_l, config.min_level_l + eps,
+            config.max_level_l - eps, config.max_level_l, config.max_level_l + eps,
+            config.capacity_l, config.capacity_l + eps, math.nan, math.inf,
+        )
+        temps = (low_c - eps, low_c, low_c + eps, config.temp_set_c - eps, config.temp_set_c, math.nan, -math.inf)
+        for level in levels:
+            for temp in temps:
+                for heater_on in (False, True):
+                    for has_previous in (False, True):
+                        with self.subTest(level=level, temp=temp, heater_on=heater_on, has_previous=has_previous):
+                            previous = TankState(config=config, level_l=50.0, temp_c=30.0, heater_on=heater_on)
+                            decision = service.decide(previous, level, temp, 1.0, has_previous=has_previous)
+                            expected = (
+                                decision.valve_open,
+                                decision.drain_valve_open,
+                                decision.heater_on,
+                                decision.safe_mode,
+                                decision.forced_heater_shutdown,
+                            )
+                            self.assertEqual(expected, auto_actuators(
+                                level, temp, heater_on, has_previous, config.capacity_l,
+                                config.min_level_l, config.max_level_l, config.temp_set_c, low_c,
+                            ))
+
+    def test_same_seed_same_data_and_search_index(self):
+        fields = ('seq', 'level_l', 'temp_c', 'valve_open', 'heater_on', 'ts')
+        runs = []
+        for _ in range(2):
+            out = StringIO()
+            call_command('generate_history', tanks=1, days=0.01, seed=3, end=self.END, stdout=out)
+            self.assertIn('estados=864', out.getvalue())
+            config = TankConfig.objects.order_by('-id').first()
+            runs.append(list(TankState.objects.filter(config=config).order_by('seq').values_list(*fields)))
+        self.assertEqual(runs[0], runs[1])
+
+        # Los triggers de búsqueda vuelven a quedar activos tras la carga.
+        self.assertTrue(search_events(EventLog.objects.all(), 'válvula').exists())
+        EventLog.log(EventCode.HEATER_ON, 'Resistencia de prueba sintética')
+        self.assertEqual(1, search_events(EventLog.objects.all(), 'sintética').count())
+
+
+class ImportReadingsTestCase(APITestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.config = TankConfig.get_active()
+
+    def _write(self, name: str, text: str) -> str:
+        path = Path(self.tmp.name) / name
+        path.write_text(text, encoding='utf-8')
+        return str(path)
+
+    def test_csv_import_validates_and_orders_rows(self):
+        over = self.config.capacity_l + 1
+        path = self._write('lecturas.csv', (
+            'ts,level,temp,heater_on\n'
+            '2024-01-01T00:00:02Z,51,30,1\n'
+            '2024-01-01T00:00:00Z,50,30,0\n'
+            '2024-01-01T00:00:01Z,nan,30,0\n'
+            f'2024-01-01T00:00:03Z,{over},30,0\n'
+            'sin-fecha,50,30,0\n'
+            '2024-01-01T00:00:04Z,52,31,0\n'
+        ))
+        out = StringIO()
+        call_command('import_readings', path, batch_size=4, stdout=out)
+        self.assertIn('importados=3 inválidos=2 malformados=1', out.getvalue())
+        self.assertIn('filas/s', out.getvalue())
+
+        states = list(TankState.objects.order_by('seq'))
+        self.assertEqual([1, 2, 3], [state.seq for state in states])
+        self.assertEqual([50, 51, 52], [state.level_l for state in states])
+        self.assertEqual([False, True, False], [state.heater_on for state in states])
+        self.assertEqual(2024, states[0].ts.year)
+        self.assertEqual(states[-1].pk, TankStateHead.objects.get().state_id)
+
+        # El bucle de control continúa la secuencia después de la importación.
+        self.assertEqual(4, ControlService().step(level_l=50, temp_c=30).state.seq)
+
+    def test_older_import_keeps_live_head(self):
+        live = ControlService().step(level_l=50, temp_c=30).state
+        path = self._write('viejo.ndjson', '{"ts": 1700000000, "level": 40, "temp": 25}\n')
+        call_command('import_readings', path, stdout=StringIO())
+        head = TankStateHead.objects.get()
+        self.assertEqual(live.pk, head.state_id)
+        self.assertEqual(2, head.seq)
+
+    def test_derive_runs_control_logic_with_historical_timestamps(self):
+        low = self.config.min_level_l - 5
+        lines = [
+            json.dumps({'ts': f'2024-01-01T00:00:0{index}+00:00', 'level': level, 'temp': 30})
+            for index, level in enumerate([low, low, self.config.min_level_l + 10])
+        ]
+        path = self._write('lecturas.ndjson', '\n'.join(lines) + '\n')
+        call_command('import_readings', path, derive=True, stdout=StringIO())
+        self.assertEqual([True, True, False], list(TankState.objects.order_by('seq').values_list('valve_open', flat=True)))
+        close = EventLog.objects.get(code=EventCode.VALVE_CLOSE, message__startswith='Se cierra')
+        self.assertEqual(2, close.ts.second)
+        self.assertEqual(2024, close.ts.year)
+
+
+class AlarmRuleTestCase(APITestCase):
+    def setUp(self):
+        self.service = ControlService()
+        self.start = timezone.now()
+
+    def _samples(self, alarm_set, rows):
+        changes = []
+        for second, fields in rows:
+            values = {'level_l': 50.0, 'temp_c': 30.0, 'valve_open': False, 'heater_on': False, 'safe_mode': False}
+            values.update(fields)
+            state = TankState(ts=self.start + timedelta(seconds=second), **values)
+            changes.extend((second, change.active) for change in alarm_set.evaluate(state))
+        return changes
+
+    def test_temperature_needs_for_seconds_and_ignores_safe_mode(self):
+        rule = AlarmRule(name='Caliente', metric=AlarmMetric.TEMP, threshold=40, for_s=10)
+        rows = [(0, {'temp_c': 45}), (5, {'temp_c': 45}), (10, {'temp_c': 45}), (11, {'temp_c': 45})]
+        rows += [(12, {'temp_c': 10, 'safe_mode': True}), (13, {'temp_c': 39})]
+        self.assertEqual([(10, True), (13, False)], self._samples(AlarmSet([rule]), rows))
+
+    def test_windowed_metrics(self):
+        rules = [
+            AlarmRule(name='Fuga', metric=AlarmMetric.LEVEL_RATE, operator=AlarmOperator.BELOW, threshold=-5, window_s=60),
+            AlarmRule(name='Ciclos', metric=AlarmMetric.HEATER_CYCLES, threshold=2, window_s=100),
+            AlarmRule(name='Sin llenado', metric=AlarmMetric.FILL_RISE, operator=AlarmOperator.BELOW, threshold=1, window_s=30),
+        ]
+        alarm_set = AlarmSet(rules)
+        self.assertEqual(3, len(alarm_set.metrics))
+        # El nivel baja 6 L/min: la regla de tasa se activa al completar la ventana.
+        leak = [(second, {'level_l': 50 - second / 10}) for second in range(0, 61, 10)]
+        self.assertEqual([(60, True)], self._samples(alarm_set, leak))
+        # Tres encendidos en menos de 100 s.
+        cycles = [(70 + index * 5, {'level_l': 44, 'heater_on': index % 2 == 1}) for index in range(6)]
+        self.assertEqual([(70, False), (95, True)], self._samples(alarm_set, cycles))
+        # La válvula abierta 30 s sin que suba el nivel.
+        stuck = [(100 + second, {'level_l': 44, 'valve_open': True}) for second in range(0, 31, 10)]
+        self.assertIn((130, True), self._samples(alarm_set, stuck))
+
+    def test_step_logs_alarm_events_and_recompiles(self):
+        self.service.step(level_l=50, temp_c=30)
+        rule = AlarmRule.objects.create(
+            config=self.service.config,
+            name='Temperatura {alta}',
+            metric=AlarmMetric.TEMP,
+            threshold=40,
+            severity=EventSeverity.ERROR,
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            self.service.step(level_l=50, temp_c=45)
+        raised = EventLog.objects.get(code=EventCode.ALARM)
+        self.assertEqual(rule.pk, raised.alarm_id)
+        self.assertEqual(EventSeverity.ERROR, raised.severity)
+        self.assertIn('Temperatura {alta}', raised.text)
+
+        # Otra regla recompila el conjunto sin reiniciar la alarma activa.
+        AlarmRule.objects.create(config=self.service.config, name='Nivel', metric=AlarmMetric.LEVEL, threshold=90)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.service.step(level_l=50, temp_c=46)
+        self.assertEqual(2, len(alarms_for(TankConfig.objects.get(pk=self.service.config.pk)).rules))
+        self.assertEqual(1, EventLog.objects.filter(code=EventCode.ALARM).count())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.service.step(level_l=50, temp_c=30)
+        cleared = EventLog.objects.get(code=EventCode.ALARM_CLEAR)
+        self.assertEqual((rule.pk, EventSeverity.INFO), (cleared.alarm_id, cleared.severity))
+        self.assertEqual(rule.pk, self.client.get(reverse('control:events')).json()[0]['alarm'])
+
+    def test_rolled_back_step_keeps_the_alarm_pending(self):
+        self.service.step(level_l=50, temp_c=30)
+        AlarmRule.objects.create(config=self.service.config, name='Caliente', metric=AlarmMetric.TEMP, threshold=40)
+        log = EventLog.log
+
+        def failing_alarm(code, *args, **kwargs):
+            if code == EventCode.ALARM:
+                raise OperationalError('base caída')
+            return log(code, *args, **kwargs)
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with patch.object(EventLog, 'log', side_effect=failing_alarm), self.assertRaises(OperationalError):
+                self.service.step(level_l=50, temp_c=45)
+        self.assertEqual([], callbacks)
+        self.assertEqual(1, TankState.objects.count())
+        self.assertFalse(alarms_for(self.service.config).rules[0].active)
+
+        # La siguiente muestra vuelve a emitir la alarma que no se guardó.
+        with self.captureOnCommitCallbacks(execute=True):
+            self.service.step(level_l=50, temp_c=45)
+        self.assertEqual(1, EventLog.objects.filter(code=EventCode.ALARM).count())
+        self.assertTrue(alarms_for(self.service.config).rules[0].active)
+
+
+class StoreAndForwardTestCase(APITestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = Path(tmp.name) / 'tank.journal'
+        self.service = ControlService()
+        self.service.step(level_l=50, temp_c=30)
+        self.now = 0.0
+
+    def _stepper(self):
+        return StoreAndForward(
+            self.service,
+            Journal(self.path, fsync_every=4),
+            retry_s=10,
+            batch_size=2,
+            clock=lambda: self.now,
+        )
+
+    def test_offline_steps_replay_in_order_once(self):
+        stepper = self._stepper()
+        self.assertEqual(1, stepper.latest_state().seq)
+        invalid = self.service.config.capacity_l + 10
+        low = self.service.config.min_level_l - 5
+        with patch.object(self.service, 'step', side_effect=OperationalError('base caída')):
+            for level in (invalid, invalid, invalid, low, low):
+                stepper.step(level_l=level, temp_c=30)
+        self.assertTrue(stepper.offline)
+        self.assertEqual(1, TankState.objects.count())
+        snapshot = self.path.read_bytes()
+
+        # De vuelta en línea: un lote de 2 estados por paso; los pasos siguen en
+        # el diario hasta vaciarlo y el último ya va directo a la base.
+        self.now = 100.0
+        while stepper.offline:
+            stepper.step(level_l=low, temp_c=30)
+        total = TankState.objects.count()
+        self.assertEqual(total - 2, stepper.replayed)
+        self.assertGreater(stepper.replayed, 5)
+        self.assertEqual(list(range(1, total + 1)), list(TankState.objects.order_by('seq').values_list('seq', flat=True)))
+        self.assertEqual(total, TankStateHead.objects.get().seq)
+        episode = EventLog.objects.get(code=EventCode.SAFE_MODE, severity=EventSeverity.WARNING)
+        self.assertEqual((3, False), (episode.occurrences, episode.episode_open))
+        self.assertEqual(TankState.objects.get(seq=2).pk, episode.state_id)
+        opened = EventLog.objects.get(code=EventCode.VALVE_OPEN, prev_actuators__isnull=False)
+        self.assertEqual(TankState.objects.get(seq=5).pk, opened.state_id)
+
+        # Reenviar el mismo diario otra vez no duplica filas.
+        events = EventLog.objects.count()
+        self.path.write_bytes(snapshot)
+        replay = self._stepper()
+        while replay.offline:
+            replay.step(level_l=low, temp_c=30)
+        self.assertEqual(0, replay.replayed)
+        self.assertEqual(total + 1, TankState.objects.count())
+        self.assertEqual(events, EventLog.objects.count())
+
+    def test_episode_spanning_batches_without_bulk_create_pks(self):
+        stepper = self._stepper()
+        stepper.latest_state()
+        invalid = self.service.config.capacity_l + 10
+        with patch.object(self.service, 'step', side_effect=OperationalError('base caída')):
+            for level in (invalid, invalid, invalid, 50, 50):
+                stepper.step(level_l=level, temp_c=30)
+
+        # Como en MySQL, bulk_create no devuelve las pk de los eventos.
+        bulk_create = EventLog.objects.bulk_create
+
+        def without_pks(objs, *args, **kwargs):
+            created = bulk_create(objs, *args, **kwargs)
+            for event in created:
+                event.pk = None
+            return created
+
+        self.now = 100.0
+        with patch.object(EventLog.objects, 'bulk_create', side_effect=without_pks):
+            while stepper.offline:
+                stepper.step(level_l=50, temp_c=30)
+        episode = EventLog.objects.get(code=EventCode.SAFE_MODE, severity=EventSeverity.WARNING)
+        self.assertEqual((3, False), (episode.occurrences, episode.episode_open))
+
+    def test_torn_tail_is_dropped(self):
+        journal = Journal(self.path)
+        journal.append({'t': 'state', 'seq': 1})
+        journal.close()
+        with open(self.path, 'ab') as handle:
+            handle.write(b'{"t":"sta')
+        self.assertEqual([{'t': 'state', 'seq': 1}], list(journal.records()))
+        journal.append({'t': 'state', 'seq': 2})
+        self.assertEqual([1, 2], [record['seq'] for record in journal.records()])
+        journal.clear()
+        self.assertFalse(journal.pending)
+
+
+class EventTankTestCase(APITestCase):
+    def setUp(self):
+        self.service = ControlService()
+        self.other = ControlService(create_tanks(1)[0])
+
+    def test_events_are_attributed_and_filtered_per_tank(self):
+        for service in (self.service, self.other):
+            service.step(level_l=50, temp_c=30)
+            for _ in range(2):
+                service.step(level_l=service.config.capacity_l + 10, temp_c=30)
+        # Cada tanque tiene su propio episodio de modo seguro.
+        episodes = EventLog.objects.filter(code=EventCode.SAFE_MODE, episode_open=True)
+        self.assertEqual(
+            {(self.service.config.pk, 2), (self.other.config.pk, 2)},
+            set(episodes.values_list('config_id', 'occurrences')),
+        )
+        self.assertFalse(EventLog.objects.filter(config__isnull=True).exists())
+
+        url = reverse('control:events')
+        rows = self.client.get(url, {'tank': self.other.config.pk}).json()
+        self.assertEqual({self.other.config.pk}, {row['config'] for row in rows})
+        self.assertEqual(self.other.config.events.count(), len(rows))
+        rows = self.client.get(url, {'tank': self.other.config.pk, 'code': EventCode.SAFE_MODE}).json()
+        self.assertEqual([EventCode.SAFE_MODE], [row['code'] for row in rows])
+        self.assertEqual(400, self.client.get(url, {'tank': 'siete'}).status_code)
+
+    def test_backfill_migration(self):
+        self.service.step(level_l=50, temp_c=30)
+        self.other.step(level_l=50, temp_c=30)
+        orphan = EventLog.objects.create(code=EventCode.LEASE_ACQUIRED, message='Sin tanque')
+        EventLog.objects.update(config=None)
+        migration = importlib.import_module('control.migrations.0017_eventlog_config_backfill')
+        with patch.object(migration, 'BATCH_SIZE', 2):
+            migration.backfill_event_configs(django_apps, SimpleNamespace(connection=connection))
+        for service in (self.service, self.other):
+            self.assertEqual(
+                set(EventLog.objects.filter(state__config=service.config).values_list('pk', flat=True)),
+                set(service.config.events.values_list('pk', flat=True)),
+            )
+        # Con varios tanques, un evento sin estado no se puede atribuir.
+        orphan.refresh_from_db()
+        self.assertIsNone(orphan.config_id)
+
+
+class ProfileControlTestCase(APITestCase):
+    def test_command_writes_diffable_reports(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            call_command(
+                'profile_control', '--iterations', '20', '--warmup', '2', '--snapshot-every', '5',
+                '--fault-every', '10', '--current-db', '--output', tmp, stdout=StringIO(),
+            )
+            output = Path(tmp)
+            summary = json.loads((output / 'summary.json').read_text())
+            cpu_report = (output / 'cpu.txt').read_text()
+            growth = list(csv.DictReader((output / 'growth.csv').open()))
+            self.assertTrue((output / 'cpu.prof').exists())
+            self.assertTrue((output / 'stacks.folded').exists())
+            self.assertIn('memory.txt', os.listdir(tmp))
+        self.assertEqual({'timing', 'cpu', 'memory'}, set(summary['options']['passes']))
+        self.assertEqual(62, summary['row_growth']['TankState'])
+        self.assertGreater(summary['timing']['p50_ms'], 0)
+        # Rutas relativas al proyecto y sin números de línea: comparables entre commits.
+        self.assertIn('  control/services.py:_step_once\n', cpu_report)
+        self.assertNotIn(str(Path(__file__).resolve().parent), cpu_report)
+        self.assertEqual(['0', '5', '10', '15', '20'], [row['step'] for row in growth])
+        # Las lecturas inválidas inyectadas recorren el modo seguro.
+        self.assertTrue(EventLog.objects.filter(code=EventCode.SAFE_MODE).exists())
+
+    def test_stack_sampler_collapses_from_root(self):
+        def leaf():
+            return sys._getframe()
+
+        def root():
+            return leaf()
+
+        sampler = StackSampler(root.__code__)
+        frame = root()
+        stack = sampler._collapse(frame)
+        self.assertEqual('control/tests.py:root;control/tests.py:leaf', stack)
+        self.assertIsNone(StackSampler(ControlService.step.__code__)._collapse(frame))
+        self.assertEqual('control/tests.py', short_path(str(Path(__file__).resolve())))
@@ -0,0 +1,177 @@
+"""Trazas opcionales por fase del paso de control y de la vista de estado.
+
+Con ``TRACE_ENABLED`` cada petición o paso abre una traza raíz (``trace``) y
+las fases internas abren spans hijos (``span``). Los spans se acumulan en
+memoria y, al cerrar la raíz, la traza completa se escribe si duró al menos
+``TRACE_SLOW_MS`` o si cae en la muestra ``TRACE_SAMPLE_RATE``; así los
+valores atípicos lentos siempre quedan registrados.
+
+El archivo usa el formato JSON de Chrome trace (eventos completos ``ph: X``,
+arreglo sin cerrar) y se puede abrir tal cual en ``chrome://tracing`` o en
+Perfetto. Rota por tamaño como ``RotatingFileHandler`` (``TRACE_MAX_BYTES``,
+``TRACE_BACKUPS``). Sin traza activa, ``span`` no hace nada.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import contextvars
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+from typing import Iterator, Optional
+
+from django.conf import settings
+from django.db import transaction
+
+TRACE_FILE_NAME = 'trace.json'
+
+_current: contextvars.ContextVar[Optional['_Trace']] = contextvars.ContextVar('control_trace', default=None)
+_handlers: dict[Path, RotatingFileHandler] = {}
+_handlers_lock = threading.Lock()
+_NULL = contextlib.nullcontext()
+
+
+class _TraceFileHandler(RotatingFileHandler):
+    """Cada archivo nuevo empieza con ``[`` para ser un arreglo de Chrome trace."""
+
+    def _open(self):
+        stream = super()._open()
+        if stream.tell() == 0:
+            stream.write('[\n')
+        return stream
+
+
+class _Trace:
+    def __init__(self):
+        self.events: list[dict] = []
+        self.pid = os.getpid()
+        self.tid = threading.get_ident()
+
+    def record(self, name: str, started_us: int, elapsed_ns: int, args: dict) -> None:
+        event = {
+            'name': name,
+            'cat': 'control',
+            'ph': 'X',
+            'ts': started_us,
+            'dur': elapsed_ns / 1000,
+            'pid': self.pid,
+            'tid': self.tid,
+        }
+        if args:
+            event['args'] = args
+        self.events.append(event)
+
+
+def trace_path() -> Path:
+    return Path(settings.TRACE_DIR) / TRACE_FILE_NAME
+
+
+def _handler(path: Path) -> RotatingFileHandler:
+    with _handlers_lock:
+        handler = _handlers.get(path)
+        if handler is None:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            handler = _TraceFileHandler(
+                path,
+                maxBytes=settings.TRACE_MAX_BYTES,
+                backupCount=settings.TRACE_BACKUPS,
+                encoding='utf-8',
+            )
+            _handlers[path] = handler
+        return handler
+
+
+def close_files() -> None:
+    """Cierra los archivos de traza abiertos (fin del proceso o pruebas)."""
+    with _handlers_lock:
+        handlers = list(_handlers.values())
+        _handlers.clear()
+    for handler in handlers:
+        handler.close()
+
+
+def _write(events: list[dict]) -> None:
+    text = ',\n'.join(json.dumps(event, separators=(',', ':')) for event in events) + ','
+    _handler(trace_path()).handle(logging.makeLogRecord({'msg': text}))
+
+
+@contextlib.contextmanager
+def _span(active: _Trace, name: str, args: dict) -> Iterator[None]:
+    started_us = time.time_ns() // 1000
+    started = time.perf_counter_ns()
+    try:
+        yield
+    finally:
+        active.record(name, started_us, time.perf_counter_ns() - started, args)
+
+
+def span(name: str, **args):
+    """Span hijo de la traza activa; sin traza activa es un contexto vacío."""
+    active = _current.get()
+    if active is None:
+        return _NULL
+    return _span(active, name, args)
+
+
+@contextlib.contextmanager
+def _root(name: str, args: dict) -> Iterator[None]:
+    active = _Trace()
+    token = _current.set(active)
+    started = time.perf_counter_ns()
+    try:
+        with _span(active, name, args):
+            yield
+    finally:
+        _current.reset(token)
+        elapsed_ms = (time.perf_counter_ns() - started) / 1e6
+        slow_ms = settings.TRACE_SLOW_MS
+        if (slow_ms > 0 and elapsed_ms >= slow_ms) or random.random() < settings.TRACE_SAMPLE_RATE:
+            _write(active.events)
+
+
+def trace(name: str, **args):
+    """Abre la traza raíz, o un span si ya hay una activa (p. ej. el paso dentro de la vista)."""
+    if _current.get() is not None:
+        return span(name, **args)
+    if not settings.TRACE_ENABLED:
+        return _NULL
+    return _root(name, args)
+
+
+@contextlib.contextmanager
+def traced_atomic(name: str = 'commit') -> Iterator[None]:
+    """``transaction.atomic()`` que mide la confirmación como un span propio."""
+    atomic = transaction.atomic()
+    atomic.__enter__()
+    try:
+        yield
+    except BaseException:
+        atomic.__exit__(*sys.exc_info())
+        raise
+    with span(name):
+        atomic.__exit__(None, None, None)
+
+
+def read_trace(path: Path) -> list[dict]:
+    """Eventos de un archivo de traza (cierra el arreglo que queda abierto)."""
+    text = path.read_text(encoding='utf-8').rstrip().rstrip(',')
+    return json.loads(text + ']') if text else []
+
+
+class TracedViewMixin:
+    """Traza la petición completa y el renderizado de la respuesta."""
+
+    def dispatch(self, request, *args, **kwargs):
+        with trace(f'{request.method} {request.path}'):
+            response = super().dispatch(request, *args, **kwargs)
+            if not getattr(response, 'is_rendered', True):
+                with span('render'):
+                    response.render()
+            return response
@@ -1,11 +1,23 @@
 from django.urls import path
 
-from .views import EventLogView, TankConfigView, TankStateView
+from .views import (
+    DashboardView,
+    EventLogView,
+    HealthView,
+    HistoryExportView,
+    HistoryView,
+    TankConfigView,
+    TankStateView,
+)
 
 app_name = 'control'
 
 urlpatterns = [
     path('state/', TankStateView.as_view(), name='state'),
     path('config/', TankConfigView.as_view(), name='config'),
+    path('dashboard/', DashboardView.as_view(), name='dashboard'),
     path('events/', EventLogView.as_view(), name='events'),
+    path('health/', HealthView.as_view(), name='health'),
+    path('history/', HistoryView.as_view(), name='history'),
+    path('history/export/', HistoryExportView.as_view(), name='history-export'),
 ]
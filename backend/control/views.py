@@ -1,33 +1,82 @@
 from __future__ import annotations
 
+import itertools
+from datetime import datetime, time
 from typing import Optional
 
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
 from rest_framework import status
 from rest_framework.generics import ListAPIView, RetrieveUpdateAPIView
 from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from .models import EventLog
+from .archive import ArchiveReader
+from .dashboard import DashboardToken, build_snapshot
+from .fastjson import FastReadMixin, FieldPlan, iter_chunks
+from .leases import lease_for, owns_tank
+from .models import EventLog, TankState
+from .routers import pick_read_db, read_from, stream_from
+from .search import search_events
 from .serializers import EventLogSerializer, TankConfigSerializer, TankStateSerializer
 from .services import ControlService
+from .tracing import TracedViewMixin, span
+from .watchdog import Watchdog
 
+STATE_PLAN = FieldPlan.from_serializer(TankStateSerializer)
+EVENT_PLAN = FieldPlan.from_serializer(EventLogSerializer)
+HISTORY_PLANS = {'states': STATE_PLAN, 'events': EVENT_PLAN}
 
-class TankStateView(APIView):
+
+def current_state(
+    service: ControlService,
+    level: Optional[float] = None,
+    temp: Optional[float] = None,
+) -> Optional[TankState]:
+    """Avanza el tanque si este nodo es el líder; si no, lee el último estado sin escribir.
+
+    Sin lecturas el paso se comparte entre peticiones concurrentes y respeta el
+    intervalo mínimo entre pasos (``ControlService.poll_step``).
+    """
+    if not owns_tank(service.config):
+        return service.get_latest_state()
+    if level is None and temp is None:
+        return service.poll_step().state
+    return service.step(level_l=level, temp_c=temp).state
+
+
+class TankStateView(TracedViewMixin, FastReadMixin, APIView):
     permission_classes = [AllowAny]
 
     def get(self, request):
         try:
-            level, temp = self._extract_measurements(request)
+            with span('parse_request'):
+                level, temp = self._extract_measurements(request)
         except ValueError:
             return Response(
                 {'detail': 'Los parámetros level y temp deben ser numéricos.'},
                 status=status.HTTP_400_BAD_REQUEST,
             )
         service = ControlService()
-        result = service.step(level_l=level, temp_c=temp)
-        serializer = TankStateSerializer(result.state)
-        return Response(serializer.data)
+        if (level is not None or temp is not None) and not owns_tank(service.config):
+            return Response(
+                {
+                    'detail': 'Este nodo no controla el tanque; envíe las lecturas al nodo líder.',
+                    'owner': lease_for(service.config).holder,
+                },
+                status=status.HTTP_409_CONFLICT,
+            )
+        state = current_state(service, level, temp)
+        if state is None:
+            return Response(
+                {'detail': 'El tanque aún no tiene estado.'},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+            )
+        with span('serialize'):
+            plan = STATE_PLAN.project(request.query_params.get('fields'))
+            return Response(plan.instance(state))
 
     def _extract_measurements(self, request) -> tuple[Optional[float], Optional[float]]:
         params = request.query_params
@@ -41,6 +90,40 @@ class TankStateView(APIView):
         return level, temp
 
 
+class DashboardView(FastReadMixin, APIView):
+    """Estado, eventos nuevos y configuración (si cambió) en una sola respuesta."""
+
+    permission_classes = [AllowAny]
+
+    def get(self, request):
+        service = ControlService()
+        # El paso (si corresponde) va antes; el estado se vuelve a leer dentro de la instantánea.
+        current_state(service)
+        since = DashboardToken.decode(request.query_params.get('since'))
+        snapshot = build_snapshot(service, since, event_columns=EVENT_PLAN.columns)
+        state, config = snapshot.state, snapshot.config
+        return Response({
+            'token': snapshot.token.encode(),
+            'full': since is None,
+            'state': STATE_PLAN.instance(state) if state is not None else None,
+            'events': [EVENT_PLAN.row_to_dict(row) for row in snapshot.events],
+            'config': TankConfigSerializer(config).data if config is not None else None,
+        })
+
+
+class HealthView(APIView):
+    """Latido y latencia del bucle de control; responde 503 si el latido venció."""
+
+    permission_classes = [AllowAny]
+
+    def get(self, request):
+        status_data = Watchdog(ControlService()).status()
+        return Response(
+            status_data.as_dict(),
+            status=status.HTTP_503_SERVICE_UNAVAILABLE if status_data.stale else status.HTTP_200_OK,
+        )
+
+
 class TankConfigView(RetrieveUpdateAPIView):
     serializer_class = TankConfigSerializer
     permission_classes = [AllowAny]
@@ -49,13 +132,33 @@ class TankConfigView(RetrieveUpdateAPIView):
         return ControlService().config
 
 
-class EventLogView(ListAPIView):
+class EventLogView(FastReadMixin, ListAPIView):
     serializer_class = EventLogSerializer
     permission_classes = [AllowAny]
 
+    def list(self, request, *args, **kwargs):
+        tank = request.query_params.get('tank')
+        if tank is not None and not tank.isdigit():
+            return Response(
+                {'detail': 'El parámetro tank debe ser el id del tanque.'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        plan = EVENT_PLAN.project(request.query_params.get('fields'))
+        with read_from(pick_read_db(request)):
+            return Response(plan.rows(self.get_queryset()))
+
     def get_queryset(self):
-        limit_param = self.request.query_params.get('limit')
+        params = self.request.query_params
+        limit_param = params.get('limit')
         queryset = EventLog.objects.all().order_by('-ts')
+        # Por tanque (y código) se resuelven con los índices (config, ts) y (config, code, ts).
+        if params.get('tank'):
+            queryset = queryset.filter(config_id=int(params['tank']))
+        if params.get('code'):
+            queryset = queryset.filter(code=params['code'])
+        query = params.get('q')
+        if query:
+            queryset = search_events(queryset, query)
         if limit_param:
             try:
                 limit = int(limit_param)
@@ -67,3 +170,70 @@ class EventLogView(ListAPIView):
         else:
             queryset = queryset[:50]
         return queryset
+
+
+class HistoryQueryMixin:
+    """Parámetros comunes de historial: ``source``, ``start``, ``end`` y ``fields``."""
+
+    def parse_history_query(self, request):
+        params = request.query_params
+        plan = HISTORY_PLANS.get(params.get('source', 'states'))
+        if plan is None:
+            raise ValueError('El parámetro source debe ser states o events.')
+        start = self._parse_bound(params.get('start'), 'start')
+        end = self._parse_bound(params.get('end'), 'end')
+        return plan.project(params.get('fields')), start, end
+
+    def _parse_bound(self, raw: Optional[str], name: str) -> Optional[datetime]:
+        if not raw:
+            return None
+        value = parse_datetime(raw)
+        if value is None:
+            day = parse_date(raw)
+            if day is None:
+                raise ValueError(f'El parámetro {name} debe ser una fecha ISO 8601.')
+            value = datetime.combine(day, time.min)
+        if timezone.is_naive(value):
+            value = timezone.make_aware(value, timezone.get_current_timezone())
+        return value
+
+    def history_rows(self, plan: FieldPlan, start, end):
+        return ArchiveReader().iter_rows(plan.model, plan.columns, start=start, end=end)
+
+
+class HistoryView(HistoryQueryMixin, FastReadMixin, APIView):
+    """Historial por rango de tiempo, combinando archivo frío y tabla viva."""
+
+    permission_classes = [AllowAny]
+    DEFAULT_LIMIT = 1000
+    MAX_LIMIT = 10000
+
+    def get(self, request):
+        try:
+            plan, start, end = self.parse_history_query(request)
+        except ValueError as exc:
+            return Response({'detail': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            limit = max(1, min(int(request.query_params.get('limit', self.DEFAULT_LIMIT)), self.MAX_LIMIT))
+        except ValueError:
+            limit = self.DEFAULT_LIMIT
+        with read_from(pick_read_db(request)):
+            rows = itertools.islice(self.history_rows(plan, start, end), limit)
+            return Response([plan.row_to_dict(row) for row in rows])
+
+
+class HistoryExportView(HistoryQueryMixin, APIView):
+    """Exportación completa del rango como arreglo JSON transmitido por partes."""
+
+    permission_classes = [AllowAny]
+
+    def get(self, request):
+        try:
+            plan, start, end = self.parse_history_query(request)
+        except ValueError as exc:
+            return Response({'detail': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        rows = stream_from(pick_read_db(request), self.history_rows(plan, start, end))
+        return StreamingHttpResponse(
+            iter_chunks(plan, rows),
+            content_type='application/json',
+        )
@@ -0,0 +1,141 @@
+"""Watchdog del bucle de control.
+
+Cada paso normal de ``ControlService.step`` renueva ``TankStateHead.heartbeat_at``
+y registra su latencia (``step_ms``, ``slo_breaches``) en la misma escritura del
+puntero. El watchdog corre fuera del proceso que ejecuta el bucle (comando
+``run_watchdog``) y, si el latido supera el plazo, fuerza el estado seguro con
+``ControlService.force_safe_state``. Cada verificación es una sola consulta por
+clave primaria, así que puede ejecutarse en cada tick.
+
+Si la base no responde (bloqueo, reinicio, conexión caída) la verificación se
+informa como vencida con el error, la conexión se cierra para que la próxima
+abra una nueva y el watchdog sigue vigilando.
+"""
+
+from __future__ import annotations
+
+import threading
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from typing import Callable, Optional
+
+from django.conf import settings
+from django.db import DatabaseError, connection
+from django.utils import timezone
+
+from .models import TankStateHead
+
+
+@dataclass
+class WatchdogStatus:
+    heartbeat_at: Optional[datetime]
+    age_s: Optional[float]
+    deadline_s: float
+    stale: bool
+    step_ms: float
+    slo_ms: float
+    slo_breached: bool
+    slo_breaches: int
+    safe_mode: bool
+    forced_safe: bool = False
+    error: str = ''
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+
+class Watchdog:
+    """Verifica el latido de un tanque y fuerza el estado seguro si se detuvo.
+
+    ``clock`` devuelve la hora actual (``timezone.now`` por defecto) y permite
+    probar los plazos sin esperar.
+    """
+
+    def __init__(
+        self,
+        service,
+        *,
+        deadline_s: Optional[float] = None,
+        slo_ms: Optional[float] = None,
+        clock: Callable[[], datetime] = timezone.now,
+    ):
+        self.service = service
+        self.deadline_s = settings.WATCHDOG_DEADLINE_S if deadline_s is None else deadline_s
+        self.slo_ms = settings.WATCHDOG_STEP_SLO_MS if slo_ms is None else slo_ms
+        self.clock = clock
+
+    def status(self) -> WatchdogStatus:
+        head = (
+            TankStateHead.objects.select_related('state')
+            .filter(config_id=self.service.config.pk)
+            .first()
+        )
+        if head is None:
+            return WatchdogStatus(
+                heartbeat_at=None,
+                age_s=None,
+                deadline_s=self.deadline_s,
+                stale=False,
+                step_ms=0.0,
+                slo_ms=self.slo_ms,
+                slo_breached=False,
+                slo_breaches=0,
+                safe_mode=False,
+            )
+        # Punteros previos al latido: se usa la hora del último estado.
+        heartbeat_at = head.heartbeat_at or head.state.ts
+        age_s = max(0.0, (self.clock() - heartbeat_at).total_seconds())
+        return WatchdogStatus(
+            heartbeat_at=heartbeat_at,
+            age_s=age_s,
+            deadline_s=self.deadline_s,
+            stale=age_s > self.deadline_s,
+            step_ms=head.step_ms,
+            slo_ms=self.slo_ms,
+            slo_breached=head.step_ms > self.slo_ms,
+            slo_breaches=head.slo_breaches,
+            safe_mode=head.state.safe_mode,
+        )
+
+    def check(self) -> WatchdogStatus:
+        """Calcula el estado y, si el latido venció, fuerza el estado seguro."""
+        status = self.status()
+        if status.stale:
+            reason = f'sin pasos de control hace {status.age_s:.1f} s (plazo {self.deadline_s:.1f} s)'
+            forced = self.service.force_safe_state(reason)
+            if forced is not None:
+                status.forced_safe = True
+                status.safe_mode = True
+        return status
+
+    def unreachable(self, exc: DatabaseError) -> WatchdogStatus:
+        """Estado de una verificación que no pudo leer la base: se trata como vencida."""
+        return WatchdogStatus(
+            heartbeat_at=None,
+            age_s=None,
+            deadline_s=self.deadline_s,
+            stale=True,
+            step_ms=0.0,
+            slo_ms=self.slo_ms,
+            slo_breached=False,
+            slo_breaches=0,
+            safe_mode=False,
+            error=str(exc) or exc.__class__.__name__,
+        )
+
+    def run(
+        self,
+        interval_s: float,
+        stop: threading.Event,
+        on_check: Optional[Callable[[WatchdogStatus], None]] = None,
+    ) -> None:
+        while not stop.is_set():
+            try:
+                status = self.check()
+            except DatabaseError as exc:
+                status = self.unreachable(exc)
+                # La conexión puede haber quedado inutilizable: la próxima verificación abre otra.
+                connection.close()
+            if on_check:
+                on_check(status)
+            stop.wait(interval_s)
@@ -0,0 +1,126 @@
+"""Punto de entrada liviano para el bucle de control.
+
+Uso::
+
+    python -m control.worker --iterations 0 --hz 1
+
+Carga ``core.settings_worker`` (solo ORM y app ``control``) en lugar del stack
+completo de ``manage.py`` y mide el tiempo de importación, de ``django.setup()``
+y hasta el primer paso de control. Al primer paso también informa qué módulos
+del stack web quedaron importados (``HEAVY_MODULES``): el perfil es liviano si
+no hay ninguno.
+"""
+
+from __future__ import annotations
+
+import time
+
+_STARTED = time.perf_counter()
+
+import argparse  # noqa: E402
+import json  # noqa: E402
+import os  # noqa: E402
+import sys  # noqa: E402
+from dataclasses import asdict, dataclass, field  # noqa: E402
+from typing import Optional  # noqa: E402
+
+# Paquetes que solo necesita el stack web. La base de ``django.template`` no está: la
+# importan los campos del ORM (``django.forms``) con cualquier perfil.
+HEAVY_MODULES = (
+    'rest_framework',
+    'corsheaders',
+    'django.contrib.admin',
+    'django.contrib.sessions',
+    'django.contrib.messages',
+    'django.contrib.staticfiles',
+    'django.template.defaulttags',
+    'django.template.loader_tags',
+    'django.views.debug',
+)
+
+
+@dataclass
+class StartupProfile:
+    import_ms: float = 0.0
+    setup_ms: float = 0.0
+    first_step_ms: Optional[float] = None
+    heavy_modules: list[str] = field(default_factory=list)
+
+    @property
+    def lean(self) -> bool:
+        return not self.heavy_modules
+
+
+def _elapsed_ms() -> float:
+    return (time.perf_counter() - _STARTED) * 1000
+
+
+def loaded_heavy_modules() -> list[str]:
+    """``HEAVY_MODULES`` (o submódulos) presentes en ``sys.modules``."""
+    return sorted(
+        name for name in sys.modules
+        if any(name == prefix or name.startswith(prefix + '.') for prefix in HEAVY_MODULES)
+    )
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description='Bucle de control del tanque (perfil liviano).')
+    parser.add_argument('--iterations', type=int, default=0, help='Ciclos a ejecutar; 0 = continuo.')
+    parser.add_argument('--hz', type=float, default=1.0, help='Frecuencia objetivo en Hertz.')
+    parser.add_argument(
+        '--startup-report',
+        default=None,
+        help='Ruta donde escribir en JSON los tiempos de arranque.',
+    )
+    return parser
+
+
+def main(argv: Optional[list[str]] = None) -> StartupProfile:
+    options = build_parser().parse_args(argv)
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings_worker')
+
+    profile = StartupProfile()
+    import django
+
+    profile.import_ms = _elapsed_ms()
+    django.setup()
+    profile.setup_ms = _elapsed_ms()
+
+    from control.management.commands.run_simulation import Command
+
+    class WorkerCommand(Command):
+        def _safe_step(self, service, *, level_l, temp_c):
+            result = super()._safe_step(service, level_l=level_l, temp_c=temp_c)
+            if profile.first_step_ms is None:
+                profile.first_step_ms = _elapsed_ms()
+                profile.heavy_modules = loaded_heavy_modules()
+                self._report_startup(profile, options.startup_report)
+            return result
+
+        def _report_startup(self, profile: StartupProfile, path: Optional[str]) -> None:
+            message = (
+                f'Arranque: importación={profile.import_ms:.1f} ms, '
+                f'setup={profile.setup_ms:.1f} ms, primer paso={profile.first_step_ms:.1f} ms'
+            )
+            if profile.lean:
+                self.stdout.write(self.style.SUCCESS(message))
+            else:
+                self.stderr.write(
+                    self.style.WARNING(f'{message} (módulos del stack web: {", ".join(profile.heavy_modules)})')
+                )
+            if path:
+                with open(path, 'w', encoding='utf-8') as handle:
+                    json.dump(asdict(profile), handle)
+
+    WorkerCommand().execute(
+        iterations=options.iterations,
+        hz=options.hz,
+        no_color=False,
+        force_color=False,
+        skip_checks=True,
+    )
+    return profile
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -37,6 +37,7 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'core.middleware.SimpleCorsMiddleware',
+    'control.routers.ReadYourWritesMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -79,6 +80,31 @@ DATABASES = {
     }
 }
 
+# Read replicas (aliases replica1, replica2, ...): same engine and credentials as default,
+# with NAME and/or HOST taken from these comma-separated lists
+_replica_names = [name.strip() for name in os.environ.get('DB_REPLICA_NAMES', '').split(',') if name.strip()]
+_replica_hosts = [host.strip() for host in os.environ.get('DB_REPLICA_HOSTS', '').split(',') if host.strip()]
+DB_REPLICAS = []
+for _index in range(max(len(_replica_names), len(_replica_hosts))):
+    _alias = f'replica{_index + 1}'
+    DATABASES[_alias] = {
+        **DATABASES['default'],
+        'NAME': _replica_names[_index] if _index < len(_replica_names) else DATABASES['default']['NAME'],
+        'HOST': _replica_hosts[_index] if _index < len(_replica_hosts) else DATABASES['default']['HOST'],
+        'TEST': {'MIRROR': 'default'},
+    }
+    DB_REPLICAS.append(_alias)
+DATABASE_ROUTERS = ['control.routers.ReplicaRouter']
+DB_REPLICA_MAX_LAG_S = float(os.environ.get('DB_REPLICA_MAX_LAG_S', 5))
+DB_REPLICA_LAG_CHECK_S = float(os.environ.get('DB_REPLICA_LAG_CHECK_S', 5))
+DB_REPLICA_PIN_S = float(os.environ.get('DB_REPLICA_PIN_S', 10))
+
+# SQLite journal mode (e.g. WAL) to compare engines in load tests
+if DATABASES['default']['ENGINE'] == 'django.db.backends.sqlite3' and os.environ.get('DB_SQLITE_JOURNAL_MODE'):
+    DATABASES['default']['OPTIONS'] = {
+        'init_command': f"PRAGMA journal_mode={os.environ['DB_SQLITE_JOURNAL_MODE']};",
+    }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -149,3 +175,52 @@ CORS_ALLOW_CREDENTIALS = True
 # Tank control defaults
 DEFAULT_TANK_INITIAL_LEVEL = float(os.environ.get('DEFAULT_TANK_INITIAL_LEVEL', 60))
 DEFAULT_TANK_INITIAL_TEMPERATURE = float(os.environ.get('DEFAULT_TANK_INITIAL_TEMPERATURE', 28))
+
+
+# Fast read path: gzip responses at or above this size (bytes)
+FAST_JSON_COMPRESS_MIN_BYTES = int(os.environ.get('FAST_JSON_COMPRESS_MIN_BYTES', 1024))
+
+
+# Repeated events (e.g. SAFE_MODE) within this window update one episode row
+EVENT_COALESCE_WINDOW_S = float(os.environ.get('EVENT_COALESCE_WINDOW_S', 300))
+
+
+# Cold-storage archive for closed days of TankState/EventLog history
+ARCHIVE_DIR = Path(os.environ.get('ARCHIVE_DIR', BASE_DIR / 'archive'))
+ARCHIVE_KEEP_DAYS = int(os.environ.get('ARCHIVE_KEEP_DAYS', 7))
+
+
+# Control-loop watchdog: step latency SLO and heartbeat deadline before forcing safe mode
+WATCHDOG_STEP_SLO_MS = float(os.environ.get('WATCHDOG_STEP_SLO_MS', 250))
+WATCHDOG_DEADLINE_S = float(os.environ.get('WATCHDOG_DEADLINE_S', 5))
+
+
+# TankState rows older than this are packed into per-minute TankStateChunk rows by compact_states
+STATE_CHUNK_KEEP_MINUTES = int(os.environ.get('STATE_CHUNK_KEEP_MINUTES', 60))
+
+
+# Per-tank leader election: only the lease owner steps the tank, other nodes serve reads
+LEASES_ENABLED = os.environ.get('LEASES_ENABLED', '0') == '1'
+LEASE_TTL_S = float(os.environ.get('LEASE_TTL_S', 10))
+NODE_ID = os.environ.get('NODE_ID', '')
+
+
+# Opt-in Chrome-trace spans for control steps and /api/state (tail-sampled, size-rotated file)
+TRACE_ENABLED = os.environ.get('TRACE_ENABLED', '0') == '1'
+TRACE_DIR = Path(os.environ.get('TRACE_DIR', BASE_DIR / 'traces'))
+TRACE_SAMPLE_RATE = float(os.environ.get('TRACE_SAMPLE_RATE', 0.01))
+TRACE_SLOW_MS = float(os.environ.get('TRACE_SLOW_MS', 250))
+TRACE_MAX_BYTES = int(os.environ.get('TRACE_MAX_BYTES', 10 * 1024 * 1024))
+TRACE_BACKUPS = int(os.environ.get('TRACE_BACKUPS', 5))
+
+
+# Reading-less steps (dashboard polls) closer than this to the last state return it instead of stepping
+STATE_MIN_STEP_INTERVAL_S = float(os.environ.get('STATE_MIN_STEP_INTERVAL_S', 0.5))
+
+
+# Store-and-forward journal: the control loop keeps running offline when the database is unreachable
+JOURNAL_DIR = Path(os.environ.get('JOURNAL_DIR', BASE_DIR / 'journal'))
+JOURNAL_FSYNC_EVERY = int(os.environ.get('JOURNAL_FSYNC_EVERY', 16))
+JOURNAL_FSYNC_INTERVAL_S = float(os.environ.get('JOURNAL_FSYNC_INTERVAL_S', 1.0))
+JOURNAL_RETRY_S = float(os.environ.get('JOURNAL_RETRY_S', 5.0))
+JOURNAL_REPLAY_BATCH = int(os.environ.get('JOURNAL_REPLAY_BATCH', 500))
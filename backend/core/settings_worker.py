@@ -0,0 +1,24 @@
+"""Perfil mínimo para el proceso del bucle de control.
+
+Solo carga el ORM y la app ``control``: sin admin, sesiones, mensajes,
+archivos estáticos, DRF ni middleware. Se usa desde ``python -m control.worker``
+para que el reinicio tras una caída o un despliegue sea lo más corto posible.
+"""
+
+from .settings import *  # noqa: F401,F403
+
+INSTALLED_APPS = [
+    'control',
+]
+
+MIDDLEWARE = []
+
+TEMPLATES = []
+
+ROOT_URLCONF = None
+
+STATICFILES_DIRS = []
+
+# Sin el LOGGING por defecto de Django: su AdminEmailHandler importa django.views.debug y el
+# motor de plantillas solo para dar formato a correos que el worker nunca envía
+LOGGING_CONFIG = None
@@ -1,14 +1,22 @@
-import { useEffect, useMemo, useState } from 'react';
+import { useEffect, useMemo, useRef, useState } from 'react';
 import { apiClient, endpoints } from './api/client';
 import { ConfigForm } from './components/ConfigForm';
 import { EventsList } from './components/EventsList';
 import { LevelIndicator } from './components/LevelIndicator';
 import { ManualControls } from './components/ManualControls';
 import { StateBadge } from './components/StateBadge';
-import { EventLog, TankConfig, TankState } from './types';
+import { DashboardSnapshot, EventLog, TankConfig, TankState } from './types';
 import './App.css';
 
 const POLLING_INTERVAL = 1000;
+const EVENTS_LIMIT = 50;
+
+const mergeEvents = (current: EventLog[], incoming: EventLog[]): EventLog[] => {
+  const incomingIds = new Set(incoming.map((event) => event.id));
+  return [...incoming, ...current.filter((event) => !incomingIds.has(event.id))]
+    .sort((a, b) => b.id - a.id)
+    .slice(0, EVENTS_LIMIT);
+};
 
 export default function App() {
   const [tankState, setTankState] = useState<TankState | null>(null);
@@ -27,14 +35,20 @@ export default function App() {
     }
   };
 
+  const tokenRef = useRef<string | null>(null);
+
   const fetchData = async () => {
     try {
-      const [stateResponse, eventsResponse] = await Promise.all([
-        apiClient.get<TankState>(endpoints.state),
-        apiClient.get<EventLog[]>(`${endpoints.events}?limit=50`),
-      ]);
-      setTankState(stateResponse.data);
-      setEvents(eventsResponse.data);
+      const response = await apiClient.get<DashboardSnapshot>(endpoints.dashboard, {
+        params: tokenRef.current ? { since: tokenRef.current } : {},
+      });
+      const snapshot = response.data;
+      tokenRef.current = snapshot.token;
+      setTankState(snapshot.state);
+      setEvents((current) => (snapshot.full ? snapshot.events : mergeEvents(current, snapshot.events)));
+      if (snapshot.config) {
+        setConfig(snapshot.config);
+      }
       setLastUpdated(new Date());
       setError(null);
     } catch (err: unknown) {
@@ -45,7 +59,6 @@ export default function App() {
   };
 
   useEffect(() => {
-    fetchConfig();
     fetchData();
     const timer = window.setInterval(fetchData, POLLING_INTERVAL);
     return () => window.clearInterval(timer);
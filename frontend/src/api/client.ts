@@ -11,4 +11,5 @@ export const endpoints = {
   state: '/state/',
   config: '/config/',
   events: '/events/',
+  dashboard: '/dashboard/',
 };
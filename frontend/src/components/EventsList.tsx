@@ -24,7 +24,15 @@ export function EventsList({ events }: EventsListProps) {
             <span className="events__code" style={{ color: severityColors[event.severity] }}>
               {event.code}
             </span>
-            <span className="events__message">{event.message}</span>
+            <span className="events__message">
+              {event.message}
+              {event.occurrences > 1 && (
+                <span className="events__count">
+                  {' '}×{event.occurrences}
+                  {event.last_ts && ` (último ${new Date(event.last_ts).toLocaleTimeString()})`}
+                </span>
+              )}
+            </span>
           </li>
         ))}
         {events.length === 0 && <li className="events__empty">Sin eventos recientes.</li>}
@@ -1,6 +1,7 @@
 export interface TankState {
   id: number;
   config: number;
+  seq: number;
   level_l: number;
   temp_c: number;
   valve_open: boolean;
@@ -25,6 +26,11 @@ export interface TankConfig {
   manual_heater_on: boolean;
   manual_heater_150_on: boolean;
   manual_heater_500_on: boolean;
+  signal_filter: 'NONE' | 'MEDIAN' | 'EWMA';
+  signal_filter_window: number;
+  signal_filter_alpha: number;
+  max_level_rate_lps: number;
+  max_temp_rate_cps: number;
   active: boolean;
   created_at: string;
   updated_at: string;
@@ -32,8 +38,26 @@ export interface TankConfig {
 
 export interface EventLog {
   id: number;
+  config: number | null;
   code: string;
   message: string;
   severity: 'INFO' | 'WARNING' | 'ERROR';
   ts: string;
+  occurrences: number;
+  last_ts: string | null;
+  state: number | null;
+  level_l: number | null;
+  temp_c: number | null;
+  power_w: number | null;
+  prev_actuators: number | null;
+  new_actuators: number | null;
+  alarm: number | null;
+}
+
+export interface DashboardSnapshot {
+  token: string;
+  full: boolean;
+  state: TankState;
+  events: EventLog[];
+  config: TankConfig | null;
 }